@@ -0,0 +1,119 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright (C) 2015 Canonical Ltd
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""How long snapcraft takes to start and what it imports doing so.
+
+Run as a module to print the startup time and the number of imported
+modules for the commands that do not touch a project:
+
+    python3 -m integration_tests.test_startup
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from testtools.content import text_content
+
+import integration_tests
+
+
+# Runs bin/snapcraft and writes what it imported and when it was done.
+_PROBE = '''\
+import atexit, json, runpy, sys, time
+
+start = time.perf_counter()
+report_file = sys.argv.pop(2)
+
+
+def report():
+    with open(report_file, 'w') as f:
+        json.dump({'modules': sorted(sys.modules),
+                   'seconds': time.perf_counter() - start}, f)
+
+
+atexit.register(report)
+sys.argv = sys.argv[1:]
+runpy.run_path(sys.argv[0], run_name='__main__')
+'''
+
+_COMMANDS = [
+    ['--version'],
+    ['help', 'topics'],
+    ['help', 'nil'],
+    ['list-plugins'],
+]
+
+# Modules these commands have no use for and that take long to import.
+_HEAVY_MODULES = [
+    'apt',
+    'jsonschema',
+    'pkg_resources',
+    'requests',
+    'yaml',
+]
+
+
+def measure(snapcraft_command, args):
+    """Run snapcraft with args and return what it imported and timings.
+
+    :returns: the imported modules, the seconds spent running snapcraft
+              after the interpreter started and the seconds for the whole
+              process.
+    """
+    with tempfile.NamedTemporaryFile('r', suffix='.json') as report:
+        start = time.perf_counter()
+        subprocess.check_call(
+            [sys.executable, '-c', _PROBE, snapcraft_command,
+             report.name] + args,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        total = time.perf_counter() - start
+        data = json.load(report)
+    return data['modules'], data['seconds'], total
+
+
+class StartupTestCase(integration_tests.TestCase):
+
+    def test_commands_do_not_import_heavy_modules(self):
+        for args in _COMMANDS:
+            modules, seconds, total = measure(self.snapcraft_command, args)
+            self.addDetail(' '.join(args), text_content(
+                '{} modules, {:.3f}s in snapcraft, {:.3f}s in '
+                'total'.format(len(modules), seconds, total)))
+
+            self.assertEqual(
+                [], [m for m in _HEAVY_MODULES if m in modules],
+                'snapcraft {} imports heavy modules'.format(' '.join(args)))
+
+
+def main(runs=10):
+    snapcraft_command = os.path.join(
+        os.path.dirname(__file__), '..', 'bin', 'snapcraft')
+    for args in _COMMANDS:
+        results = [measure(snapcraft_command, args) for _ in range(runs)]
+        print('{:<14} {:>4} modules {:>8.1f}ms in snapcraft {:>8.1f}ms in '
+              'total'.format(
+                  ' '.join(args), len(results[0][0]),
+                  statistics.median(r[1] for r in results) * 1000,
+                  statistics.median(r[2] for r in results) * 1000))
+
+
+if __name__ == '__main__':
+    main()
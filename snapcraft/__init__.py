@@ -113,10 +113,11 @@ be used in any part irrespective of the plugin, these are
 
 import contextlib
 import os
-import shutil
 
 from snapcraft import common
+from snapcraft import jobserver
 from snapcraft import sources
+from snapcraft import sync
 
 
 class BasePlugin:
@@ -204,22 +205,23 @@ class BasePlugin:
     def build(self):
         """Build the source code retrieved from the pull phase.
 
-        The base implementation only copies sourcedir to builddir. Override
-        this method if you need to process the source code to make it runnable.
+        The base implementation only syncs builddir with sourcedir, what
+        previous builds left in builddir is kept so they can be picked up
+        from. Override this method if you need to process the source code
+        to make it runnable.
         """
-        if os.path.exists(self.builddir):
-            shutil.rmtree(self.builddir)
-
         source_subdir = getattr(self.options, 'source_subdir', None)
         if source_subdir:
             sourcedir = os.path.join(self.sourcedir, source_subdir)
+            ignore = ()
         else:
             sourcedir = self.sourcedir
+            ignore = common.SNAPCRAFT_FILES
 
-        shutil.copytree(
-            sourcedir, self.builddir, symlinks=True,
-            ignore=lambda d, s: common.SNAPCRAFT_FILES
-            if d is self.sourcedir else [])
+        sync.sync_tree(
+            sourcedir, self.builddir,
+            os.path.join(self.partdir, 'build-sources'), ignore=ignore,
+            link=bool(os.environ.get('SNAPCRAFT_LINK_SOURCES')))
 
     def snap_fileset(self):
         """Return a list of files to include or exclude in the resulting snap
@@ -253,6 +255,16 @@ class BasePlugin:
         """
         return []
 
+    def local_inputs(self):
+        """Return the paths in the project the build reads, other than source.
+
+        A change to the source of a part makes it build again. Override
+        this method if the build also reads files from the project, with
+        paths relative to it, so that changing them has the same effect.
+        Directories are listed with everything in them.
+        """
+        return []
+
     # Helpers
     def run(self, cmd, cwd=None, **kwargs):
         if cwd is None:
@@ -269,3 +281,37 @@ class BasePlugin:
             print(' '.join(cmd))
         os.makedirs(cwd, exist_ok=True)
         return common.run_output(cmd, cwd=cwd, **kwargs)
+
+    def run_make(self, cmd, **kwargs):
+        """Run a make command, with jobs from the snapcraft job server.
+
+        The build is not parallel if the part sets disable-parallel.
+        """
+        server = jobserver.get()
+        if server and not getattr(self.options, 'disable_parallel', False):
+            env = dict(kwargs.get('env') or os.environ)
+            env['MAKEFLAGS'] = ' '.join(
+                [server.makeflags] +
+                ([env['MAKEFLAGS']] if env.get('MAKEFLAGS') else []))
+            kwargs['env'] = env
+            kwargs['pass_fds'] = server.fds
+        return self.run(cmd, **kwargs)
+
+    @property
+    def parallel_build_count(self):
+        """The number of jobs for build tools that cannot use run_make."""
+        if getattr(self.options, 'disable_parallel', False):
+            return 1
+        return jobserver.parallel_build_count()
+
+    def probe(self, cmd, depends_on=()):
+        """Return the output of cmd, a query about a tool in the build env.
+
+        Unlike with run_output, the output is cached across builds for as
+        long as the tool, and the files in depends_on, do not change. Use
+        it for facts such as the version of a compiler or interpreter. See
+        snapcraft.common.probe.
+        """
+        return common.probe(
+            cmd, lambda: self.run_output(cmd),
+            path=common.get_exec_env().get('PATH'), depends_on=depends_on)
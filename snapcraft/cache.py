@@ -0,0 +1,136 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright (C) 2015 Canonical Ltd
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""A local cache for the results of building parts.
+
+The cache is enabled by pointing SNAPCRAFT_BUILD_CACHE to a directory,
+which can be shared by several projects. Each entry holds a compressed
+copy of a part's install directory, stored under a key computed from the
+inputs of the build step. The total size of the cache is kept under
+SNAPCRAFT_BUILD_CACHE_SIZE megabytes (2048 by default) by evicting the
+least recently used entries.
+"""
+
+import contextlib
+import logging
+import os
+import shutil
+import tarfile
+import tempfile
+
+
+logger = logging.getLogger(__name__)
+
+_DEFAULT_MAX_SIZE = 2048
+
+
+class BuildCache:
+
+    def __init__(self, cachedir, max_size=_DEFAULT_MAX_SIZE * 1024 * 1024):
+        self.cachedir = cachedir
+        self.max_size = max_size
+
+    def _entry(self, key):
+        return os.path.join(self.cachedir, '{}.tar.gz'.format(key))
+
+    def restore(self, key, installdir):
+        """Replace installdir with the tree cached for key.
+
+        An entry that cannot be read, like one truncated by a full disk, is
+        removed from the cache and treated as missing.
+
+        :returns: True if key was found in the cache.
+        """
+        entry = self._entry(key)
+        try:
+            with tarfile.open(entry) as tar:
+                if os.path.exists(installdir):
+                    shutil.rmtree(installdir)
+                os.makedirs(installdir)
+                tar.extractall(path=installdir)
+        except FileNotFoundError:
+            return False
+        except (tarfile.ReadError, EOFError) as e:
+            logger.warning('Removing %s from the build cache: %s',
+                           os.path.basename(entry), e)
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(entry)
+            # Do not leave what was extracted before the error for the build.
+            if os.path.exists(installdir):
+                shutil.rmtree(installdir)
+            os.makedirs(installdir)
+            return False
+
+        # The modification time tracks when an entry was last used.
+        with contextlib.suppress(FileNotFoundError):
+            os.utime(entry)
+
+        return True
+
+    def store(self, key, installdir):
+        """Save a copy of installdir in the cache under key."""
+        os.makedirs(self.cachedir, exist_ok=True)
+        # Write to a temporary file first so concurrent snapcraft runs never
+        # see a partial entry.
+        fd, tmp = tempfile.mkstemp(dir=self.cachedir, suffix='.partial')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                with tarfile.open(fileobj=f, mode='w:gz',
+                                  compresslevel=1) as tar:
+                    tar.add(installdir, arcname='.')
+            os.rename(tmp, self._entry(key))
+        finally:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(tmp)
+
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used entries to honor max_size."""
+        entries = []
+        for name in os.listdir(self.cachedir):
+            if not name.endswith('.tar.gz'):
+                continue
+            with contextlib.suppress(FileNotFoundError):
+                st = os.stat(os.path.join(self.cachedir, name))
+                entries.append((st.st_mtime, st.st_size, name))
+
+        size = sum(e[1] for e in entries)
+        for mtime, entry_size, name in sorted(entries):
+            if size <= self.max_size:
+                break
+            logger.debug('Evicting %s from the build cache', name)
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(os.path.join(self.cachedir, name))
+            size -= entry_size
+
+
+def get_build_cache():
+    """Return the BuildCache set up in the environment or None."""
+    cachedir = os.environ.get('SNAPCRAFT_BUILD_CACHE')
+    if not cachedir:
+        return None
+
+    max_size = os.environ.get('SNAPCRAFT_BUILD_CACHE_SIZE', '')
+    if not max_size:
+        max_size = _DEFAULT_MAX_SIZE
+    elif max_size.isdigit() and int(max_size) > 0:
+        max_size = int(max_size)
+    else:
+        raise EnvironmentError(
+            'SNAPCRAFT_BUILD_CACHE_SIZE must be a positive number of '
+            'megabytes, got {!r}'.format(max_size))
+    return BuildCache(os.path.abspath(cachedir), max_size * 1024 * 1024)
@@ -0,0 +1,127 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright (C) 2015 Canonical Ltd
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""A compiler cache for the parts built from C and C++ sources.
+
+The cache is enabled by setting SNAPCRAFT_CCACHE to 1, which keeps it in
+the snapcraft cache directory, or to the directory to keep it in. Either
+way it is shared by all parts and projects. The C and C++ compilers found
+in the PATH of the build environment are then run through ccache and the
+cache is kept under SNAPCRAFT_CCACHE_SIZE megabytes (5120 by default).
+"""
+
+import collections
+import contextlib
+import logging
+import os
+import subprocess
+
+from snapcraft import common
+
+
+logger = logging.getLogger(__name__)
+
+_DEFAULT_MAX_SIZE = 5120
+# The ccache package links the names of the compilers it knows to ccache
+# in this directory.
+_MASQUERADE_DIR = '/usr/lib/ccache'
+# The counters reported by `ccache --print-stats` and by `ccache -s` in
+# versions that do not have it.
+_COUNTERS = {
+    'direct_cache_hit': 'hits',
+    'preprocessed_cache_hit': 'hits',
+    'cache_miss': 'misses',
+    'cache hit (direct)': 'hits',
+    'cache hit (preprocessed)': 'hits',
+    'cache miss': 'misses',
+}
+
+Stats = collections.namedtuple('Stats', ['hits', 'misses'])
+
+
+def get_cachedir():
+    """Return the directory of the compiler cache or None if disabled."""
+    value = os.environ.get('SNAPCRAFT_CCACHE')
+    if not value or value == '0':
+        return None
+    if value == '1':
+        return os.path.join(common.get_cachedir(), 'ccache')
+    return os.path.abspath(value)
+
+
+def env():
+    """Return the build environment that runs the compilers with ccache."""
+    cachedir = get_cachedir()
+    if not cachedir:
+        return []
+
+    max_size = int(os.environ.get('SNAPCRAFT_CCACHE_SIZE', _DEFAULT_MAX_SIZE))
+    return [
+        'PATH="{}:$PATH"'.format(_MASQUERADE_DIR),
+        'CCACHE_DIR={}'.format(cachedir),
+        'CCACHE_MAXSIZE={}M'.format(max_size),
+        # Paths within the project are hashed relative to the directory
+        # being compiled in, so other checkouts of it can use the cache.
+        'CCACHE_BASEDIR={}'.format(os.getcwd()),
+    ]
+
+
+def get_stats(cachedir):
+    """Return the hits and misses counted in cachedir or None."""
+    ccache_env = dict(os.environ, CCACHE_DIR=cachedir)
+    for option in '--print-stats', '-s':
+        try:
+            output = subprocess.check_output(
+                ['ccache', option], env=ccache_env, stderr=subprocess.DEVNULL)
+        except FileNotFoundError:
+            return None
+        except subprocess.CalledProcessError:
+            continue
+        break
+    else:
+        return None
+
+    counters = {'hits': 0, 'misses': 0}
+    for line in output.decode('utf8', 'replace').splitlines():
+        fields = line.rsplit(None, 1)
+        if len(fields) == 2 and fields[1].isdigit():
+            counter = _COUNTERS.get(fields[0].strip())
+            if counter:
+                counters[counter] += int(fields[1])
+    return Stats(**counters)
+
+
+@contextlib.contextmanager
+def summary():
+    """Log how many compilations within this context hit the cache.
+
+    The counters belong to the cache, so compilations of other snapcraft
+    runs sharing it at the same time are counted too.
+    """
+    cachedir = get_cachedir()
+    before = get_stats(cachedir) if cachedir else None
+    yield
+    if not before:
+        return
+
+    after = get_stats(cachedir)
+    if not after:
+        return
+    hits = after.hits - before.hits
+    total = hits + after.misses - before.misses
+    if total > 0:
+        logger.info('ccache: {} of {} compilations were cache hits '
+                    '({:.0%})'.format(hits, total, hits / total))
@@ -19,8 +19,24 @@
 
 import importlib
 
+from docopt import DocoptExit
+
 
 def load(command):
     """Import and return 'command'."""
     return importlib.import_module(
         'snapcraft.commands.{}'.format(command).replace('-', '_'))
+
+
+def get_jobs(args):
+    """Return the number of jobs in the arguments parsed for a command.
+
+    Like the other invalid arguments, anything but a positive integer ends
+    the command with its usage.
+    """
+    jobs = args['--jobs']
+    if not jobs.isdigit() or int(jobs) < 1:
+        raise DocoptExit(
+            'The number of jobs must be a positive integer, got {!r}'.format(
+                jobs))
+    return int(jobs)
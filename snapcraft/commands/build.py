@@ -24,16 +24,35 @@ Usage:
 
 Options:
   -h --help             show this help message and exit.
+  -j N --jobs=N         process up to N independent parts concurrently
+                        [default: 1].
+  --plan                show the steps that would run, why and how long
+                        they are expected to take, without running them.
+  --trace=FILE          write a timeline of the steps that ran to FILE,
+                        in the Chrome trace event format.
+  --watch               after running, watch the parts with local sources
+                        and run again when they change.
 
 """
 
 from docopt import docopt
 
-from snapcraft import lifecycle
+from snapcraft import (
+    commands,
+    lifecycle,
+    trace,
+)
 
 
 def main(argv=None):
     argv = argv if argv else []
     args = docopt(__doc__, argv=argv)
-
-    lifecycle.execute('build', args['PART'])
+    jobs = commands.get_jobs(args)
+
+    if args['--plan']:
+        lifecycle.show_plan('build', args['PART'], jobs=jobs)
+    elif args['--watch']:
+        lifecycle.watch('build', args['PART'], jobs=jobs)
+    else:
+        with trace.record(args['--trace']):
+            lifecycle.execute('build', args['PART'], jobs=jobs)
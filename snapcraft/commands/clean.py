@@ -43,7 +43,7 @@ def main(argv=None):
     argv = argv if argv else []
     args = docopt(__doc__, argv=argv)
 
-    config = snapcraft.yaml.load_config()
+    config = snapcraft.yaml.load_config(args['PART'])
 
     if args['PART']:
         config.validate_parts(args['PART'])
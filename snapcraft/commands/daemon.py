@@ -0,0 +1,51 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright (C) 2015 Canonical Ltd
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+snapcraft daemon
+
+Keep snapcraft loaded in the background so other commands start faster.
+
+Commands are handed to the daemon when SNAPCRAFT_DAEMON is set to the path
+of the socket it listens on, and run as usual if it is not running.
+
+Usage:
+  daemon [options]
+
+Options:
+  -h --help             show this help message and exit.
+  --socket=PATH         the socket to listen on, defaults to the value of
+                        SNAPCRAFT_DAEMON.
+"""
+
+import os
+
+from docopt import docopt
+
+from snapcraft import daemon
+
+
+def main(argv=None):
+    argv = argv if argv else []
+    args = docopt(__doc__, argv=argv)
+
+    path = args['--socket'] or os.environ.get('SNAPCRAFT_DAEMON')
+    if not path:
+        raise EnvironmentError(
+            'Set SNAPCRAFT_DAEMON or use --socket to choose where the '
+            'daemon listens')
+
+    daemon.serve(os.path.abspath(path))
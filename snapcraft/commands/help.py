@@ -40,7 +40,10 @@ import sys
 from docopt import docopt
 
 import snapcraft
-from snapcraft import sources
+from snapcraft import (
+    plugin_index,
+    sources,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -71,17 +74,16 @@ def _topic_help(module_name, devel):
         print(_TOPICS[module_name].__doc__)
 
 
-def _module_help(module_name, devel):
-    try:
-        module = importlib.import_module(
-            'snapcraft.plugins.{}'.format(module_name))
-        if module.__doc__ and devel:
-            help(module)
-        elif module.__doc__:
-            print(module.__doc__)
-        else:
-            print('The plugin has no documentation')
-    except ImportError:
+def _module_help(plugin_name, devel):
+    plugin = plugin_index.get(plugin_name)
+    if not plugin:
         logger.error('The plugin does not exist. Run `snapcraft list-plugins` '
                      'to see the available plugins.')
         sys.exit(1)
+
+    if plugin.doc and devel:
+        help(importlib.import_module(plugin.module))
+    elif plugin.doc:
+        print(plugin.doc)
+    else:
+        print('The plugin has no documentation')
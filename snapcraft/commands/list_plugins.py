@@ -27,17 +27,14 @@ Options:
   -h --help             show this help message and exit.
 """
 
-import pkgutil
-
 from docopt import docopt
 
-import snapcraft.plugins
+from snapcraft import plugin_index
 
 
 def main(argv=None):
     argv = argv if argv else []
     docopt(__doc__, argv=argv)
 
-    for importer, modname, is_package in pkgutil.iter_modules(
-            snapcraft.plugins.__path__):
-        print(modname.replace('_', '-'))
+    for name in plugin_index.names():
+        print(name)
@@ -24,16 +24,31 @@ Usage:
 
 Options:
   -h --help             show this help message and exit.
+  -j N --jobs=N         process up to N independent parts concurrently
+                        [default: 1].
+  --plan                show the steps that would run, why and how long
+                        they are expected to take, without running them.
+  --trace=FILE          write a timeline of the steps that ran to FILE,
+                        in the Chrome trace event format.
 
 """
 
 from docopt import docopt
 
-from snapcraft import lifecycle
+from snapcraft import (
+    commands,
+    lifecycle,
+    trace,
+)
 
 
 def main(argv=None):
     argv = argv if argv else []
     args = docopt(__doc__, argv=argv)
+    jobs = commands.get_jobs(args)
 
-    lifecycle.execute('pull', args['PART'])
+    if args['--plan']:
+        lifecycle.show_plan('pull', args['PART'], jobs=jobs)
+    else:
+        with trace.record(args['--trace']):
+            lifecycle.execute('pull', args['PART'], jobs=jobs)
@@ -25,6 +25,12 @@ Usage:
 Options:
   DIRECTORY             optional target directory to snap.
   -h --help             show this help message and exit.
+  -j N --jobs=N         process up to N independent parts concurrently
+                        [default: 1].
+  --plan                show the steps that would run to get the parts ready
+                        to be snapped, without running them.
+  --trace=FILE          write a timeline of the steps that ran to FILE,
+                        in the Chrome trace event format.
 
 """
 
@@ -36,8 +42,10 @@ import yaml
 from docopt import docopt
 
 from snapcraft import (
+    commands,
     common,
     lifecycle,
+    trace,
 )
 
 
@@ -62,7 +70,17 @@ def _format_snap_name(snap):
 def main(argv=None):
     argv = argv if argv else []
     args = docopt(__doc__, argv=argv)
+    jobs = commands.get_jobs(args)
 
+    if args['--plan']:
+        lifecycle.show_plan('strip', jobs=jobs)
+        return
+
+    with trace.record(args['--trace']):
+        _snap(args, jobs)
+
+
+def _snap(args, jobs):
     if args['DIRECTORY']:
         # TODO: migrate to meta/snap.yaml
         # TODO: write integration test
@@ -71,11 +89,12 @@ def main(argv=None):
     else:
         # make sure the full lifecycle is executed
         snap_dir = common.get_snapdir()
-        snap = lifecycle.execute('strip')
+        snap = lifecycle.execute('strip', jobs=jobs)
 
     snap_name = _format_snap_name(snap)
 
     logger.info('Snapping {}'.format(snap_name))
-    subprocess.check_call(
-        ['mksquashfs', snap_dir, snap_name, '-noappend', '-comp', 'xz'])
+    with trace.span('mksquashfs', 'snap', snap=snap_name):
+        subprocess.check_call(
+            ['mksquashfs', snap_dir, snap_name, '-noappend', '-comp', 'xz'])
     logger.info('Snapped {}'.format(snap_name))
@@ -16,12 +16,20 @@
 
 # Data/methods shared between plugins and snapcraft
 
+import contextlib
+import hashlib
+import json
 import os
+import re
+import shutil
 import subprocess
 import sys
 import tempfile
+import threading
 import urllib
 
+from snapcraft import trace
+
 
 SNAPCRAFT_FILES = ['snapcraft.yaml', 'parts', 'stage', 'snap']
 COMMAND_ORDER = ['pull', 'build', 'stage', 'strip']
@@ -32,34 +40,134 @@ _schemadir = _DEFAULT_SCHEMADIR
 _arch = None
 _arch_triplet = None
 
-env = []
+# The environment is tracked per thread so parts can be processed
+# concurrently, each with its own build environment.
+_env = threading.local()
+
+
+def get_env():
+    return getattr(_env, 'value', [])
+
+
+def set_env(env):
+    _env.value = env
 
 
 def assemble_env():
-    return '\n'.join(['export ' + e for e in env])
+    return '\n'.join(['export ' + e for e in get_env()])
 
 
 def run(cmd, **kwargs):
     assert isinstance(cmd, list), 'run command must be a list'
-    # FIXME: This is gross to keep writing this, even when env is the same
-    with tempfile.NamedTemporaryFile(mode='w+') as f:
-        f.write(assemble_env())
-        f.write('\n')
-        f.write('exec $*')
-        f.flush()
-        subprocess.check_call(['/bin/sh', f.name] + cmd, **kwargs)
+    kwargs['env'] = get_exec_env(kwargs.get('env'))
+    with trace.span(os.path.basename(cmd[0]), 'run', cmd=cmd):
+        subprocess.check_call(cmd, **kwargs)
 
 
 def run_output(cmd, **kwargs):
     assert isinstance(cmd, list), 'run command must be a list'
-    # FIXME: This is gross to keep writing this, even when env is the same
-    with tempfile.NamedTemporaryFile(mode='w+') as f:
-        f.write(assemble_env())
-        f.write('\n')
-        f.write('exec $*')
-        f.flush()
-        return subprocess.check_output(['/bin/sh', f.name] + cmd,
-                                       **kwargs).decode('utf8').strip()
+    kwargs['env'] = get_exec_env(kwargs.get('env'))
+    with trace.span(os.path.basename(cmd[0]), 'run', cmd=cmd):
+        output = subprocess.check_output(cmd, **kwargs)
+    return output.decode('utf8').strip()
+
+
+def get_exec_env(base=None):
+    """Return the environment to run commands with for the current env.
+
+    The assignments in the env are evaluated on top of base, or of the
+    environment of snapcraft if base is None. The result is reused for as
+    long as neither of them changes.
+    """
+    if base is None:
+        base = os.environ
+    env = get_env()
+    evaluated = getattr(_env, 'evaluated', None)
+    if evaluated and evaluated[0] == env and evaluated[1] == base:
+        return evaluated[2]
+
+    try:
+        exec_env = _evaluate_env(env, base)
+    except _ShellSyntaxError:
+        # Only the shell knows what to make of it.
+        exec_env = _evaluate_env_in_shell(env, base)
+    _env.evaluated = (list(env), dict(base), exec_env)
+    return exec_env
+
+
+class _ShellSyntaxError(Exception):
+    pass
+
+
+_ASSIGNMENT = re.compile(r'([A-Za-z_][A-Za-z0-9_]*)=(.*)$', re.DOTALL)
+_PARAMETER = re.compile(
+    r'\$(?:([A-Za-z_][A-Za-z0-9_]*)|\{([A-Za-z_][A-Za-z0-9_]*)\})')
+
+
+def _evaluate_env(env, base):
+    exec_env = dict(base)
+    for assignment in env:
+        match = _ASSIGNMENT.match(assignment)
+        if not match:
+            raise _ShellSyntaxError(assignment)
+        exec_env[match.group(1)] = _expand(match.group(2), exec_env)
+
+    return exec_env
+
+
+def _expand(value, variables):
+    """Expand value the way the shell does on the right of an assignment.
+
+    Quotes, backslashes and $NAME or ${NAME} references are supported,
+    anything else raises _ShellSyntaxError.
+    """
+    expanded = []
+    quoted = False
+    i = 0
+    while i < len(value):
+        c = value[i]
+        if c == '"':
+            quoted = not quoted
+            i += 1
+        elif c == "'" and not quoted:
+            end = value.find("'", i + 1)
+            if end < 0:
+                raise _ShellSyntaxError(value)
+            expanded.append(value[i + 1:end])
+            i = end + 1
+        elif c == '\\':
+            if i + 1 == len(value):
+                raise _ShellSyntaxError(value)
+            if quoted and value[i + 1] not in '$`"\\':
+                expanded.append(c)
+                i += 1
+            else:
+                expanded.append(value[i + 1])
+                i += 2
+        elif c == '$':
+            match = _PARAMETER.match(value, i)
+            if not match:
+                raise _ShellSyntaxError(value)
+            expanded.append(
+                variables.get(match.group(1) or match.group(2), ''))
+            i = match.end()
+        elif c == '`' or (not quoted and (c.isspace() or c in '|&;<>()~')):
+            raise _ShellSyntaxError(value)
+        else:
+            expanded.append(c)
+            i += 1
+
+    if quoted:
+        raise _ShellSyntaxError(value)
+
+    return ''.join(expanded)
+
+
+def _evaluate_env_in_shell(env, base):
+    script = '\n'.join(['export ' + e for e in env] + ['exec env -0'])
+    output = subprocess.check_output(['/bin/sh', '-c', script], env=base)
+    return dict(os.fsdecode(e).split('=', 1)
+                for e in output.split(b'\0') if e)
 
 
 def fatal():
@@ -69,20 +177,109 @@ def fatal():
 def get_arch():
     global _arch
     if _arch is None:
-        _arch = subprocess.check_output(
-            ['dpkg-architecture', '-qDEB_BUILD_ARCH']).decode('utf8').strip()
+        _arch = probe(['dpkg-architecture', '-qDEB_BUILD_ARCH'])
     return _arch
 
 
 def get_arch_triplet():
     global _arch_triplet
     if _arch_triplet is None:
-        _arch_triplet = subprocess.check_output(
-            ['dpkg-architecture', '-qDEB_BUILD_MULTIARCH']
-        ).decode('utf8').strip()
+        _arch_triplet = probe(['dpkg-architecture', '-qDEB_BUILD_MULTIARCH'])
     return _arch_triplet
 
 
+def get_cachedir():
+    """Return the directory for the caches shared by all projects."""
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(
+        os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'snapcraft')
+
+
+# Changes whenever packages are installed or removed.
+DPKG_STATUS = '/var/lib/dpkg/status'
+
+# Probe results loaded from disk, by cache file.
+_probes = {}
+_probes_lock = threading.Lock()
+
+
+def probe(cmd, run=None, path=None, depends_on=()):
+    """Return the output of cmd, a query about a tool such as a compiler.
+
+    The output is cached on disk and reused for as long as the tool found
+    for cmd[0] in path, or in the PATH of snapcraft if path is None, is
+    the same file. Answers that also depend on what else is installed
+    need the files that record it, such as DPKG_STATUS, in depends_on;
+    they are reused for as long as those files do not change either. run
+    is called to get the output when it is not cached, by default cmd
+    runs without the build environment.
+    """
+    if run is None:
+        def run():
+            return subprocess.check_output(cmd).decode('utf8').strip()
+
+    key = _probe_key(cmd, path, depends_on)
+    if key is None:
+        return run()
+
+    cache_file = os.path.join(get_cachedir(), 'probes.json')
+    with _probes_lock:
+        probes = _load_probes(cache_file)
+        if key in probes:
+            return probes[key]
+
+    output = run()
+    with _probes_lock:
+        probes[key] = output
+        _save_probes(cache_file, probes)
+    return output
+
+
+def _probe_key(cmd, path, depends_on):
+    tool = shutil.which(cmd[0], path=path)
+    if not tool:
+        return None
+    tool = os.path.realpath(tool)
+    st = os.stat(tool)
+    # The dpkg tools can be told what to answer through the environment.
+    deb_env = sorted((k, v) for k, v in os.environ.items()
+                     if k.startswith('DEB_'))
+    identity = [tool, st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns,
+                cmd[1:], deb_env]
+    for dependency in depends_on:
+        try:
+            st = os.stat(dependency)
+        except FileNotFoundError:
+            identity.append([dependency])
+        else:
+            identity.append([dependency, st.st_size, st.st_mtime_ns])
+    return hashlib.sha256(json.dumps(identity).encode()).hexdigest()
+
+
+def _load_probes(cache_file):
+    if cache_file not in _probes:
+        try:
+            with open(cache_file) as f:
+                _probes[cache_file] = json.load(f)
+        except (FileNotFoundError, ValueError):
+            _probes[cache_file] = {}
+    return _probes[cache_file]
+
+
+def _save_probes(cache_file, probes):
+    # Failing to save only means probing again next time.
+    with contextlib.suppress(OSError):
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(cache_file))
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(probes, f)
+            os.rename(tmp, cache_file)
+        finally:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(tmp)
+
+
 def get_partsdir():
     return os.path.join(os.getcwd(), 'parts')
 
@@ -118,5 +315,4 @@ def isurl(url):
 
 
 def reset_env():
-    global env
-    env = []
+    set_env([])
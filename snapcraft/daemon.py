@@ -0,0 +1,223 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright (C) 2015 Canonical Ltd
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Run snapcraft commands from a process that is already loaded.
+
+The daemon imports snapcraft, its commands and plugins once and then
+listens on a Unix socket. Clients send their arguments, working directory
+and environment along with their standard streams; the daemon forks a
+child for each of them that runs the command as if it had been started
+from the client, so nothing leaks from one command into the next.
+"""
+
+import array
+import contextlib
+import importlib
+import json
+import logging
+import os
+import pkgutil
+import signal
+import socket
+import struct
+import sys
+
+
+logger = logging.getLogger(__name__)
+
+_HEADER = struct.Struct('!I')
+_STATUS = struct.Struct('!i')
+
+
+def serve(path):
+    """Serve snapcraft commands on the Unix socket at path until killed."""
+    _preload()
+
+    if os.path.exists(path):
+        conn = _connect(path)
+        if conn:
+            conn.close()
+            raise EnvironmentError(
+                'A snapcraft daemon is already listening on {!r}'.format(
+                    path))
+        # Left behind by a daemon that did not exit cleanly.
+        os.remove(path)
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    old_umask = os.umask(0o077)
+    try:
+        server.bind(path)
+    finally:
+        os.umask(old_umask)
+    server.listen(8)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    logger.info('Listening on {}'.format(path))
+
+    try:
+        while True:
+            conn, _ = server.accept()
+            sys.stdout.flush()
+            sys.stderr.flush()
+            pid = os.fork()
+            if pid == 0:
+                server.close()
+                _handle(conn)
+            conn.close()
+            _reap_children()
+    finally:
+        server.close()
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(path)
+
+
+def _connect(path):
+    """Return a connection to the daemon at path or None if it is down."""
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        conn.connect(path)
+    except (FileNotFoundError, ConnectionRefusedError):
+        conn.close()
+        return None
+    return conn
+
+
+def forward(path, argv, fds=(0, 1, 2)):
+    """Run snapcraft with argv in the daemon listening on path.
+
+    :param fds: the standard input, output and error for the command.
+    :returns: the exit status of the command or None if no daemon is
+              listening on path, in which case the command should run
+              locally.
+    """
+    conn = _connect(path)
+    if not conn:
+        return None
+
+    with conn:
+        payload = json.dumps({
+            'argv': argv,
+            'cwd': os.getcwd(),
+            'env': dict(os.environ),
+        }).encode('utf8')
+        conn.sendmsg(
+            [_HEADER.pack(len(payload)) + payload],
+            [(socket.SOL_SOCKET, socket.SCM_RIGHTS, array.array('i', fds))])
+
+        pid = _recv_struct(conn, _STATUS)
+        try:
+            status = _recv_struct(conn, _STATUS)
+        except KeyboardInterrupt:
+            # The command runs in another process group, pass the
+            # interruption on.
+            if pid:
+                with contextlib.suppress(ProcessLookupError):
+                    os.kill(pid, signal.SIGINT)
+            status = _recv_struct(conn, _STATUS)
+
+    return 1 if status is None else status
+
+
+def _preload():
+    # Clients import this module too, so what only the daemon needs is not
+    # imported at the module level.
+    importlib.import_module('snapcraft.main')
+    importlib.import_module('snapcraft.lifecycle')
+    for package in 'snapcraft.commands', 'snapcraft.plugins':
+        module = importlib.import_module(package)
+        for _, name, _ in pkgutil.iter_modules(module.__path__):
+            importlib.import_module('{}.{}'.format(package, name))
+
+
+def _reap_children():
+    with contextlib.suppress(ChildProcessError):
+        while os.waitpid(-1, os.WNOHANG)[0]:
+            pass
+
+
+def _handle(conn):
+    status = 1
+    try:
+        request = _recv_request(conn)
+        conn.sendall(_STATUS.pack(os.getpid()))
+        status = _run(request)
+    finally:
+        with contextlib.suppress(OSError):
+            conn.sendall(_STATUS.pack(status))
+        os._exit(status)
+
+
+def _recv_request(conn):
+    fds = array.array('i')
+    data, ancdata, _, _ = conn.recvmsg(
+        _HEADER.size, socket.CMSG_LEN(3 * fds.itemsize))
+    for level, kind, cmsg_data in ancdata:
+        if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+            fds.frombytes(cmsg_data[:len(cmsg_data) -
+                                    (len(cmsg_data) % fds.itemsize)])
+    if len(fds) != 3:
+        raise EnvironmentError('Expected the standard streams of the client')
+
+    for i, fd in enumerate(fds):
+        os.dup2(fd, i)
+        os.close(fd)
+
+    size = _HEADER.unpack(data)[0]
+    payload = b''
+    while len(payload) < size:
+        chunk = conn.recv(size - len(payload))
+        if not chunk:
+            raise EnvironmentError('The client hung up')
+        payload += chunk
+
+    return json.loads(payload.decode('utf8'))
+
+
+def _recv_struct(conn, fmt):
+    data = b''
+    while len(data) < fmt.size:
+        chunk = conn.recv(fmt.size - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return fmt.unpack(data)[0]
+
+
+def _run(request):
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    os.chdir(request['cwd'])
+    os.environ.clear()
+    os.environ.update(request['env'])
+    sys.argv = ['snapcraft'] + request['argv']
+    # The daemon configured logging for itself, let the command do it again
+    # for the streams it was given.
+    logging.getLogger().handlers = []
+
+    try:
+        importlib.import_module('snapcraft.main').main()
+        status = 0
+    except SystemExit as e:
+        if e.code is None or isinstance(e.code, int):
+            status = e.code or 0
+        else:
+            print(e.code, file=sys.stderr)
+            status = 1
+    except KeyboardInterrupt:
+        status = 130
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+
+    return status
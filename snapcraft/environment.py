@@ -0,0 +1,167 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright (C) 2015 Canonical Ltd
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Environments assembled from the assignments of parts and plugins.
+
+Parts and plugins describe their environment with shell assignments, e.g.
+'PATH="/stage/bin:$PATH"' or 'PYTHONPATH=/stage/usr/lib/python3'. When the
+environments of many parts are put together the same directories end up
+in PATH, CFLAGS or LDFLAGS once for every part.
+
+An Environment merges the assignments that prepend or append to a list of
+directories or flags, separated by colons or spaces, into one assignment
+per variable. Directories already in a list are dropped, which keeps the
+order in which they are looked up. Flags can take arguments, e.g.
+'-isystem /stage/include', so what an assignment adds to a list of flags
+is only dropped when another assignment added exactly the same.
+Assignments that refer to other variables are kept as they are, in
+order, so they see the same values they would have seen otherwise.
+"""
+
+import collections
+import re
+
+
+_ASSIGNMENT = re.compile(r'([A-Za-z_][A-Za-z0-9_]*)=(.*)$', re.DOTALL)
+_PATH_SEPARATOR = ':'
+_SEPARATORS = (_PATH_SEPARATOR, ' ')
+
+
+class Environment:
+
+    def __init__(self, assignments=()):
+        # Each entry is either an assignment kept as is or an ordered dict
+        # of the variables merged between two such assignments.
+        self._entries = []
+        self.extend(assignments)
+
+    def extend(self, assignments):
+        for assignment in assignments:
+            self.add(assignment)
+
+    def add(self, assignment):
+        parsed = _parse(assignment)
+        if parsed:
+            name, separator, prepend, value, append = parsed
+            variables = self._merged_variables()
+            variable = variables.get(name)
+            if variable is None:
+                variable = variables[name] = _Variable(name)
+            if variable.merge(separator, prepend, value, append):
+                return
+        self._entries.append(assignment)
+
+    def _merged_variables(self):
+        if not self._entries or isinstance(self._entries[-1], str):
+            self._entries.append(collections.OrderedDict())
+        return self._entries[-1]
+
+    def __iter__(self):
+        for entry in self._entries:
+            if isinstance(entry, str):
+                yield entry
+            else:
+                for variable in entry.values():
+                    yield variable.render()
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __repr__(self):
+        return 'Environment({!r})'.format(list(self))
+
+
+class _Variable:
+
+    def __init__(self, name):
+        self.name = name
+        self.separator = None
+        self.prefix = []
+        # None keeps the value the variable had before.
+        self.value = None
+        self.suffix = []
+
+    def merge(self, separator, prepend, value, append):
+        """Merge an assignment, return False if it cannot be merged."""
+        if separator and self.separator and separator != self.separator:
+            return False
+        self.separator = self.separator or separator
+
+        if value is not None:
+            self.prefix, self.value, self.suffix = [], value, []
+        self.prefix = _unique(prepend + self.prefix)
+        self.suffix = [e for e in _unique(self.suffix + append)
+                       if e not in self.prefix]
+        return True
+
+    def render(self):
+        value = '$' + self.name if self.value is None else self.value
+        if self.separator:
+            value = self.separator.join(self.prefix + [value] + self.suffix)
+        return '{}="{}"'.format(self.name, value)
+
+
+def _unique(entries):
+    seen = set()
+    unique = []
+    for entry in entries:
+        if entry not in seen:
+            seen.add(entry)
+            unique.append(entry)
+    return unique
+
+
+def _parse(assignment):
+    """Return the parts of an assignment that can be merged or None.
+
+    The parts are the name, the separator of the list, the entries to
+    prepend, the new value (None if the variable keeps its value) and the
+    entries to append.
+    """
+    match = _ASSIGNMENT.match(assignment)
+    if not match:
+        return None
+    name, value = match.groups()
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        value = value[1:-1]
+    # Leave anything that needs more than splitting to the shell.
+    if any(c in value for c in '"\'\\`~'):
+        return None
+
+    reference = '$' + name
+    for separator in _SEPARATORS:
+        if value.endswith(separator + reference):
+            prepend = _split(value[:-len(separator + reference)], separator)
+            append = []
+        elif value.startswith(reference + separator):
+            prepend = []
+            append = _split(value[len(reference + separator):], separator)
+        else:
+            continue
+        if any(not e or '$' in e for e in prepend + append):
+            return None
+        return name, separator, prepend, None, append
+
+    if '$' in value:
+        return None
+    return name, None, [], value, []
+
+
+def _split(value, separator):
+    # Only directories can be told apart, flags are kept as they were given.
+    if separator == _PATH_SEPARATOR:
+        return value.split(separator)
+    return [value]
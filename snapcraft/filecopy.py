@@ -0,0 +1,185 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright (C) 2015 Canonical Ltd
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Copy files without reading them through snapcraft where possible.
+
+On filesystems that support it, such as btrfs or xfs, a copy is a reflink
+that shares its blocks with the original until either of them changes.
+Otherwise the kernel copies the data with copy_file_range or sendfile, and
+only if none of those work are files read and written in chunks. Files
+that cannot be written to can be hard linked instead, which costs no space
+at all.
+
+Trees are copied with a pool of threads, as copying many small files is
+dominated by waiting on the filesystem.
+"""
+
+import concurrent.futures
+import contextlib
+import errno
+import fcntl
+import os
+import shutil
+
+
+# _IOW(0x94, 9, int) from linux/fs.h.
+_FICLONE = 0x40049409
+# What a filesystem or kernel that cannot do a kind of copy answers.
+_UNSUPPORTED = frozenset([
+    errno.EBADF, errno.EINVAL, errno.ENOSYS, errno.ENOTTY,
+    errno.EOPNOTSUPP, errno.EXDEV,
+])
+_CHUNK_SIZE = 1024 * 1024
+_WORKERS = 8
+# Below this many files a pool of threads costs more than it saves.
+_MIN_PARALLEL = 16
+
+# The methods that failed, by the devices copied between, so they are not
+# tried for every file.
+_unsupported = set()
+
+
+def copy_file(src, dst, link=False):
+    """Copy the contents and metadata of src to dst, like shutil.copy2.
+
+    :param bool link: hard link src to dst if no one can write to src.
+    :returns: the path of the copy, inside dst if it is a directory.
+    """
+    if os.path.isdir(dst):
+        dst = os.path.join(dst, os.path.basename(src))
+
+    if link and _link(src, dst):
+        return dst
+
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        _copy_data(fsrc, fdst)
+    shutil.copystat(src, dst)
+    return dst
+
+
+def copy_files(pairs, link=False):
+    """Copy the files in pairs of sources and destinations, in parallel."""
+    pairs = list(pairs)
+    if len(pairs) < _MIN_PARALLEL:
+        for src, dst in pairs:
+            copy_file(src, dst, link)
+        return
+
+    with concurrent.futures.ThreadPoolExecutor(_WORKERS) as executor:
+        futures = [executor.submit(copy_file, src, dst, link)
+                   for src, dst in pairs]
+        for future in futures:
+            future.result()
+
+
+def copytree(src, dst, symlinks=False, link=False):
+    """Copy the tree at src to dst, which must not exist.
+
+    :param bool symlinks: copy symbolic links as links instead of what
+                          they point to, like shutil.copytree.
+    :param bool link: hard link the files no one can write to.
+    """
+    os.makedirs(dst)
+    files = []
+    dirs = [(src, dst)]
+    for root, dirnames, filenames in os.walk(src, followlinks=not symlinks):
+        target = os.path.join(dst, os.path.relpath(root, src))
+        for name in sorted(dirnames + filenames):
+            path = os.path.join(root, name)
+            if symlinks and os.path.islink(path):
+                os.symlink(os.readlink(path), os.path.join(target, name))
+            elif name in dirnames:
+                os.mkdir(os.path.join(target, name))
+                dirs.append((path, os.path.join(target, name)))
+            else:
+                files.append((path, os.path.join(target, name)))
+
+    copy_files(files, link)
+    # Copying into directories changes their modification times.
+    for path, target in reversed(dirs):
+        shutil.copystat(path, target)
+
+    return dst
+
+
+def _link(src, dst):
+    if os.stat(src).st_mode & 0o222:
+        return False
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError as e:
+        if e.errno in (errno.EXDEV, errno.EMLINK, errno.EPERM):
+            return False
+        raise
+    return True
+
+
+def _copy_data(fsrc, fdst):
+    src_fd = fsrc.fileno()
+    dst_fd = fdst.fileno()
+    devices = (os.fstat(src_fd).st_dev, os.fstat(dst_fd).st_dev)
+    for method in _reflink, _copy_file_range, _sendfile:
+        if (method, devices) in _unsupported:
+            continue
+        if method(src_fd, dst_fd):
+            return
+        _unsupported.add((method, devices))
+
+    shutil.copyfileobj(fsrc, fdst, _CHUNK_SIZE)
+
+
+def _reflink(src_fd, dst_fd):
+    try:
+        fcntl.ioctl(dst_fd, _FICLONE, src_fd)
+    except OSError as e:
+        if e.errno in _UNSUPPORTED:
+            return False
+        raise
+    return True
+
+
+def _copy_file_range(src_fd, dst_fd):
+    if not hasattr(os, 'copy_file_range'):
+        return False
+    return _copy_with(os.copy_file_range, src_fd, dst_fd)
+
+
+def _sendfile(src_fd, dst_fd):
+    return _copy_with(
+        lambda src, dst, count: os.sendfile(dst, src, None, count),
+        src_fd, dst_fd)
+
+
+def _copy_with(copy, src_fd, dst_fd):
+    """Copy everything from src_fd with copy(src_fd, dst_fd, count).
+
+    :returns: False if copy is not supported for these files, in which
+              case nothing was copied.
+    """
+    copied = 0
+    while True:
+        try:
+            sent = copy(src_fd, dst_fd, _CHUNK_SIZE * 8)
+        except OSError as e:
+            if copied == 0 and e.errno in _UNSUPPORTED:
+                return False
+            raise
+        if sent == 0:
+            # Some filesystems report nothing to copy instead of failing.
+            return copied > 0 or os.fstat(src_fd).st_size == 0
+        copied += sent
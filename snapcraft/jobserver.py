@@ -0,0 +1,93 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright (C) 2015 Canonical Ltd
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""A GNU make job server shared by the parts being built.
+
+While the lifecycle runs, a pipe holds a token for every job that can run
+on top of the one each make is always allowed. Every make started through
+BasePlugin.run_make takes its jobs from that pipe, so parts built
+concurrently share the processors of the machine instead of each of them
+trying to use all of them.
+"""
+
+import contextlib
+import os
+
+
+_server = None
+
+
+class JobServer:
+
+    def __init__(self, slots, parts=1):
+        """Create a job server for slots jobs in total.
+
+        :param int slots: the number of jobs to run at the same time.
+        :param int parts: the number of parts that can be built at the same
+                          time, each of them runs one job without a token.
+        """
+        self.slots = slots
+        self.parts = parts
+        self.fds = os.pipe()
+        # Tokens are written once, a full pipe would block; pipes hold far
+        # more than the number of processors of any machine.
+        os.write(self.fds[1], b'+' * max(slots - parts, 0))
+
+    @property
+    def makeflags(self):
+        # Newer versions of make call it --jobserver-auth but still accept
+        # the older name.
+        return '-j --jobserver-fds={},{}'.format(*self.fds)
+
+    @property
+    def parallel_build_count(self):
+        """The jobs for a part whose build tool cannot use the job server."""
+        return max(self.slots // self.parts, 1)
+
+    def close(self):
+        for fd in self.fds:
+            os.close(fd)
+
+
+def get():
+    """Return the job server for the running lifecycle or None."""
+    return _server
+
+
+@contextlib.contextmanager
+def running(parts=1, slots=None):
+    """Run a job server for as long as this context lasts.
+
+    :param int parts: the number of parts built at the same time.
+    :param int slots: the number of jobs, the number of processors by
+                      default, or parts if that is greater.
+    """
+    global _server
+    if slots is None:
+        slots = max(os.cpu_count() or 1, parts)
+    _server = JobServer(slots, parts)
+    try:
+        yield _server
+    finally:
+        _server.close()
+        _server = None
+
+
+def parallel_build_count():
+    """Return the jobs for a build tool that cannot use the job server."""
+    if _server:
+        return _server.parallel_build_count
+    return os.cpu_count() or 1
@@ -14,23 +14,32 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import collections
+import concurrent.futures
 import logging
+import os
+import threading
 
 import snapcraft
 import snapcraft.yaml
 
 from snapcraft import (
+    ccache,
     common,
+    jobserver,
     meta,
     pluginhandler,
     repo,
+    sources,
+    trace,
+    watcher,
 )
 
 
 logger = logging.getLogger(__name__)
 
 
-def execute(step, part_names=None):
+def execute(step, part_names=None, jobs=1):
     """Exectute until step in the lifecycle.
 
     Lifecycle execution will happen for each step iterating over all
@@ -42,68 +51,466 @@ def execute(step, part_names=None):
     and after is not in this set, an exception will be raised.
 
     :param str step: A valid step in the lifecycle: pull, build, strip or snap.
+    :param list part_names: A list of parts to execute the lifecycle on.
+    :param int jobs: The maximum amount of parts to process concurrently.
     :raises RuntimeError: If a prerequesite of the part needs to be staged
                           and such part is not in the list of parts to iterate
                           over.
+    :raises ValueError: If jobs is lower than 1.
     :returns: A dict with the snap name, version and architectures.
     """
-    config = snapcraft.yaml.load_config()
+    _validate_jobs(jobs)
+
+    config = snapcraft.yaml.load_config(part_names)
     repo.install_build_packages(config.build_tools)
 
-    _Executor(config).run(step, part_names)
+    with ccache.summary(), jobserver.running(jobs):
+        _Executor(config, jobs).run(step, part_names)
 
     return {'name': config.data['name'],
             'version': config.data['version'],
             'arch': config.data['architectures']}
 
 
+def watch(step, part_names=None, jobs=1):
+    """Execute until step, then again whenever a local source changes.
+
+    The sources of the parts to execute that are local directories are
+    watched. Executing again only runs the steps of the parts whose sources
+    changed, and those of the parts after them whose prerequisites staged
+    something different. Failures are logged and execution is attempted
+    again on the next change.
+
+    This runs until interrupted. The arguments are the same as those of
+    execute.
+    """
+    _validate_jobs(jobs)
+    execute(step, part_names, jobs)
+
+    local_sources = _local_sources(
+        snapcraft.yaml.load_config(part_names), part_names)
+    if not local_sources:
+        logger.warning('There are no local sources to watch')
+        return
+
+    with watcher.Watcher() as source_watcher:
+        for path in set(local_sources.values()):
+            source_watcher.add_tree(path)
+        logger.info('Watching the sources of {} for changes'.format(
+            ', '.join(sorted(local_sources))))
+
+        try:
+            while True:
+                changed = source_watcher.wait()
+                names = sorted(
+                    name for name, path in local_sources.items()
+                    if any(p == path or p.startswith(path + os.sep)
+                           for p in changed))
+                logger.info('The sources of {} changed'.format(
+                    ', '.join(names)))
+                try:
+                    execute(step, part_names, jobs)
+                except Exception as e:
+                    logger.error('{}'.format(e))
+        except KeyboardInterrupt:
+            pass
+
+
+def _local_sources(config, part_names):
+    parts = list(config.all_parts)
+    if part_names:
+        parts = [p for p in parts if p.name in part_names]
+        for part in parts:
+            parts.extend(d for d in part.deps if d not in parts)
+
+    local_sources = {}
+    for part in parts:
+        if sources.is_local(part.code.options):
+            local_sources[part.name] = os.path.abspath(
+                part.code.options.source)
+
+    return local_sources
+
+
+def show_plan(step, part_names=None, jobs=1):
+    """Print what executing until step in the lifecycle would do.
+
+    Each part step is listed in the order it would run, together with the
+    reason for running it and how long it took the last time it ran. The
+    estimated total time and the critical path, the longest chain of part
+    steps that depend on each other, are printed at the end.
+
+    The arguments are the same as those of execute.
+    """
+    _validate_jobs(jobs)
+
+    config = snapcraft.yaml.load_config(part_names)
+    executor = _Executor(config, jobs)
+    actions = executor.explain(step, part_names)
+
+    print('Plan for {!r}:'.format(step))
+    name_width = max([len(a['part']) for a in actions] + [0])
+    reason_width = max([len(a['reason'] or '') for a in actions] + [19])
+    for action in actions:
+        print('  {:{}}  {:5}  {:{}}  {}'.format(
+            action['part'], name_width, action['step'],
+            action['reason'] or 'up to date', reason_width,
+            _format_duration(action['duration']) if action['reason']
+            else '').rstrip())
+
+    total, critical_path = executor.estimate(actions)
+    if any(a['conditions'] for a in actions):
+        print('Estimated time: {}, without the steps that may run'.format(
+            _format_duration(total)))
+    else:
+        print('Estimated time: {}'.format(_format_duration(total)))
+    if critical_path:
+        print('Critical path: {}'.format(' -> '.join(
+            '{} {}'.format(a['part'], a['step']) for a in critical_path)))
+
+
+def _validate_jobs(jobs):
+    if jobs < 1:
+        raise ValueError(
+            'the number of jobs must be a positive integer, got {!r}'.format(
+                jobs))
+
+
+def _path_key(path):
+    return path[0], len(path[1])
+
+
+def _format_duration(duration):
+    if duration is None:
+        return 'no estimate'
+    minutes, seconds = divmod(duration, 60)
+    if minutes:
+        return '{:.0f}m {:.0f}s'.format(minutes, seconds)
+    return '{:.1f}s'.format(seconds)
+
+
 class _Executor:
 
-    def __init__(self, config):
+    def __init__(self, config, jobs=1):
         self.config = config
+        self.jobs = jobs
+        self.avoided_visits = 0
+        self._stage_lock = threading.Lock()
+
+    def run(self, step, part_names=None):
+        plan, part_names = self._resolve(step, part_names)
+        if self.jobs > 1:
+            self._run_parallel(plan)
+        else:
+            self._run_serial(plan)
+
+        self._create_meta(step, part_names)
+
+    def explain(self, step, part_names=None):
+        """Return the part steps run would go through, without running them.
+
+        The part steps are returned as dicts in the order they would run,
+        with the reason for running each of them, or None when it would be
+        skipped, and its duration the last time it ran.
+
+        A part is only built again for its prerequisites if what they
+        stage changes, which is only known once they are staged. The names
+        of the prerequisites a part step waits on this way are listed in
+        its conditions, which are empty for the part steps that run for
+        sure.
+        """
+        plan, _ = self._resolve(step, part_names)
+        if self.jobs > 1:
+            order = list(plan)
+        else:
+            order = self._serial_order(plan)
 
-    def run(self, step, part_names=None, recursed=False):
+        position = {p.name: i for i, p in enumerate(self.config.all_parts)}
+        actions = collections.OrderedDict()
+        for node in order:
+            part_name, current_step = node
+            part = self._get_part(part_name)
+            reason = part.dirty_reason(current_step)
+            # Prerequisites, however indirect, are inputs of the build step
+            # only, pull just waits for them to be staged.
+            causes = [d for d in plan[node] if d[0] == part_name]
+            if current_step == 'build':
+                causes.extend(
+                    (name, 'stage') for name in self._all_prereqs(part_name)
+                    if (name, 'stage') in actions)
+            conditions = []
+            for dependency in causes:
+                action = actions[dependency]
+                if reason or not action['reason']:
+                    continue
+                if dependency[0] != part_name:
+                    conditions.append(dependency[0])
+                elif action['conditions']:
+                    conditions.extend(action['conditions'])
+                else:
+                    reason = 'previous step runs'
+            if reason:
+                conditions = []
+            elif conditions:
+                conditions = sorted(set(conditions), key=position.get)
+                reason = 'may run if {} staged output changes'.format(
+                    ' or '.join("{}'s".format(c) for c in conditions))
+            actions[node] = {
+                'part': part_name,
+                'step': current_step,
+                'reason': reason,
+                'conditions': conditions,
+                'duration': part.get_durations().get(current_step),
+                'after': [actions[d] for d in plan[node]],
+            }
+
+        return list(actions.values())
+
+    def estimate(self, actions):
+        """Return the estimated time for actions and their critical path.
+
+        Part steps that would be skipped, that may not run or that never
+        ran take no time, and only those that run for sure are in the
+        critical path. With several jobs, part steps are assigned to the
+        first worker available once what they depend on is done.
+        """
+        workers = [0.0] * self.jobs
+        finish = {}
+        longest = {}
+        for action in actions:
+            duration = 0.0
+            if action['reason'] and not action['conditions']:
+                duration = action['duration'] or 0.0
+            ready = max([finish[id(a)] for a in action['after']] + [0.0])
+            worker = workers.index(min(workers))
+            finish[id(action)] = max(ready, workers[worker]) + duration
+            workers[worker] = finish[id(action)]
+
+            # Paths are compared by duration, then by length so that the
+            # longest chain is reported when there are no estimates.
+            path = max([longest[id(a)] for a in action['after']] + [(0, [])],
+                       key=_path_key)
+            if action['conditions']:
+                longest[id(action)] = path
+            else:
+                longest[id(action)] = (path[0] + duration,
+                                       path[1] + [action])
+
+        total = max(finish.values(), default=0.0)
+        critical = max(longest.values(), default=(0, []), key=_path_key)
+        return total, critical[1]
+
+    def _all_prereqs(self, part_name):
+        prereqs = set()
+        pending = [part_name]
+        while pending:
+            for name in self.config.part_prereqs(pending.pop()):
+                if name not in prereqs:
+                    prereqs.add(name)
+                    pending.append(name)
+        return prereqs
+
+    def _resolve(self, step, part_names):
         if part_names:
             self.config.validate_parts(part_names)
-            parts = {p for p in self.config.all_parts if p.name in part_names}
+            parts = [p for p in self.config.all_parts if p.name in part_names]
         else:
             parts = self.config.all_parts
             part_names = self.config.part_names
 
-        dirty = {p.name for p in parts if p.should_step_run('stage')}
+        for part in parts:
+            prereqs = self.config.part_prereqs(part.name)
+            if not prereqs.issubset(part_names):
+                raise RuntimeError(
+                    'Requested {!r} of {!r} but there are unsatisfied '
+                    'prerequisites: {!r}'.format(
+                        step, part.name, ' '.join(prereqs)))
+
+        plan = self._plan(step, parts)
+        self.avoided_visits = max(
+            0, self._recursive_visits(step, part_names) - len(plan))
+        logger.debug('Planned %d part steps, %d redundant visits avoided',
+                     len(plan), self.avoided_visits)
+
+        return plan, part_names
+
+    def _plan(self, step, parts):
+        """Return an ordered mapping of (part, step) to its dependencies.
+
+        Each step for a part only depends on the previous step for the same
+        part, the first step also depends on the stage step of the parts
+        listed in after. Parts that are a prerequisite of another part in
+        the set need to go all the way to the staging step to be able to
+        share the common assets that make them a dependency.
+        """
+        names = {p.name for p in parts}
+        required = set()
+        for part_name in names:
+            required |= self.config.part_prereqs(part_name)
+
         step_index = common.COMMAND_ORDER.index(step) + 1
+        stage_index = common.COMMAND_ORDER.index('stage') + 1
 
-        for step in common.COMMAND_ORDER[0:step_index]:
-            if step == 'stage':
-                pluginhandler.check_for_collisions(self.config.all_parts)
-            for part in parts:
-                self._run_step(step, part, part_names, dirty, recursed)
+        position = {p.name: i for i, p in enumerate(self.config.all_parts)}
+        plan = collections.OrderedDict()
+        # all_parts is sorted so prerequisites always come first.
+        for part in [p for p in self.config.all_parts if p.name in names]:
+            last_index = step_index
+            if part.name in required:
+                last_index = max(step_index, stage_index)
+            previous = [(name, 'stage') for name in sorted(
+                self.config.part_prereqs(part.name), key=position.get)]
+            for current_step in common.COMMAND_ORDER[0:last_index]:
+                plan[(part.name, current_step)] = previous
+                previous = [(part.name, current_step)]
 
-        self._create_meta(step, part_names)
+        return plan
+
+    def _recursive_visits(self, step, part_names, recursed=False):
+        """Return the part steps visited by staging prerequisites on demand.
+
+        For every step of every part, each of its prerequisites would be
+        taken through pull, build and stage again.
+        """
+        visits = 0
+        step_index = common.COMMAND_ORDER.index(step) + 1
+        for _ in common.COMMAND_ORDER[0:step_index]:
+            for part_name in part_names:
+                visits += 1
+                prereqs = self.config.part_prereqs(part_name)
+                if recursed:
+                    prereqs &= set(part_names)
+                if prereqs:
+                    visits += self._recursive_visits('stage', prereqs, True)
+
+        return visits
 
-    def _run_step(self, step, part, part_names, dirty, recursed):
-        common.reset_env()
-        prereqs = self.config.part_prereqs(part.name)
-        if recursed:
-            prereqs = prereqs & dirty
-        if prereqs and not prereqs.issubset(part_names):
-            raise RuntimeError(
-                'Requested {!r} of {!r} but there are unsatisfied '
-                'prerequisites: {!r}'.format(
-                    step, part.name, ' '.join(prereqs)))
-        elif prereqs:
-            # prerequisites need to build all the way to the staging
-            # step to be able to share the common assets that make them
-            # a dependency.
+    def _serial_order(self, plan):
+        """Return the nodes of plan in the order _run_serial runs them."""
+        order = []
+        visited = set()
+
+        def visit(node):
+            if node not in visited:
+                visited.add(node)
+                for dependency in plan[node]:
+                    visit(dependency)
+                order.append(node)
+
+        for step in common.COMMAND_ORDER:
+            for part in self.config.all_parts:
+                if (part.name, step) in plan:
+                    visit((part.name, step))
+
+        return order
+
+    def _run_serial(self, plan):
+        """Run the plan one step at a time for all the parts.
+
+        Prerequisites are taken to the stage step right before the first
+        step of the parts that need them.
+        """
+        done = set()
+        for step in common.COMMAND_ORDER:
+            # Staging can load more parts into the config.
+            for part in list(self.config.all_parts):
+                node = (part.name, step)
+                if node in plan:
+                    self._run_serial_node(node, plan, done)
+
+    def _run_serial_node(self, node, plan, done):
+        if node in done:
+            return
+
+        pending = [d for d in plan[node] if d not in done]
+        prereqs = [part_name for part_name, _ in pending
+                   if part_name != node[0]]
+        if prereqs:
             logger.info(
                 '{!r} has prerequisites that need to be staged: '
-                '{}'.format(part.name, ' '.join(prereqs)))
-            self.run('stage', prereqs, recursed=True)
+                '{}'.format(node[0], ' '.join(prereqs)))
+        for dependency in pending:
+            self._run_serial_node(dependency, plan, done)
+
+        self._run_node(node)
+        done.add(node)
+
+    def _run_parallel(self, plan):
+        """Run the plan using a pool of workers.
+
+        Execution is part-major: each part advances through its own steps
+        as soon as the prerequisites listed in its after keyword have been
+        staged, regardless of how far other parts are. This allows slow
+        pulls to overlap with the builds of unrelated parts.
+        """
+        pending = collections.OrderedDict(plan)
+        running = {}
+        done = set()
+
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.jobs) as pool:
+            while pending or running:
+                # pending keeps the sorted part order, so prerequisites are
+                # always favoured when several nodes are ready.
+                for node in list(pending):
+                    if len(running) >= self.jobs:
+                        break
+                    if set(pending[node]).issubset(done):
+                        del pending[node]
+                        running[pool.submit(
+                            self._run_node, node)] = node
+                finished, _ = concurrent.futures.wait(
+                    running, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in finished:
+                    future.result()
+                    done.add(running.pop(future))
+
+    def _run_node(self, node):
+        part_name, step = node
+        part = self._get_part(part_name)
+        if step == 'stage':
+            # Staging is quick as files are linked in, serializing it keeps
+            # the collision checks consistent with what is in stage.
+            with self._stage_lock:
+                self._check_for_collisions(part)
+                self._run_part_step(step, part)
+        else:
+            self._run_part_step(step, part)
+
+    def _check_for_collisions(self, part):
+        """Check part against every other part already in stage.
+
+        The parts in stage are not loaded, the files they staged are read
+        from their state. Only those staged by a snapcraft that did not
+        record them need to be loaded.
+        """
+        staged_files = {}
+        unrecorded = []
+        for name in self.config.part_names:
+            if (name == part.name or pluginhandler.get_last_step(name) not in
+                    ('stage', 'strip')):
+                continue
+            files = pluginhandler.get_staged_files(name)
+            if files is None:
+                unrecorded.append(name)
+            else:
+                staged_files[name] = files
+
+        self.config.load_parts(unrecorded)
+        pluginhandler.check_for_collisions(
+            [self._get_part(name) for name in unrecorded] + [part],
+            staged_files)
+
+    def _get_part(self, part_name):
+        return self.config.get_part(part_name)
 
-        common.env = self.config.build_env_for_part(part)
-        getattr(part, step)()
+    def _run_part_step(self, step, part):
+        common.set_env(self.config.build_env_for_part(part))
+        with trace.span('{} {}'.format(step, part.name), 'lifecycle',
+                        part=part.name, step=step):
+            getattr(part, step)()
 
     def _create_meta(self, step, part_names):
         if step == 'strip' and part_names == self.config.part_names:
-            common.env = self.config.snap_env()
+            common.set_env(self.config.snap_env())
             meta.create(self.config.data)
@@ -33,6 +33,8 @@ The available commands are:
   add-part     Add a part to your snapcraft.yaml, interactively presenting
                options.
   help         Obtain help for a certain plugin or topic
+  daemon       Keep snapcraft loaded in the background so other commands
+               start faster.
 
 The available lifecycle commands are:
   clean        Remove content - cleans downloads, builds or install artifacts.
@@ -48,7 +50,6 @@ For more help, visit the documentation:
 http://developer.ubuntu.com/snappy/snapcraft
 """
 
-import pkg_resources
 import sys
 
 from docopt import docopt
@@ -70,18 +71,39 @@ _VALID_COMMANDS = [
     'strip',
     'snap',
     'help',
+    'daemon',
 ]
 
-try:
-    version = pkg_resources.require('snapcraft')[0].version
-except pkg_resources.DistributionNotFound:
-    version = 'devel'
+
+def get_version():
+    """Return the installed version of snapcraft or 'devel'."""
+    try:
+        from importlib import metadata
+    except ImportError:
+        # Importing pkg_resources scans every installed distribution.
+        import pkg_resources
+        try:
+            return pkg_resources.require('snapcraft')[0].version
+        except pkg_resources.DistributionNotFound:
+            return 'devel'
+
+    try:
+        return metadata.version('snapcraft')
+    except metadata.PackageNotFoundError:
+        return 'devel'
+
+
+class _Version:
+    """Looks the version up when docopt prints it for --version."""
+
+    def __str__(self):
+        return get_version()
 
 
 def main():
     log.configure()
     args = docopt(__doc__,
-                  version=version,
+                  version=_Version(),
                   options_first=True)
     if args['COMMAND'] not in _VALID_COMMANDS:
         sys.exit('Command {!r} was not recognized'.format(args['COMMAND']))
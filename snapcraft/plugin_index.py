@@ -0,0 +1,133 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright (C) 2015 Canonical Ltd
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""The plugins that come with snapcraft, found without importing them.
+
+Listing the plugins, showing their help or finding the module for a part
+only needs their names and documentation, which are read from the plugin
+sources. A plugin module is imported when a part uses it. The index is
+read once per process and kept, as JSON, in the snapcraft cache directory
+for as long as the plugin files keep their modification times and sizes.
+"""
+
+import ast
+import collections
+import contextlib
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+from snapcraft import common
+
+
+Plugin = collections.namedtuple('Plugin', ['name', 'module', 'doc'])
+
+_PACKAGE = 'snapcraft.plugins'
+
+_lock = threading.Lock()
+# The index, by plugin name.
+_loaded = None
+
+
+def get_plugindir():
+    return os.path.join(os.path.dirname(__file__), 'plugins')
+
+
+def names():
+    """Return the names of the plugins, sorted."""
+    return sorted(_get())
+
+
+def get(name):
+    """Return the Plugin called name or None if there is no such plugin.
+
+    Like in snapcraft.yaml, underscores can be used instead of dashes.
+    """
+    return _get().get(name.replace('_', '-'))
+
+
+def identity():
+    """Return the name, modification time and size of each plugin file."""
+    plugindir = get_plugindir()
+    files = []
+    for entry in sorted(os.listdir(plugindir)):
+        module_name, ext = os.path.splitext(entry)
+        if ext != '.py' or module_name.startswith('_'):
+            continue
+        st = os.stat(os.path.join(plugindir, entry))
+        files.append([entry, st.st_mtime_ns, st.st_size])
+    return files
+
+
+def _get():
+    global _loaded
+
+    with _lock:
+        if _loaded is not None:
+            return _loaded
+
+        current = identity()
+        cache_file = os.path.join(
+            common.get_cachedir(), 'plugins-{}.json'.format(
+                hashlib.sha256(
+                    os.path.abspath(get_plugindir()).encode()
+                ).hexdigest()[:16]))
+        index = _load_cached(cache_file, current)
+        if index is None:
+            index = _make_index(current)
+            _save_cached(cache_file, current, index)
+
+        _loaded = {name: Plugin(*entry) for name, entry in index.items()}
+        return _loaded
+
+
+def _make_index(files):
+    index = {}
+    for entry, _, _ in files:
+        module_name = os.path.splitext(entry)[0]
+        with open(os.path.join(get_plugindir(), entry), 'rb') as f:
+            doc = ast.get_docstring(ast.parse(f.read(), entry), clean=False)
+        name = module_name.replace('_', '-')
+        index[name] = [
+            name, '{}.{}'.format(_PACKAGE, module_name), doc]
+    return index
+
+
+def _load_cached(cache_file, identity):
+    try:
+        with open(cache_file) as f:
+            cached = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    if cached.get('identity') != identity:
+        return None
+    return cached.get('plugins')
+
+
+def _save_cached(cache_file, identity, index):
+    # Failing to save only means reading the plugins again next time.
+    with contextlib.suppress(OSError, TypeError, ValueError):
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(cache_file))
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'identity': identity, 'plugins': index}, f)
+            os.rename(tmp, cache_file)
+        finally:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(tmp)
@@ -15,25 +15,44 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import contextlib
+import copy
 import filecmp
 import glob
+import hashlib
 import importlib
+import json
 import logging
 import os
 import shutil
 import sys
+import threading
+import time
 
 import jsonschema
 import yaml
 
 import snapcraft
 from snapcraft import (
+    cache,
     common,
+    plugin_index,
     repo,
+    schema,
 )
 
 logger = logging.getLogger(__name__)
 
+# apt keeps its configuration in process wide state, fetching stage-packages
+# for parts being pulled concurrently needs to be serialized.
+_stage_packages_lock = threading.Lock()
+
+# Properties that only affect the stage and strip steps, changing them must
+# not trigger a pull or a build.
+_STEP_PROPERTIES = {
+    'stage': ['stage', 'organize'],
+    'strip': ['snap'],
+}
+
 
 def _local_plugindir():
     return os.path.abspath(os.path.join('parts', 'plugins'))
@@ -65,6 +84,14 @@ class PluginHandler:
         self.stagedir = os.path.join(os.getcwd(), 'stage')
         self.snapdir = os.path.join(os.getcwd(), 'snap')
         self.statefile = os.path.join(parts_dir, part_name, 'state')
+        self.fingerprintfile = os.path.join(
+            parts_dir, part_name, 'fingerprints')
+        self.durationsfile = os.path.join(parts_dir, part_name, 'durations')
+        self.stagedfilesfile = os.path.join(
+            parts_dir, part_name, 'staged-files')
+        self._plugin_name = plugin_name
+        self._properties = copy.deepcopy(properties)
+        self._source_digest = None
 
         try:
             self._load_code(plugin_name, properties)
@@ -81,9 +108,9 @@ class PluginHandler:
             logger.info('Loaded local plugin for %s', plugin_name)
 
         if not module:
-            with contextlib.suppress(ImportError):
-                module = importlib.import_module(
-                    'snapcraft.plugins.{}'.format(module_name))
+            plugin = plugin_index.get(plugin_name)
+            if plugin:
+                module = importlib.import_module(plugin.module)
 
         if not module:
             logger.info('Searching for local plugin for %s', plugin_name)
@@ -93,7 +120,7 @@ class PluginHandler:
                 raise PluginError('unknown plugin: {}'.format(plugin_name))
 
         plugin = _get_plugin(module)
-        options = _make_options(properties, plugin.schema())
+        options = _make_options(properties, plugin)
         self.code = plugin(self.name, options)
 
     def makedirs(self):
@@ -107,24 +134,161 @@ class PluginHandler:
     def notify_stage(self, stage, hint=''):
         logger.info('%s %s %s', stage, self.name, hint)
 
+    def last_step(self):
+        """Return the last step run for the part or None."""
+        return _read_last_step(self.statefile)
+
     def is_dirty(self, stage):
-        try:
-            with open(self.statefile, 'r') as f:
-                lastStep = f.read()
-                return (common.COMMAND_ORDER.index(stage) >
-                        common.COMMAND_ORDER.index(lastStep))
-        except Exception:
-            return True
+        return self.dirty_reason(stage) is not None
+
+    def dirty_reason(self, stage):
+        """Return why stage needs to run, or None if it does not."""
+        lastStep = self.last_step()
+        if lastStep is None or (common.COMMAND_ORDER.index(stage) >
+                                common.COMMAND_ORDER.index(lastStep)):
+            return 'dirty'
+
+        # State left by a snapcraft without fingerprints is trusted as is.
+        recorded = self.get_fingerprints().get(stage)
+        if recorded is not None and self.fingerprint(stage) != recorded:
+            return 'fingerprint changed'
+
+        return None
 
     def should_step_run(self, step, force=False):
         return force or self.is_dirty(step)
 
-    def mark_done(self, stage):
+    def mark_done(self, stage, duration=None):
         with open(self.statefile, 'w+') as f:
             f.write(stage)
 
+        # Running a step changes the inputs of the steps that follow.
+        self._source_digest = None
+        self._record_fingerprint(stage, self.fingerprint(stage))
+
+        if duration is not None:
+            durations = self.get_durations()
+            durations[stage] = round(duration, 3)
+            with open(self.durationsfile, 'w') as f:
+                yaml.dump(durations, stream=f, default_flow_style=False)
+
+    def get_durations(self):
+        """Return how long, in seconds, each step took when it last ran."""
+        try:
+            with open(self.durationsfile) as f:
+                return yaml.safe_load(f) or {}
+        except FileNotFoundError:
+            return {}
+
+    def _record_fingerprint(self, key, value):
+        fingerprints = self.get_fingerprints()
+        fingerprints[key] = value
+        with open(self.fingerprintfile, 'w') as f:
+            yaml.dump(fingerprints, stream=f, default_flow_style=False)
+
+    def get_fingerprints(self):
+        """Return the fingerprints recorded for the steps already run."""
+        try:
+            with open(self.fingerprintfile) as f:
+                return yaml.safe_load(f) or {}
+        except FileNotFoundError:
+            return {}
+
+    def fingerprint(self, step):
+        """Return a digest of the current inputs for step.
+
+        The inputs of a step include the fingerprint of the step that
+        precedes it, so a change to the inputs of pull is carried over to
+        every step that follows.
+        """
+        inputs = getattr(self, '_{}_inputs'.format(step))()
+        return hashlib.sha256(json.dumps(
+            inputs, sort_keys=True, default=str).encode()).hexdigest()
+
+    def _pull_inputs(self):
+        step_properties = [
+            p for props in _STEP_PROPERTIES.values() for p in props]
+        return {
+            'plugin': self._plugin_name,
+            'properties': {k: v for k, v in self._properties.items()
+                           if k not in step_properties},
+            'sources': self.code.PLUGIN_STAGE_SOURCES,
+        }
+
+    def _build_inputs(self):
+        downloaddir = os.path.join(self.ubuntudir, 'download')
+        debs = []
+        if os.path.isdir(downloaddir):
+            # package file names carry the version that was fetched.
+            debs = sorted(os.listdir(downloaddir))
+        return {
+            'pull': self.fingerprint('pull'),
+            'source': self._get_source_digest(),
+            'local': _paths_digest(self.code.local_inputs()),
+            'stage-packages': debs,
+            'env': self.env(self.installdir),
+            # What parts in after staged is used rather than their
+            # fingerprints, so rebuilding one of them into identical files
+            # does not cascade into rebuilding this part. The parts they
+            # are after are in stage and the build environment too.
+            'after': {dep.name: dep.get_fingerprints().get('staged')
+                      for dep in self._all_deps()},
+        }
+
+    def _all_deps(self):
+        """Return the parts this part is after, however indirectly."""
+        deps = []
+        pending = list(self.deps)
+        while pending:
+            dep = pending.pop()
+            if dep not in deps:
+                deps.append(dep)
+                pending.extend(dep.deps)
+        return deps
+
+    def cache_key(self):
+        """Return the key for the result of the build step in a cache.
+
+        Unlike the build fingerprint, the source tree is identified by
+        content and paths are relative to the project, so the key is the
+        same on a fresh checkout in another directory.
+        """
+        inputs = self._build_inputs()
+        inputs['pull'] = self._pull_inputs()
+        inputs['source'] = _tree_digest(self.code.sourcedir, contents=True)
+        inputs['local'] = _paths_digest(
+            self.code.local_inputs(), contents=True)
+        text = json.dumps(inputs, sort_keys=True, default=str)
+        # The paths are escaped like the rest of the text.
+        projectdir = json.dumps(os.path.join(os.getcwd(), ''))[1:-1]
+        return hashlib.sha256(
+            text.replace(projectdir, '').encode()).hexdigest()
+
+    def _get_source_digest(self):
+        # Walking large source trees is expensive, the result is kept until
+        # a step runs.
+        if self._source_digest is None:
+            self._source_digest = _tree_digest(self.code.sourcedir)
+        return self._source_digest
+
+    def _stage_inputs(self):
+        return {
+            'build': self.fingerprint('build'),
+            'properties': {k: self._properties.get(k)
+                           for k in _STEP_PROPERTIES['stage']},
+        }
+
+    def _strip_inputs(self):
+        return {
+            'stage': self.fingerprint('stage'),
+            'properties': {k: self._properties.get(k)
+                           for k in _STEP_PROPERTIES['strip']},
+        }
+
     def _setup_stage_packages(self):
-        if self.code.stage_packages:
+        if not self.code.stage_packages:
+            return
+        with _stage_packages_lock:
             ubuntu = repo.Ubuntu(
                 self.ubuntudir, sources=self.code.PLUGIN_STAGE_SOURCES)
             ubuntu.get(self.code.stage_packages)
@@ -134,20 +298,33 @@ class PluginHandler:
         if not self.should_step_run('pull', force):
             self.notify_stage('Skipping pull', ' (already ran)')
             return
+        started = time.time()
         self.makedirs()
         self.notify_stage('Pulling')
         self._setup_stage_packages()
         self.code.pull()
-        self.mark_done('pull')
+        self.mark_done('pull', time.time() - started)
 
     def build(self, force=False):
         if not self.should_step_run('build', force):
             self.notify_stage('Skipping build', ' (already ran)')
             return
+        started = time.time()
         self.makedirs()
+
+        build_cache = cache.get_build_cache()
+        if build_cache:
+            key = self.cache_key()
+            if build_cache.restore(key, self.code.installdir):
+                self.notify_stage('Restoring', ' (from the build cache)')
+                self.mark_done('build')
+                return
+
         self.notify_stage('Building')
         self.code.build()
-        self.mark_done('build')
+        if build_cache:
+            build_cache.store(key, self.code.installdir)
+        self.mark_done('build', time.time() - started)
 
     def migratable_fileset_for(self, stage):
         plugin_fileset = self.code.snap_fileset()
@@ -178,6 +355,7 @@ class PluginHandler:
         if not self.should_step_run('stage', force):
             self.notify_stage('Skipping stage', ' (already ran)')
             return
+        started = time.time()
         self.makedirs()
 
         self.notify_stage('Staging')
@@ -192,7 +370,13 @@ class PluginHandler:
                          os.path.relpath(e.filename, os.path.curdir))
             return False
 
-        self.mark_done('stage')
+        self.mark_done('stage', time.time() - started)
+        self._record_fingerprint('staged', _manifest_digest(
+            snap_files, snap_dirs, self.code.installdir))
+        # Checking for collisions with what this part staged does not need
+        # to load it then.
+        with open(self.stagedfilesfile, 'w') as f:
+            f.writelines(path + '\n' for path in sorted(snap_files))
 
         return True
 
@@ -200,6 +384,7 @@ class PluginHandler:
         if not self.should_step_run('strip', force):
             self.notify_stage('Skipping strip', ' (already ran)')
             return
+        started = time.time()
         self.makedirs()
 
         self.notify_stage('Stripping')
@@ -212,7 +397,7 @@ class PluginHandler:
                              os.path.relpath(e.filename, os.path.curdir))
                 return False
 
-        self.mark_done('strip')
+        self.mark_done('strip', time.time() - started)
 
         return True
 
@@ -225,8 +410,9 @@ class PluginHandler:
             shutil.rmtree(self.code.partdir)
 
 
-def _make_options(properties, schema):
-    jsonschema.validate(properties, schema)
+def _make_options(properties, plugin):
+    plugin_schema, validator = _get_plugin_schema(plugin)
+    schema.validate(validator, properties)
 
     class Options():
         pass
@@ -237,35 +423,37 @@ def _make_options(properties, schema):
                       _system_schema_part_props())
 
     # Look at the plugin level props
-    _populate_options(options, properties, schema)
+    _populate_options(options, properties, plugin_schema)
 
     return options
 
 
-def _system_schema_part_props():
-    schema_file = os.path.abspath(os.path.join(common.get_schemadir(),
-                                               'snapcraft.yaml'))
+# The schema of each plugin class and its validator.
+_plugin_schemas = {}
+
 
+def _get_plugin_schema(plugin):
+    if plugin not in _plugin_schemas:
+        plugin_schema = plugin.schema()
+        _plugin_schemas[plugin] = (
+            plugin_schema, schema.make_validator(plugin_schema))
+    return _plugin_schemas[plugin]
+
+
+def _system_schema_part_props():
     try:
-        with open(schema_file) as fp:
-            schema = yaml.load(fp)
+        return schema.part_properties()
     except FileNotFoundError:
         raise FileNotFoundError(
             'snapcraft validation file is missing from installation path')
 
-    props = {'properties': {}}
-    partpattern = schema['properties']['parts']['patternProperties']
-    for pattern in partpattern:
-        props['properties'].update(partpattern[pattern]['properties'])
-
-    return props
-
 
 def _populate_options(options, properties, schema):
     schema_properties = schema.get('properties', {})
     for key in schema_properties:
         attr_name = key.replace('-', '_')
-        default_value = schema_properties[key].get('default')
+        # Schemas are shared, options get their own copy of the defaults.
+        default_value = copy.deepcopy(schema_properties[key].get('default'))
         attr_value = properties.get(key, default_value)
         setattr(options, attr_name, attr_value)
 
@@ -277,11 +465,47 @@ def _get_plugin(module):
 
 
 def _load_local(module_name):
-    sys.path = [_local_plugindir()] + sys.path
-    module = importlib.import_module(module_name)
-    sys.path.pop(0)
+    plugindir = _local_plugindir()
+    # Most projects have no local plugins, there is nothing to import then.
+    if not (os.path.isfile(os.path.join(plugindir, module_name + '.py')) or
+            os.path.isdir(os.path.join(plugindir, module_name))):
+        raise ImportError('No local plugin named {!r}'.format(module_name))
+
+    sys.path = [plugindir] + sys.path
+    try:
+        return importlib.import_module(module_name)
+    finally:
+        sys.path.remove(plugindir)
 
-    return module
+
+def get_last_step(part_name):
+    """Return the last step run for part_name or None, without loading it."""
+    return _read_last_step(
+        os.path.join(common.get_partsdir(), part_name, 'state'))
+
+
+def get_staged_files(part_name):
+    """Return the files part_name put in stage, without loading it.
+
+    None is returned for parts that were staged without keeping a record
+    of the files.
+    """
+    try:
+        with open(os.path.join(
+                common.get_partsdir(), part_name, 'staged-files')) as f:
+            return set(f.read().splitlines())
+    except FileNotFoundError:
+        return None
+
+
+def _read_last_step(statefile):
+    try:
+        with open(statefile, 'r') as f:
+            lastStep = f.read()
+    except FileNotFoundError:
+        return None
+
+    return lastStep if lastStep in common.COMMAND_ORDER else None
 
 
 def load_plugin(part_name, plugin_name, properties=None):
@@ -290,6 +514,70 @@ def load_plugin(part_name, plugin_name, properties=None):
     return PluginHandler(plugin_name, part_name, properties)
 
 
+def _tree_digest(directory, contents=False):
+    """Return a digest of the layout and file metadata under directory.
+
+    Unless contents is set files are not read, the name, mode, size and
+    modification time of each entry are used instead. The files snapcraft
+    uses and generates at the top of the tree, like snapcraft.yaml, its
+    working directories and the snaps it builds, are not taken into account.
+    """
+    digest = hashlib.sha256()
+    for root, dirs, files in os.walk(directory, followlinks=False):
+        if root == directory:
+            dirs[:] = [d for d in dirs if d not in common.SNAPCRAFT_FILES]
+            files = [f for f in files if f not in common.SNAPCRAFT_FILES and
+                     not f.endswith('.snap')]
+        dirs.sort()
+        for entry in sorted(dirs + files):
+            path = os.path.relpath(os.path.join(root, entry), directory)
+            _update_digest(digest, directory, path, contents)
+
+    return digest.hexdigest()
+
+
+def _paths_digest(paths, contents=False):
+    """Return a digest of paths in the project and of what is under them."""
+    digest = hashlib.sha256()
+    projectdir = os.getcwd()
+    for path in sorted(set(paths)):
+        _update_digest(digest, projectdir, path, contents)
+        if os.path.isdir(path):
+            digest.update(_tree_digest(path, contents).encode())
+
+    return digest.hexdigest()
+
+
+def _manifest_digest(files, dirs, directory):
+    """Return a digest of the content of files and dirs in directory."""
+    digest = hashlib.sha256()
+    for path in sorted(files | dirs):
+        _update_digest(digest, directory, path, contents=True)
+
+    return digest.hexdigest()
+
+
+def _update_digest(digest, directory, path, contents):
+    abspath = os.path.join(directory, path)
+    try:
+        st = os.stat(abspath, follow_symlinks=False)
+    except FileNotFoundError:
+        return
+
+    if not contents:
+        digest.update('{}\0{}\0{}\0{}\n'.format(
+            path, st.st_mode, st.st_size, st.st_mtime_ns).encode())
+        return
+
+    digest.update('{}\0{}\n'.format(path, st.st_mode).encode())
+    if os.path.islink(abspath):
+        digest.update(os.readlink(abspath).encode())
+    elif os.path.isfile(abspath):
+        with open(abspath, 'rb') as f:
+            for chunk in iter(lambda: f.read(65536), b''):
+                digest.update(chunk)
+
+
 def _migratable_filesets(fileset, srcdir):
     includes, excludes = _get_file_list(fileset)
 
@@ -319,8 +607,22 @@ def _migrate_files(snap_files, snap_dirs, srcdir, dstdir):
         src = os.path.join(srcdir, snap_file)
         dst = os.path.join(dstdir, snap_file)
         os.makedirs(os.path.dirname(dst), exist_ok=True)
+        if os.path.lexists(dst) and not os.path.isdir(dst) and \
+                not _same_inode(src, dst):
+            # Left behind by a previous run of this step.
+            os.remove(dst)
         if not os.path.exists(dst) and not os.path.islink(dst):
-            os.link(src, dst, follow_symlinks=False)
+            # Another part being staged concurrently might have linked the
+            # same file in, check_for_collisions ensures it is identical.
+            with contextlib.suppress(FileExistsError):
+                os.link(src, dst, follow_symlinks=False)
+
+
+def _same_inode(src, dst):
+    src_stat = os.stat(src, follow_symlinks=False)
+    dst_stat = os.stat(dst, follow_symlinks=False)
+    return (src_stat.st_ino, src_stat.st_dev) == \
+        (dst_stat.st_ino, dst_stat.st_dev)
 
 
 def _get_file_list(stage_set):
@@ -389,18 +691,27 @@ def _validate_relative_paths(files):
             raise PluginError('path "{}" must be relative'.format(d))
 
 
-def check_for_collisions(parts):
-    """Raises an EnvironmentError if conflicts are found between two parts."""
+def check_for_collisions(parts, staged_files=None):
+    """Raises an EnvironmentError if conflicts are found between two parts.
+
+    staged_files maps the names of parts already in stage, which are not
+    in parts, to the files they staged, see get_staged_files.
+    """
     parts_files = {}
+    for part_name, files in (staged_files or {}).items():
+        parts_files[part_name] = {
+            'files': files,
+            'installdir': os.path.join(
+                common.get_partsdir(), part_name, 'install')}
     for part in parts:
         # Gather our own files up
         part_files, _ = part.migratable_fileset_for('stage')
 
         # Scan previous parts for collisions
         for other_part_name in parts_files:
-            common = part_files & parts_files[other_part_name]['files']
+            common_files = part_files & parts_files[other_part_name]['files']
             conflict_files = []
-            for f in common:
+            for f in common_files:
                 this = os.path.join(part.installdir, f)
                 other = os.path.join(
                     parts_files[other_part_name]['installdir'],
@@ -32,6 +32,10 @@ In additon, this plugin uses the following plugin-specific keywords:
       (list of strings)
       configure flags to pass to the build such as those shown by running
       './configure --help'
+
+    - disable-parallel:
+      (boolean)
+      build with a single job, for projects that fail to build in parallel.
 """
 
 import os
@@ -52,6 +56,10 @@ class AutotoolsPlugin(snapcraft.BasePlugin):
             },
             'default': [],
         }
+        schema['properties']['disable-parallel'] = {
+            'type': 'boolean',
+            'default': False,
+        }
 
         return schema
 
@@ -73,4 +81,4 @@ class AutotoolsPlugin(snapcraft.BasePlugin):
             else:
                 self.run(['autoreconf', '-i'])
         self.run(['./configure', '--prefix='] + self.options.configflags)
-        self.run(['make', 'install', 'DESTDIR=' + self.installdir])
+        self.run_make(['make', 'install', 'DESTDIR=' + self.installdir])
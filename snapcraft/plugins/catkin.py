@@ -177,11 +177,13 @@ deb http://${security}.ubuntu.com/${suffix} trusty-security main universe
 
     @property
     def python_version(self):
-        return self.run_output(['pyversions', '-i'])
+        # What is installed changes without pyversions changing.
+        return self.probe(['pyversions', '-i'],
+                          depends_on=[snapcraft.common.DPKG_STATUS])
 
     @property
     def gcc_version(self):
-        return self.run_output(['gcc', '-dumpversion'])
+        return self.probe(['gcc', '-dumpversion'])
 
     @property
     def rosdir(self):
@@ -28,10 +28,13 @@ Additionally, this plugin uses the following plugin-specific keywords:
     - configflags:
       (list of strings)
       configure flags to pass to the build using the common cmake semantics.
+
+    - disable-parallel:
+      (boolean)
+      build with a single job, for projects that fail to build in parallel.
 """
 
 import os
-import shutil
 
 import snapcraft.plugins.make
 
@@ -58,9 +61,9 @@ class CMakePlugin(snapcraft.plugins.make.MakePlugin):
         self.build_packages.append('cmake')
 
     def build(self):
-        if os.path.exists(self.builddir):
-            shutil.rmtree(self.builddir)
-        os.mkdir(self.builddir)
+        # The build directory is kept between builds so that make only
+        # rebuilds what changed.
+        os.makedirs(self.builddir, exist_ok=True)
 
         source_subdir = getattr(self.options, 'source_subdir', None)
         if source_subdir:
@@ -70,4 +73,4 @@ class CMakePlugin(snapcraft.plugins.make.MakePlugin):
 
         self.run(['cmake', sourcedir, '-DCMAKE_INSTALL_PREFIX='] +
                  self.options.configflags)
-        self.run(['make', 'install', 'DESTDIR=' + self.installdir])
+        self.run_make(['make', 'install', 'DESTDIR=' + self.installdir])
@@ -17,9 +17,9 @@
 import logging
 import os
 import glob
-import shutil
 
 import snapcraft
+from snapcraft import filecopy
 
 
 logger = logging.getLogger(__name__)
@@ -40,6 +40,12 @@ class CopyPlugin(snapcraft.BasePlugin):
             ]
         }
 
+    def local_inputs(self):
+        paths = []
+        for src in self.options.files:
+            paths.extend(glob.glob(src) if glob.has_magic(src) else [src])
+        return paths
+
     def build(self):
         files = self.options.files
         globs = {f: files[f] for f in files if glob.has_magic(f)}
@@ -57,6 +63,6 @@ class CopyPlugin(snapcraft.BasePlugin):
             os.makedirs(os.path.dirname(dst), exist_ok=True)
 
             if os.path.isdir(src):
-                shutil.copytree(src, dst)
+                filecopy.copytree(src, dst)
             else:
-                shutil.copy2(src, dst)
+                filecopy.copy_file(src, dst)
@@ -22,6 +22,12 @@ build.
 This plugin uses the common plugin keywords as well as those for "sources".
 For more information check the 'plugins' topic for the former and the
 'sources' topic for the latter.
+
+Additionally, this plugin uses the following plugin-specific keywords:
+
+    - disable-parallel:
+      (boolean)
+      build with a single job, for projects that fail to build in parallel.
 """
 
 import snapcraft
@@ -29,11 +35,21 @@ import snapcraft
 
 class MakePlugin(snapcraft.BasePlugin):
 
+    @classmethod
+    def schema(cls):
+        schema = super().schema()
+        schema['properties']['disable-parallel'] = {
+            'type': 'boolean',
+            'default': False,
+        }
+
+        return schema
+
     def __init__(self, name, options):
         super().__init__(name, options)
         self.build_packages.append('make')
 
     def build(self):
         super().build()
-        self.run(['make'])
-        self.run(['make', 'install', 'DESTDIR=' + self.installdir])
+        self.run_make(['make'])
+        self.run_make(['make', 'install', 'DESTDIR=' + self.installdir])
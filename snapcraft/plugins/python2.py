@@ -152,7 +152,7 @@ class Python2Plugin(snapcraft.BasePlugin):
 
     @property
     def python_version(self):
-        return self.run_output(['pyversions', '-d'])
+        return self.probe(['pyversions', '-d'])
 
     def snap_fileset(self):
         fileset = super().snap_fileset()
@@ -146,7 +146,7 @@ class Python3Plugin(snapcraft.BasePlugin):
 
     @property
     def python_version(self):
-        return self.run_output(['py3versions', '-d'])
+        return self.probe(['py3versions', '-d'])
 
     def snap_fileset(self):
         fileset = super().snap_fileset()
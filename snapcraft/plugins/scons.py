@@ -27,6 +27,10 @@ Additionally, this plugin uses the following plugin-specific keywords:
     - scons-options:
       (list of strings)
       flags to pass to the build using the scons semantics for parameters.
+
+    - disable-parallel:
+      (boolean)
+      build with a single job, for projects that fail to build in parallel.
 """
 
 import os
@@ -48,6 +52,10 @@ class SconsPlugin(snapcraft.BasePlugin):
             },
             'default': []
         }
+        schema['properties']['disable-parallel'] = {
+            'type': 'boolean',
+            'default': False,
+        }
 
         return schema
 
@@ -59,5 +67,6 @@ class SconsPlugin(snapcraft.BasePlugin):
         super().build()
         env = os.environ.copy()
         env['DESTDIR'] = self.installdir
-        self.run(['scons', ] + self.options.scons_options)
+        self.run(['scons', '-j{}'.format(self.parallel_build_count)] +
+                 self.options.scons_options)
         self.run(['scons', 'install'] + self.options.scons_options, env=env)
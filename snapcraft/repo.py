@@ -26,11 +26,12 @@ import subprocess
 import urllib
 import urllib.request
 import sys
-
-import apt
 from xml.etree import ElementTree
 
-from snapcraft import common
+from snapcraft import (
+    common,
+    trace,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -49,6 +50,10 @@ _GEOIP_SERVER = "http://geoip.ubuntu.com/lookup"
 
 
 def install_build_packages(packages):
+    # apt is only imported by what uses it, most commands never get to
+    # packages and loading it takes a while.
+    import apt
+
     new_packages = []
     for pkg in packages:
         try:
@@ -105,6 +110,8 @@ class Ubuntu:
             rootdir, sources, local)
 
     def get(self, package_names):
+        import apt
+
         os.makedirs(self.downloaddir, exist_ok=True)
 
         manifest_dep_names = self._manifest_dep_names()
@@ -145,10 +152,16 @@ class Ubuntu:
 
         # download the remaining ones with proper progress
         apt.apt_pkg.config.set("Dir::Cache::Archives", self.downloaddir)
-        self.apt_cache.fetch_archives(progress=self.apt_progress)
+        with trace.span('apt fetch', 'repo', packages=package_names):
+            self.apt_cache.fetch_archives(progress=self.apt_progress)
 
     def unpack(self, rootdir):
         pkgs_abs_path = glob.glob(os.path.join(self.downloaddir, '*.deb'))
+        with trace.span('apt unpack', 'repo', packages=[
+                os.path.basename(p) for p in pkgs_abs_path]):
+            self._unpack(pkgs_abs_path, rootdir)
+
+    def _unpack(self, pkgs_abs_path, rootdir):
         for pkg in pkgs_abs_path:
             # TODO needs elegance and error control
             try:
@@ -218,6 +231,8 @@ def _format_sources_list(sources, arch, release='vivid'):
 
 
 def _setup_apt_cache(rootdir, sources, local=False):
+    import apt
+
     os.makedirs(os.path.join(rootdir, 'etc', 'apt'), exist_ok=True)
     srcfile = os.path.join(rootdir, 'etc', 'apt', 'sources.list')
 
@@ -0,0 +1,146 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright (C) 2015 Canonical Ltd
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""The schema snapcraft.yaml is validated against.
+
+The schema is needed to validate the project and then again for every
+part, and parsing it takes longer than loading most projects. It is parsed
+once per process and, as JSON, kept in the snapcraft cache directory for
+as long as the schema file keeps its modification time and size. The
+schema and the validators made from it are shared and must not be
+changed.
+"""
+
+import contextlib
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+import jsonschema
+import yaml
+
+from snapcraft import common
+
+
+_lock = threading.Lock()
+# The loaded schema, by schema file: (identity, schema, derived values).
+_loaded = {}
+
+
+def load():
+    """Return the schema for snapcraft.yaml.
+
+    :raises FileNotFoundError: if the schema is not installed.
+    """
+    return _get()[0]
+
+
+def get_validator():
+    """Return a validator for snapcraft.yaml, checking formats too."""
+    schema, derived = _get()
+    if 'validator' not in derived:
+        derived['validator'] = make_validator(
+            schema, format_checker=jsonschema.FormatChecker())
+    return derived['validator']
+
+
+def part_properties():
+    """Return a schema with the properties every part can have."""
+    schema, derived = _get()
+    if 'part_properties' not in derived:
+        props = {'properties': {}}
+        partpattern = schema['properties']['parts']['patternProperties']
+        for pattern in partpattern:
+            props['properties'].update(partpattern[pattern]['properties'])
+        derived['part_properties'] = props
+    return derived['part_properties']
+
+
+def make_validator(schema, **kwargs):
+    """Return a validator for schema, which is checked once here."""
+    cls = jsonschema.validators.validator_for(schema)
+    cls.check_schema(schema)
+    return cls(schema, **kwargs)
+
+
+def validate(validator, instance):
+    """Validate instance like jsonschema.validate, with a made validator.
+
+    :raises jsonschema.ValidationError: with the most relevant error.
+    """
+    error = jsonschema.exceptions.best_match(validator.iter_errors(instance))
+    if error is not None:
+        raise error
+
+
+def identity():
+    """Return the path, modification time and size of the schema file.
+
+    :raises FileNotFoundError: if the schema is not installed.
+    """
+    schema_file = os.path.abspath(
+        os.path.join(common.get_schemadir(), 'snapcraft.yaml'))
+    st = os.stat(schema_file)
+    return [schema_file, st.st_mtime_ns, st.st_size]
+
+
+def _get():
+    current = identity()
+    schema_file = current[0]
+
+    with _lock:
+        loaded = _loaded.get(schema_file)
+        if loaded and loaded[0] == current:
+            return loaded[1:]
+
+        cache_file = os.path.join(
+            common.get_cachedir(), 'schema-{}.json'.format(
+                hashlib.sha256(schema_file.encode()).hexdigest()[:16]))
+        schema = _load_cached(cache_file, current)
+        if schema is None:
+            with open(schema_file) as fp:
+                schema = yaml.load(fp)
+            _save_cached(cache_file, current, schema)
+
+        _loaded[schema_file] = (current, schema, {})
+        return _loaded[schema_file][1:]
+
+
+def _load_cached(cache_file, identity):
+    try:
+        with open(cache_file) as f:
+            cached = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    if cached.get('identity') != identity:
+        return None
+    return cached.get('schema')
+
+
+def _save_cached(cache_file, identity, schema):
+    # Failing to save only means parsing the schema again next time.
+    with contextlib.suppress(OSError, TypeError, ValueError):
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(cache_file))
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'identity': identity, 'schema': schema}, f)
+            os.rename(tmp, cache_file)
+        finally:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(tmp)
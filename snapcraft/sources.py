@@ -51,7 +51,6 @@ A part that uses common source options can have these keyword entries:
 import logging
 import os
 import os.path
-import requests
 import shutil
 import tarfile
 import re
@@ -178,6 +177,9 @@ class Tar(Base):
         self.provision(self.source_dir)
 
     def _download(self):
+        # requests takes longer to import than most commands take to run.
+        import requests
+
         req = requests.get(self.source, stream=True, allow_redirects=True)
         if req.status_code is not 200:
             raise EnvironmentError('unexpected http status code when '
@@ -271,6 +273,21 @@ def get(sourcedir, builddir, options):
     handler.pull()
 
 
+def is_local(options):
+    """Return True if the source defined in options is a local directory.
+
+    :param options: source options.
+    """
+    source = getattr(options, 'source', None)
+    if not source:
+        return False
+    source_type = getattr(options, 'source_type', None)
+    try:
+        return _get_source_handler(source_type, source) is Local
+    except ValueError:
+        return False
+
+
 _source_handler = {
     'bzr': Bazaar,
     'git': Git,
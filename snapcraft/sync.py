@@ -0,0 +1,180 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright (C) 2015 Canonical Ltd
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Keep a copy of a source tree up to date.
+
+Parts are built in a copy of their sources. Copying the sources from
+scratch for every build would also throw away what the previous build
+left behind, and with it the chance for make and the like to only rebuild
+what changed. Syncing instead copies the files that changed since the last
+sync, keeping their modification times, and removes the ones that are
+gone from the sources. Files the build created are left in place.
+
+What was copied is recorded in a manifest, so files the build changed or
+created are never mistaken for sources.
+"""
+
+import contextlib
+import json
+import logging
+import os
+import shutil
+import stat
+import tempfile
+
+from snapcraft import filecopy
+
+
+logger = logging.getLogger(__name__)
+
+
+def sync_tree(source, destination, manifest, ignore=(), link=False):
+    """Update destination with the changes to source since the last sync.
+
+    :param str manifest: the file recording what the last sync copied. If
+                         it is missing, or was written for other
+                         directories, destination is copied from scratch.
+    :param ignore: names at the top of source that are not copied.
+    :param bool link: hard link the files no one can write to instead of
+                      copying them.
+    """
+    previous = _load_manifest(manifest, source, destination)
+    if previous is None:
+        if os.path.lexists(destination):
+            shutil.rmtree(destination)
+        previous = {}
+    else:
+        logger.debug('Syncing %s with %s', destination, source)
+    os.makedirs(destination, exist_ok=True)
+
+    entries = _scan(source, ignore)
+
+    # Children sort after their parents, removing in reverse order takes
+    # care of them first.
+    for path in sorted(set(previous) - set(entries), reverse=True):
+        _remove(os.path.join(destination, path))
+
+    copies = []
+    replaced = {}
+    for path in sorted(entries):
+        src = os.path.join(source, path)
+        dst = os.path.join(destination, path)
+        entry = entries[path]
+        if previous.get(path) == entry and _matches(entry, dst):
+            continue
+        if entry[0] == 'd':
+            _make_dir(src, dst)
+        elif entry[0] == 'l':
+            _remove(dst)
+            os.symlink(entry[1], dst)
+        else:
+            with contextlib.suppress(FileNotFoundError):
+                replaced[dst] = os.lstat(dst).st_mtime_ns
+                _remove(dst)
+            copies.append((src, dst))
+
+    filecopy.copy_files(copies, link)
+
+    # Builds only redo what is older than its sources, a source going back
+    # to an older version must still look newer than what was built from
+    # the one it replaces. Hard links are left alone, touching them would
+    # touch the sources too.
+    for dst, mtime in replaced.items():
+        st = os.lstat(dst)
+        if st.st_mtime_ns <= mtime and st.st_nlink == 1:
+            os.utime(dst)
+
+    _save_manifest(manifest, source, destination, entries)
+
+
+def _scan(source, ignore):
+    """Return the entries under source by their relative paths."""
+    entries = {}
+    for root, dirs, files in os.walk(source):
+        if root == source:
+            dirs[:] = [d for d in dirs if d not in ignore]
+            files = [f for f in files if f not in ignore]
+        for name in dirs + files:
+            path = os.path.join(root, name)
+            st = os.lstat(path)
+            relpath = os.path.relpath(path, source)
+            if stat.S_ISLNK(st.st_mode):
+                entries[relpath] = ['l', os.readlink(path)]
+            elif stat.S_ISDIR(st.st_mode):
+                entries[relpath] = ['d']
+            else:
+                entries[relpath] = [
+                    'f', st.st_mode, st.st_size, st.st_mtime_ns]
+    return entries
+
+
+def _matches(entry, dst):
+    """Return whether dst still is of the kind of entry."""
+    try:
+        st = os.lstat(dst)
+    except FileNotFoundError:
+        return False
+    return {
+        'd': stat.S_ISDIR,
+        'l': stat.S_ISLNK,
+        'f': stat.S_ISREG,
+    }[entry[0]](st.st_mode)
+
+
+def _remove(path):
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path)
+    else:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(path)
+
+
+def _make_dir(src, dst):
+    if not os.path.isdir(dst) or os.path.islink(dst):
+        _remove(dst)
+        os.mkdir(dst)
+    shutil.copymode(src, dst)
+
+
+def _load_manifest(manifest, source, destination):
+    try:
+        with open(manifest) as f:
+            data = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+    if (data.get('source') != os.path.abspath(source) or
+            data.get('destination') != os.path.abspath(destination) or
+            not os.path.isdir(destination)):
+        return None
+    return data.get('entries', {})
+
+
+def _save_manifest(manifest, source, destination, entries):
+    directory = os.path.dirname(manifest) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix='.partial')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump({
+                'source': os.path.abspath(source),
+                'destination': os.path.abspath(destination),
+                'entries': entries,
+            }, f)
+        os.rename(tmp, manifest)
+    finally:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(tmp)
@@ -14,7 +14,9 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import http.server
 import os
+import threading
 
 import fixtures
 
@@ -27,3 +29,57 @@ class TempCWD(fixtures.TempDir):
         current_dir = os.getcwd()
         self.addCleanup(os.chdir, current_dir)
         os.chdir(self.path)
+
+
+class FakePartsWiki(fixtures.Fixture):
+    """Serve the parts wiki from a local HTTP server.
+
+    The page is served with an ETag, and not again to those that have it.
+    The requests made are kept in requests, the headers of each of them.
+    Setting status makes the server answer only that.
+    """
+
+    def __init__(self, content):
+        super().__init__()
+        self.content = content
+        self.status = None
+        self.requests = []
+
+    def setUp(self):
+        super().setUp()
+        wiki = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                wiki.requests.append(dict(self.headers))
+                etag = '"{}"'.format(hash(wiki.content))
+                if wiki.status:
+                    self.send_response(wiki.status)
+                    self.end_headers()
+                elif self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.end_headers()
+                else:
+                    body = wiki.content.encode()
+                    self.send_response(200)
+                    self.send_header('ETag', etag)
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = http.server.HTTPServer(('127.0.0.1', 0), Handler)
+        thread = threading.Thread(
+            target=server.serve_forever, kwargs={'poll_interval': 0.01})
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        self.useFixture(fixtures.EnvironmentVariable('no_proxy', '127.0.0.1'))
+        self.useFixture(fixtures.MonkeyPatch(
+            'snapcraft.wiki.PARTS_URI',
+            'http://127.0.0.1:{}/Snappy/Parts'.format(server.server_port)))
@@ -21,6 +21,7 @@ import unittest.mock
 import snapcraft
 from snapcraft import (
     common,
+    jobserver,
     sources,
     tests
 )
@@ -100,6 +101,47 @@ class TestBasePlugin(tests.TestCase):
             os.path.join(plugin.builddir, 'src', 'file')))
 
 
+class RunMakeTestCase(tests.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        patcher = unittest.mock.patch('snapcraft.common.run')
+        self.mock_run = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        patcher = unittest.mock.patch('sys.stdout')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.options = MockOptions()
+        self.plugin = snapcraft.BasePlugin('test-part', self.options)
+
+    def test_run_make_without_job_server(self):
+        self.plugin.run_make(['make'])
+
+        self.mock_run.assert_called_once_with(
+            ['make'], cwd=self.plugin.builddir)
+
+    def test_run_make_with_job_server(self):
+        with jobserver.running(parts=2, slots=8) as server:
+            self.plugin.run_make(['make'], env={'MAKEFLAGS': 'V=1'})
+            self.assertEqual(4, self.plugin.parallel_build_count)
+
+        self.mock_run.assert_called_once_with(
+            ['make'], cwd=self.plugin.builddir, pass_fds=server.fds,
+            env={'MAKEFLAGS': '{} V=1'.format(server.makeflags)})
+
+    def test_run_make_with_parallel_builds_disabled(self):
+        self.options.disable_parallel = True
+
+        with jobserver.running(parts=2, slots=8):
+            self.plugin.run_make(['make'])
+            self.assertEqual(1, self.plugin.parallel_build_count)
+
+        self.mock_run.assert_called_once_with(
+            ['make'], cwd=self.plugin.builddir)
+
+
 class GetSourceWithBranches(tests.TestCase):
 
     scenarios = [
@@ -217,3 +259,22 @@ class BuildTestCase(tests.TestCase):
         for file_ in common.SNAPCRAFT_FILES:
             self.assertFalse(
                 os.path.exists(os.path.join(plugin.builddir, file_)))
+
+    def test_build_again_keeps_what_the_build_left(self):
+        options = MockOptions(source='src')
+        plugin = snapcraft.BasePlugin('test-part', options)
+        os.makedirs(plugin.sourcedir)
+        open(os.path.join(plugin.sourcedir, 'main.c'), 'w').close()
+        open(os.path.join(plugin.sourcedir, 'gone.c'), 'w').close()
+
+        plugin.build()
+        open(os.path.join(plugin.builddir, 'main.o'), 'w').close()
+        os.remove(os.path.join(plugin.sourcedir, 'gone.c'))
+        plugin.build()
+
+        self.assertTrue(
+            os.path.exists(os.path.join(plugin.builddir, 'main.c')))
+        self.assertTrue(
+            os.path.exists(os.path.join(plugin.builddir, 'main.o')))
+        self.assertFalse(
+            os.path.exists(os.path.join(plugin.builddir, 'gone.c')))
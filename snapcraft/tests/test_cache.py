@@ -0,0 +1,124 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright (C) 2015 Canonical Ltd
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+
+import fixtures
+
+from snapcraft import (
+    cache,
+    tests,
+)
+
+
+class BuildCacheTestCase(tests.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.cache = cache.BuildCache(os.path.join(self.path, 'cache'))
+        os.makedirs(os.path.join('install', 'bin'))
+        with open(os.path.join('install', 'bin', 'app'), 'w') as f:
+            f.write('app')
+        os.symlink('app', os.path.join('install', 'bin', 'link'))
+
+    def test_restore_missing_key(self):
+        self.assertFalse(self.cache.restore('key', 'install'))
+        self.assertTrue(os.path.exists(os.path.join('install', 'bin', 'app')))
+
+    def test_store_and_restore(self):
+        self.cache.store('key', 'install')
+        with open(os.path.join('install', 'bin', 'app'), 'w') as f:
+            f.write('changed')
+        open(os.path.join('install', 'leftover'), 'w').close()
+
+        self.assertTrue(self.cache.restore('key', 'install'))
+
+        with open(os.path.join('install', 'bin', 'app')) as f:
+            self.assertEqual('app', f.read())
+        self.assertEqual(
+            'app', os.readlink(os.path.join('install', 'bin', 'link')))
+        self.assertFalse(os.path.exists(os.path.join('install', 'leftover')))
+
+    def test_restore_truncated_entry(self):
+        self.cache.store('key', 'install')
+        entry = os.path.join(self.cache.cachedir, 'key.tar.gz')
+        with open(entry, 'rb') as f:
+            data = f.read()
+        with open(entry, 'wb') as f:
+            f.write(data[:len(data) // 2])
+
+        self.assertFalse(self.cache.restore('key', 'install'))
+
+        self.assertFalse(os.path.exists(entry))
+        self.assertEqual([], os.listdir('install'))
+
+    def test_restore_corrupt_entry(self):
+        os.makedirs(self.cache.cachedir)
+        entry = os.path.join(self.cache.cachedir, 'key.tar.gz')
+        with open(entry, 'w') as f:
+            f.write('not a tarball')
+
+        self.assertFalse(self.cache.restore('key', 'install'))
+
+        self.assertFalse(os.path.exists(entry))
+
+    def test_evict_least_recently_used(self):
+        self.cache.store('key1', 'install')
+        self.cache.store('key2', 'install')
+        entry1 = os.path.join(self.cache.cachedir, 'key1.tar.gz')
+        entry2 = os.path.join(self.cache.cachedir, 'key2.tar.gz')
+        os.utime(entry1, (1, 1))
+        os.utime(entry2, (2, 2))
+        self.cache.restore('key1', 'install')
+
+        self.cache.max_size = os.path.getsize(entry1)
+        self.cache.evict()
+
+        self.assertTrue(os.path.exists(entry1))
+        self.assertFalse(os.path.exists(entry2))
+
+    def test_get_build_cache_disabled(self):
+        self.useFixture(fixtures.EnvironmentVariable(
+            'SNAPCRAFT_BUILD_CACHE', None))
+
+        self.assertEqual(None, cache.get_build_cache())
+
+    def test_get_build_cache(self):
+        self.useFixture(fixtures.EnvironmentVariable(
+            'SNAPCRAFT_BUILD_CACHE', 'cache'))
+        self.useFixture(fixtures.EnvironmentVariable(
+            'SNAPCRAFT_BUILD_CACHE_SIZE', '10'))
+
+        build_cache = cache.get_build_cache()
+
+        self.assertEqual(os.path.join(self.path, 'cache'),
+                         build_cache.cachedir)
+        self.assertEqual(10 * 1024 * 1024, build_cache.max_size)
+
+    def test_get_build_cache_invalid_size(self):
+        self.useFixture(fixtures.EnvironmentVariable(
+            'SNAPCRAFT_BUILD_CACHE', 'cache'))
+
+        for size in ('2G', '-1', '0'):
+            self.useFixture(fixtures.EnvironmentVariable(
+                'SNAPCRAFT_BUILD_CACHE_SIZE', size))
+
+            with self.assertRaises(EnvironmentError) as raised:
+                cache.get_build_cache()
+
+            self.assertEqual(
+                'SNAPCRAFT_BUILD_CACHE_SIZE must be a positive number of '
+                'megabytes, got {!r}'.format(size), str(raised.exception))
@@ -0,0 +1,141 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright (C) 2015 Canonical Ltd
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import os
+import subprocess
+from unittest import mock
+
+import fixtures
+
+from snapcraft import (
+    ccache,
+    common,
+    tests,
+)
+
+
+_PRINT_STATS = b"""\
+stats_updated_timestamp\t1445000000
+direct_cache_hit\t{}
+preprocessed_cache_hit\t1
+cache_miss\t{}
+files_in_cache\t12
+"""
+
+_SHOW_STATS = b"""\
+cache directory                     /cache
+cache hit (direct)                     3
+cache hit (preprocessed)               1
+cache miss                             4
+files in cache                        12
+"""
+
+
+class CcacheTestCase(tests.TestCase):
+
+    def test_disabled_by_default(self):
+        self.useFixture(fixtures.EnvironmentVariable('SNAPCRAFT_CCACHE'))
+
+        self.assertEqual(None, ccache.get_cachedir())
+        self.assertEqual([], ccache.env())
+
+    def test_disabled_with_zero(self):
+        self.useFixture(fixtures.EnvironmentVariable('SNAPCRAFT_CCACHE', '0'))
+
+        self.assertEqual(None, ccache.get_cachedir())
+
+    def test_enabled_in_the_snapcraft_cache(self):
+        self.useFixture(fixtures.EnvironmentVariable('SNAPCRAFT_CCACHE', '1'))
+
+        self.assertEqual(os.path.join(common.get_cachedir(), 'ccache'),
+                         ccache.get_cachedir())
+
+    def test_enabled_in_a_directory(self):
+        self.useFixture(fixtures.EnvironmentVariable(
+            'SNAPCRAFT_CCACHE', 'ccache'))
+        self.useFixture(fixtures.EnvironmentVariable(
+            'SNAPCRAFT_CCACHE_SIZE', '100'))
+
+        self.assertEqual([
+            'PATH="/usr/lib/ccache:$PATH"',
+            'CCACHE_DIR={}'.format(os.path.join(self.path, 'ccache')),
+            'CCACHE_MAXSIZE=100M',
+            'CCACHE_BASEDIR={}'.format(self.path),
+        ], ccache.env())
+
+    @mock.patch('subprocess.check_output')
+    def test_get_stats(self, mock_check_output):
+        mock_check_output.return_value = _PRINT_STATS.replace(
+            b'{}', b'3', 1).replace(b'{}', b'4', 1)
+
+        self.assertEqual(ccache.Stats(hits=4, misses=4),
+                         ccache.get_stats('cache'))
+        mock_check_output.assert_called_once_with(
+            ['ccache', '--print-stats'], env=mock.ANY,
+            stderr=subprocess.DEVNULL)
+        self.assertEqual(
+            'cache', mock_check_output.call_args[1]['env']['CCACHE_DIR'])
+
+    @mock.patch('subprocess.check_output')
+    def test_get_stats_from_older_ccache(self, mock_check_output):
+        mock_check_output.side_effect = [
+            subprocess.CalledProcessError(1, ['ccache']), _SHOW_STATS]
+
+        self.assertEqual(ccache.Stats(hits=4, misses=4),
+                         ccache.get_stats('cache'))
+        mock_check_output.assert_called_with(
+            ['ccache', '-s'], env=mock.ANY, stderr=subprocess.DEVNULL)
+
+    @mock.patch('subprocess.check_output', side_effect=FileNotFoundError())
+    def test_get_stats_without_ccache(self, mock_check_output):
+        self.assertEqual(None, ccache.get_stats('cache'))
+
+    @mock.patch('snapcraft.ccache.get_stats')
+    def test_summary(self, mock_get_stats):
+        self.useFixture(fixtures.EnvironmentVariable('SNAPCRAFT_CCACHE', '1'))
+        fake_logger = fixtures.FakeLogger(level=logging.INFO)
+        self.useFixture(fake_logger)
+        mock_get_stats.side_effect = [
+            ccache.Stats(hits=10, misses=5), ccache.Stats(hits=13, misses=6)]
+
+        with ccache.summary():
+            pass
+
+        self.assertEqual(
+            'ccache: 3 of 4 compilations were cache hits (75%)\n',
+            fake_logger.output)
+
+    @mock.patch('snapcraft.ccache.get_stats')
+    def test_summary_without_compilations(self, mock_get_stats):
+        self.useFixture(fixtures.EnvironmentVariable('SNAPCRAFT_CCACHE', '1'))
+        fake_logger = fixtures.FakeLogger(level=logging.INFO)
+        self.useFixture(fake_logger)
+        mock_get_stats.return_value = ccache.Stats(hits=10, misses=5)
+
+        with ccache.summary():
+            pass
+
+        self.assertEqual('', fake_logger.output)
+
+    @mock.patch('snapcraft.ccache.get_stats')
+    def test_summary_when_disabled(self, mock_get_stats):
+        self.useFixture(fixtures.EnvironmentVariable('SNAPCRAFT_CCACHE'))
+
+        with ccache.summary():
+            pass
+
+        self.assertFalse(mock_get_stats.called)
@@ -14,6 +14,7 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import json
 import logging
 import os
 import os.path
@@ -118,3 +119,44 @@ parts:
                              'Pulled wrong part')
             self.assertFalse(os.path.exists(parts[i]['state_file']),
                              'Expected for only to be a state file for build1')
+
+    def test_build_with_jobs(self):
+        fake_logger = fixtures.FakeLogger(level=logging.ERROR)
+        self.useFixture(fake_logger)
+        parts = self.make_snapcraft_yaml(n=3)
+
+        build.main(['--jobs', '3'])
+
+        for i in range(3):
+            with open(parts[i]['state_file']) as sf:
+                state = sf.readlines()
+            self.assertEqual(state, ['build'], 'Expected the state file for '
+                             'build{} to be \'build\''.format(i))
+
+    def test_build_with_invalid_jobs(self):
+        self.make_snapcraft_yaml(n=1)
+
+        for jobs in ('many', '0', '-1'):
+            with self.assertRaises(SystemExit) as raised:
+                build.main(['--jobs', jobs])
+
+            self.assertTrue(str(raised.exception).startswith(
+                'The number of jobs must be a positive integer, got '
+                '{!r}\nUsage:'.format(jobs)))
+        self.assertFalse(os.path.exists('parts'))
+
+    def test_build_with_trace(self):
+        fake_logger = fixtures.FakeLogger(level=logging.ERROR)
+        self.useFixture(fake_logger)
+        self.make_snapcraft_yaml(n=2)
+
+        build.main(['--trace', 'trace.json'])
+
+        with open('trace.json') as f:
+            events = json.load(f)['traceEvents']
+        self.assertEqual(
+            ['pull build1', 'pull build0', 'build build1', 'build build0'],
+            [e['name'] for e in events])
+        for event in events:
+            self.assertEqual('lifecycle', event['cat'])
+            self.assertEqual('X', event['ph'])
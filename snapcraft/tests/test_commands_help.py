@@ -55,6 +55,13 @@ class HelpCommandTestCase(tests.TestCase):
                          'The help message does not start with {!r} but with '
                          '{!r} instead'.format(expected, output))
 
+    @mock.patch('sys.stdout', new_callable=io.StringIO)
+    def test_print_module_help_for_plugin_with_a_dash(self, mock_stdout):
+        help.main(['tar-content'])
+
+        self.assertEqual('The plugin has no documentation\n',
+                         mock_stdout.getvalue())
+
     @mock.patch('sys.stdout', new_callable=io.StringIO)
     def test_show_module_help_with_devel_for_valid_plugin(self, mock_stdout):
         help.main(['nil', '--devel'])
@@ -15,6 +15,8 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import os
+import subprocess
+from unittest import mock
 
 from snapcraft import (
     common,
@@ -47,3 +49,127 @@ class CommonTestCase(tests.TestCase):
         self.assertFalse(common.isurl('./'))
         self.assertFalse(common.isurl('/foo'))
         self.assertFalse(common.isurl('/fo:o'))
+
+
+class ExecEnvTestCase(tests.TestCase):
+
+    def test_assignments_are_evaluated(self):
+        common.set_env([
+            'PATH="/stage/bin:$PATH"',
+            'CFLAGS="-I/stage/include $CFLAGS"',
+            'LDFLAGS=-L/stage/lib:${LDFLAGS}',
+            'QUOTED="a \\"quoted\\" \\$value"',
+            "LITERAL='$PATH'",
+        ])
+
+        env = common.get_exec_env({'PATH': '/bin', 'LDFLAGS': '-s'})
+
+        self.assertEqual({
+            'PATH': '/stage/bin:/bin',
+            'CFLAGS': '-I/stage/include ',
+            'LDFLAGS': '-L/stage/lib:-s',
+            'QUOTED': 'a "quoted" $value',
+            'LITERAL': '$PATH',
+        }, env)
+
+    def test_evaluated_env_is_reused(self):
+        common.set_env(['PATH="/stage/bin:$PATH"'])
+        base = {'PATH': '/bin'}
+
+        env = common.get_exec_env(base)
+        self.assertIs(env, common.get_exec_env(base))
+
+        base['PATH'] = '/usr/bin'
+        self.assertEqual({'PATH': '/stage/bin:/usr/bin'},
+                         common.get_exec_env(base))
+
+        common.set_env(['PATH="/snap/bin:$PATH"'])
+        self.assertEqual({'PATH': '/snap/bin:/usr/bin'},
+                         common.get_exec_env(base))
+
+    @mock.patch('subprocess.check_output', wraps=subprocess.check_output)
+    def test_shell_is_used_when_needed(self, mock_check_output):
+        common.set_env(['PATH="/stage/bin:$PATH"'])
+        common.get_exec_env({'PATH': '/bin'})
+        self.assertFalse(mock_check_output.called)
+
+        common.set_env(['VALUE="$(echo value)"'])
+        env = common.get_exec_env({'PATH': '/bin'})
+
+        self.assertEqual('value', env['VALUE'])
+        self.assertEqual(1, mock_check_output.call_count)
+
+    def test_run_without_shell(self):
+        common.set_env(['VALUE="a value"'])
+
+        self.assertEqual('a value *', common.run_output(
+            ['/bin/sh', '-c', 'echo "$VALUE" "$1"', 'sh', '*']))
+
+
+class ProbeTestCase(tests.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        os.mkdir('bin')
+        self.tool = os.path.join('bin', 'tool')
+        self.make_tool('1.0')
+        self.run = mock.Mock(side_effect=lambda: 'output {}'.format(
+            self.run.call_count))
+
+    def make_tool(self, content):
+        with open(self.tool, 'w') as f:
+            f.write('#!/bin/sh\necho {}\n'.format(content))
+        os.chmod(self.tool, 0o755)
+
+    def test_probe_is_cached(self):
+        self.assertEqual('output 1', common.probe(
+            ['tool', '--version'], self.run, path='bin'))
+        self.assertEqual('output 1', common.probe(
+            ['tool', '--version'], self.run, path='bin'))
+        self.assertEqual('output 2', common.probe(
+            ['tool', '--help'], self.run, path='bin'))
+
+    def test_probe_is_cached_on_disk(self):
+        common.probe(['tool'], self.run, path='bin')
+        common._probes.clear()
+
+        self.assertEqual('output 1',
+                         common.probe(['tool'], self.run, path='bin'))
+        self.assertTrue(os.path.exists(
+            os.path.join(common.get_cachedir(), 'probes.json')))
+
+    def test_probe_again_when_tool_changes(self):
+        common.probe(['tool'], self.run, path='bin')
+        self.make_tool('2.0.0')
+
+        self.assertEqual('output 2',
+                         common.probe(['tool'], self.run, path='bin'))
+
+    def test_probe_again_when_what_it_depends_on_changes(self):
+        with open('status', 'w') as f:
+            f.write('installed\n')
+        common.probe(['tool', '-i'], self.run, path='bin',
+                     depends_on=['status'])
+        common.probe(['tool', '-i'], self.run, path='bin',
+                     depends_on=['status'])
+        with open('status', 'a') as f:
+            f.write('installed\n')
+
+        self.assertEqual('output 2', common.probe(
+            ['tool', '-i'], self.run, path='bin', depends_on=['status']))
+        os.remove('status')
+        self.assertEqual('output 3', common.probe(
+            ['tool', '-i'], self.run, path='bin', depends_on=['status']))
+
+    def test_probe_without_tool_is_not_cached(self):
+        common.probe(['missing'], self.run, path='bin')
+
+        self.assertEqual('output 2',
+                         common.probe(['missing'], self.run, path='bin'))
+
+    def test_probe_runs_tool(self):
+        self.assertEqual('1.0', common.probe([os.path.abspath(self.tool)]))
+
+    def test_get_cachedir(self):
+        self.assertEqual(os.path.join(self.path, '.cache', 'snapcraft'),
+                         common.get_cachedir())
@@ -0,0 +1,92 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright (C) 2015 Canonical Ltd
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from snapcraft import (
+    daemon,
+    tests,
+)
+
+
+class DaemonTestCase(tests.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.socket = os.path.join(self.path, 'snapcraft.sock')
+
+    def start_daemon(self):
+        topdir = os.path.abspath(os.path.join(__file__, '..', '..', '..'))
+        env = os.environ.copy()
+        env['PYTHONPATH'] = topdir
+        server = subprocess.Popen(
+            [sys.executable, '-c',
+             'from snapcraft import daemon; daemon.serve({!r})'.format(
+                 self.socket)],
+            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self.addCleanup(server.wait)
+        self.addCleanup(server.terminate)
+
+        for i in range(100):
+            with socket.socket(socket.AF_UNIX) as conn:
+                try:
+                    conn.connect(self.socket)
+                    break
+                except (FileNotFoundError, ConnectionRefusedError):
+                    time.sleep(0.1)
+        else:
+            self.fail('The daemon did not start')
+
+    def forward(self, argv):
+        with open('output', 'w') as output:
+            status = daemon.forward(
+                self.socket, argv, fds=(0, output.fileno(), output.fileno()))
+        with open('output') as output:
+            return status, output.read()
+
+    def test_forward_without_daemon(self):
+        self.assertEqual(None, daemon.forward(self.socket, ['list-plugins']))
+
+    def test_forward_runs_command(self):
+        self.start_daemon()
+
+        status, output = self.forward(['list-plugins'])
+
+        self.assertEqual(0, status)
+        self.assertIn('\nnil\n', output)
+
+    def test_forward_runs_in_client_directory(self):
+        self.start_daemon()
+        os.mkdir('project')
+        os.chdir('project')
+
+        status, output = self.forward(['init'])
+
+        self.assertEqual(0, status)
+        self.assertTrue(os.path.exists('snapcraft.yaml'))
+
+    def test_forward_returns_exit_status(self):
+        self.start_daemon()
+
+        status, output = self.forward(['not-a-command'])
+
+        self.assertEqual(1, status)
+        self.assertEqual("Command 'not-a-command' was not recognized\n",
+                         output)
@@ -0,0 +1,110 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright (C) 2015 Canonical Ltd
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from snapcraft import (
+    environment,
+    tests,
+)
+
+
+class EnvironmentTestCase(tests.TestCase):
+
+    def test_prepended_paths_are_merged(self):
+        env = environment.Environment([
+            'PATH="/stage/bin:/stage/usr/bin:$PATH"',
+            'PATH="/stage/bin:/stage/usr/bin:$PATH"',
+            'PATH="/install/bin:/stage/bin:$PATH"',
+        ])
+
+        self.assertEqual(
+            ['PATH="/install/bin:/stage/bin:/stage/usr/bin:$PATH"'],
+            list(env))
+
+    def test_flags_are_merged(self):
+        env = environment.Environment([
+            'CFLAGS="-I/stage/include $CFLAGS"',
+            'LDFLAGS="-L/stage/lib $LDFLAGS"',
+            'CFLAGS="$CFLAGS -O2"',
+            'CFLAGS="-I/install/include $CFLAGS"',
+            'CFLAGS="$CFLAGS -O2"',
+            'LDFLAGS="-L/stage/lib $LDFLAGS"',
+        ])
+
+        self.assertEqual([
+            'CFLAGS="-I/install/include -I/stage/include $CFLAGS -O2"',
+            'LDFLAGS="-L/stage/lib $LDFLAGS"',
+        ], list(env))
+
+    def test_flags_with_arguments_are_kept_together(self):
+        env = environment.Environment([
+            'CFLAGS="-isystem /a -isystem /b $CFLAGS"',
+            'CFLAGS="-isystem /a -isystem /b $CFLAGS"',
+            'CFLAGS="-isystem /a $CFLAGS"',
+        ])
+
+        self.assertEqual(
+            ['CFLAGS="-isystem /a -isystem /a -isystem /b $CFLAGS"'],
+            list(env))
+
+    def test_values(self):
+        env = environment.Environment([
+            'PATH="/stage/bin:$PATH"',
+            'PYTHONPATH=/stage/lib/python3',
+            'PYTHONPATH=/stage/lib/python3',
+            'PATH=/bin',
+            'PATH="/stage/bin:$PATH"',
+        ])
+
+        self.assertEqual([
+            'PATH="/stage/bin:/bin"',
+            'PYTHONPATH="/stage/lib/python3"',
+        ], list(env))
+
+    def test_references_to_other_variables_keep_their_order(self):
+        env = environment.Environment([
+            'LDFLAGS="-L/stage/lib $LDFLAGS"',
+            'CGO_LDFLAGS="$CGO_LDFLAGS $LDFLAGS"',
+            'LDFLAGS="-L/install/lib $LDFLAGS"',
+            'PATH="/stage/bin:$PATH"',
+        ])
+
+        self.assertEqual([
+            'LDFLAGS="-L/stage/lib $LDFLAGS"',
+            'CGO_LDFLAGS="$CGO_LDFLAGS $LDFLAGS"',
+            'LDFLAGS="-L/install/lib $LDFLAGS"',
+            'PATH="/stage/bin:$PATH"',
+        ], list(env))
+
+    def test_assignments_left_to_the_shell(self):
+        assignments = [
+            'A="$(pwd)/bin:$A"',
+            "B='/stage/bin:$B'",
+            'C=~/bin:$C',
+            'D="/stage/bin::$D"',
+            'not an assignment',
+        ]
+
+        self.assertEqual(assignments,
+                         list(environment.Environment(assignments)))
+
+    def test_different_separators_are_not_merged(self):
+        env = environment.Environment([
+            'FLAGS="-a $FLAGS"',
+            'FLAGS="/b:$FLAGS"',
+        ])
+
+        self.assertEqual(['FLAGS="-a $FLAGS"', 'FLAGS="/b:$FLAGS"'],
+                         list(env))
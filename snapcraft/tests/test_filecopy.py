@@ -0,0 +1,162 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright (C) 2015 Canonical Ltd
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import errno
+import os
+from unittest import mock
+
+from snapcraft import (
+    filecopy,
+    tests,
+)
+
+
+def _unsupported(*args):
+    raise OSError(errno.EOPNOTSUPP, os.strerror(errno.EOPNOTSUPP))
+
+
+class CopyFileTestCase(tests.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        with open('src', 'wb') as f:
+            f.write(b'data' * 100000)
+        os.chmod('src', 0o640)
+        os.utime('src', (1000, 1000))
+        patcher = mock.patch.object(filecopy, '_unsupported', set())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def assert_copied(self, dst='dst'):
+        with open(dst, 'rb') as f:
+            self.assertEqual(b'data' * 100000, f.read())
+        st = os.stat(dst)
+        self.assertEqual(0o640, st.st_mode & 0o777)
+        self.assertEqual(1000, st.st_mtime)
+        self.assertNotEqual(os.stat('src').st_ino, st.st_ino)
+
+    def test_copy_file(self):
+        filecopy.copy_file('src', 'dst')
+
+        self.assert_copied()
+
+    def test_copy_file_replaces_destination(self):
+        with open('dst', 'w') as f:
+            f.write('old' * 1000000)
+
+        filecopy.copy_file('src', 'dst')
+
+        self.assert_copied()
+
+    def test_copy_file_into_directory(self):
+        os.mkdir('dir')
+
+        self.assertEqual(os.path.join('dir', 'src'),
+                         filecopy.copy_file('src', 'dir'))
+
+        self.assert_copied(os.path.join('dir', 'src'))
+
+    @mock.patch('fcntl.ioctl', side_effect=_unsupported)
+    def test_copy_file_without_reflinks(self, mock_ioctl):
+        filecopy.copy_file('src', 'dst')
+
+        self.assert_copied()
+        self.assertEqual(1, mock_ioctl.call_count)
+
+        filecopy.copy_file('src', 'dst2')
+
+        # Not tried again for the same filesystem.
+        self.assertEqual(1, mock_ioctl.call_count)
+        self.assert_copied('dst2')
+
+    @mock.patch('os.sendfile', side_effect=_unsupported)
+    @mock.patch('fcntl.ioctl', side_effect=_unsupported)
+    def test_copy_file_with_reads_and_writes(self, mock_ioctl, mock_sendfile):
+        with mock.patch.object(filecopy, '_copy_file_range',
+                               return_value=False):
+            filecopy.copy_file('src', 'dst')
+
+        self.assert_copied()
+        self.assertTrue(mock_sendfile.called)
+
+    def test_copy_file_errors_are_raised(self):
+        with mock.patch('fcntl.ioctl',
+                        side_effect=OSError(errno.EIO, 'I/O error')):
+            with self.assertRaises(OSError) as raised:
+                filecopy.copy_file('src', 'dst')
+
+        self.assertEqual(errno.EIO, raised.exception.errno)
+
+    def test_link_read_only_file(self):
+        os.chmod('src', 0o444)
+
+        filecopy.copy_file('src', 'dst', link=True)
+
+        self.assertEqual(os.stat('src').st_ino, os.stat('dst').st_ino)
+
+    def test_do_not_link_writable_file(self):
+        filecopy.copy_file('src', 'dst', link=True)
+
+        self.assert_copied()
+
+    def test_copy_read_only_file_across_filesystems(self):
+        os.chmod('src', 0o444)
+
+        with mock.patch('os.link', side_effect=OSError(
+                errno.EXDEV, os.strerror(errno.EXDEV))):
+            filecopy.copy_file('src', 'dst', link=True)
+
+        self.assertNotEqual(os.stat('src').st_ino, os.stat('dst').st_ino)
+
+
+class CopyTreeTestCase(tests.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        os.makedirs(os.path.join('src', 'dir'))
+        for i in range(50):
+            with open(os.path.join('src', 'dir', str(i)), 'w') as f:
+                f.write(str(i))
+        os.symlink('dir', os.path.join('src', 'link'))
+        os.utime(os.path.join('src', 'dir'), (1000, 1000))
+
+    def test_copytree(self):
+        filecopy.copytree('src', 'dst')
+
+        for i in range(50):
+            with open(os.path.join('dst', 'dir', str(i))) as f:
+                self.assertEqual(str(i), f.read())
+        self.assertFalse(os.path.islink(os.path.join('dst', 'link')))
+        self.assertTrue(os.path.exists(os.path.join('dst', 'link', '49')))
+        self.assertEqual(
+            1000, os.stat(os.path.join('dst', 'dir')).st_mtime)
+
+    def test_copytree_with_symlinks(self):
+        filecopy.copytree('src', 'dst', symlinks=True)
+
+        self.assertEqual('dir', os.readlink(os.path.join('dst', 'link')))
+
+    def test_copytree_destination_exists(self):
+        os.mkdir('dst')
+
+        with self.assertRaises(FileExistsError):
+            filecopy.copytree('src', 'dst')
+
+    def test_copytree_errors_are_raised(self):
+        with mock.patch('snapcraft.filecopy.copy_file',
+                        side_effect=PermissionError()):
+            with self.assertRaises(PermissionError):
+                filecopy.copytree('src', 'dst')
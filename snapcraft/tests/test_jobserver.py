@@ -0,0 +1,62 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright (C) 2015 Canonical Ltd
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+from unittest import mock
+
+from snapcraft import (
+    jobserver,
+    tests,
+)
+
+
+class JobServerTestCase(tests.TestCase):
+
+    def read_tokens(self, server):
+        os.set_blocking(server.fds[0], False)
+        try:
+            return os.read(server.fds[0], 1024)
+        except BlockingIOError:
+            return b''
+
+    def test_tokens(self):
+        with jobserver.running(parts=2, slots=8) as server:
+            self.assertIs(server, jobserver.get())
+            self.assertEqual(b'++++++', self.read_tokens(server))
+            self.assertEqual(
+                '-j --jobserver-fds={},{}'.format(*server.fds),
+                server.makeflags)
+
+        self.assertIsNone(jobserver.get())
+        self.assertRaises(OSError, os.fstat, server.fds[0])
+
+    def test_more_parts_than_slots(self):
+        with jobserver.running(parts=4, slots=2) as server:
+            self.assertEqual(b'', self.read_tokens(server))
+            self.assertEqual(1, jobserver.parallel_build_count())
+
+    @mock.patch('os.cpu_count', return_value=8)
+    def test_sized_to_the_machine(self, mock_cpu_count):
+        with jobserver.running(parts=3) as server:
+            self.assertEqual(8, server.slots)
+            self.assertEqual(2, jobserver.parallel_build_count())
+
+        with jobserver.running(parts=16) as server:
+            self.assertEqual(16, server.slots)
+
+    @mock.patch('os.cpu_count', return_value=8)
+    def test_parallel_build_count_without_server(self, mock_cpu_count):
+        self.assertEqual(8, jobserver.parallel_build_count())
@@ -14,12 +14,17 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import io
 import logging
+import os
+from unittest import mock
 
 import fixtures
 
+import snapcraft.yaml
 from snapcraft import (
     lifecycle,
+    pluginhandler,
     tests,
 )
 
@@ -78,8 +83,493 @@ parts:
         self.assertEqual(
             'Pulling part1 \n'
             '\'part2\' has prerequisites that need to be staged: part1\n'
-            'Skipping pull part1  (already ran)\n'
             'Building part1 \n'
             'Staging part1 \n'
             'Pulling part2 \n',
             fake_logger.output)
+
+    def test_parallel_execution_stages_prerequisites_first(self):
+        fake_logger = fixtures.FakeLogger(level=logging.INFO)
+        self.useFixture(fake_logger)
+
+        self.make_snapcraft_yaml("""name: after
+version: 0
+vendor: To Be Removed <vendor@example.com>
+summary: test stage
+description: if the build is succesful the state file will be updated
+icon: icon.png
+
+parts:
+  part1:
+    plugin: nil
+  part2:
+    plugin: nil
+  part3:
+    plugin: nil
+    after:
+      - part1
+      - part2
+""")
+        open('icon.png', 'w').close()
+
+        lifecycle.execute('pull', jobs=2)
+
+        lines = fake_logger.output.splitlines()
+        self.assertEqual(7, len(lines))
+        # part1 and part2 are independent and run concurrently, so only
+        # the order relative to part3 can be asserted.
+        self.assertEqual('Pulling part3 ', lines[-1])
+        self.assertEqual(
+            ['Building part1 ', 'Building part2 ',
+             'Pulling part1 ', 'Pulling part2 ',
+             'Staging part1 ', 'Staging part2 '],
+            sorted(lines[:-1]))
+        for part_name in ['part1', 'part2']:
+            self.assertLess(lines.index('Building {} '.format(part_name)),
+                            lines.index('Staging {} '.format(part_name)))
+
+    def test_parallel_exception_when_dependency_is_required(self):
+        self.make_snapcraft_yaml("""name: after
+version: 0
+vendor: To Be Removed <vendor@example.com>
+summary: test stage
+description: if the build is succesful the state file will be updated
+icon: icon.png
+
+parts:
+  part1:
+    plugin: nil
+  part2:
+    plugin: nil
+    after:
+      - part1
+""")
+        open('icon.png', 'w').close()
+
+        with self.assertRaises(RuntimeError) as raised:
+            lifecycle.execute('pull', part_names=['part2'], jobs=2)
+
+        self.assertEqual(
+            raised.exception.__str__(),
+            "Requested 'pull' of 'part2' but there are unsatisfied "
+            "prerequisites: 'part1'")
+
+    def test_invalid_jobs_raises(self):
+        with self.assertRaises(ValueError) as raised:
+            lifecycle.execute('pull', jobs=0)
+
+        self.assertEqual(
+            raised.exception.__str__(),
+            'the number of jobs must be a positive integer, got 0')
+
+    def test_parallel_execution_detects_collisions(self):
+        self.make_snapcraft_yaml("""name: collisions
+version: 0
+vendor: To Be Removed <vendor@example.com>
+summary: test stage
+description: staging parts with different files at the same path fails
+icon: icon.png
+
+parts:
+  part1:
+    plugin: copy
+    files:
+      file1: file
+  part2:
+    plugin: copy
+    files:
+      file2: file
+""")
+        open('icon.png', 'w').close()
+        with open('file1', 'w') as f:
+            f.write('1')
+        with open('file2', 'w') as f:
+            f.write('2')
+
+        with self.assertRaises(EnvironmentError) as raised:
+            lifecycle.execute('stage', jobs=2)
+
+        self.assertIn('have the following file paths in common which have '
+                      'different contents:\nfile', str(raised.exception))
+
+    def test_collisions_with_staged_parts_that_were_not_asked_for(self):
+        self.make_snapcraft_yaml("""name: collisions
+version: 0
+vendor: To Be Removed <vendor@example.com>
+summary: test stage
+description: staging parts with different files at the same path fails
+icon: icon.png
+
+parts:
+  part1:
+    plugin: copy
+    files:
+      file1: file
+  part2:
+    plugin: copy
+    files:
+      file2: file
+""")
+        open('icon.png', 'w').close()
+        with open('file1', 'w') as f:
+            f.write('1')
+        with open('file2', 'w') as f:
+            f.write('2')
+        lifecycle.execute('stage', part_names=['part1'])
+
+        with self.assertRaises(EnvironmentError) as raised:
+            lifecycle.execute('stage', part_names=['part2'])
+
+        self.assertIn('have the following file paths in common which have '
+                      'different contents:\nfile', str(raised.exception))
+
+    def test_collisions_with_parts_staged_without_a_record_of_files(self):
+        self.make_snapcraft_yaml("""name: collisions
+version: 0
+vendor: To Be Removed <vendor@example.com>
+summary: test stage
+description: staging parts with different files at the same path fails
+icon: icon.png
+
+parts:
+  part1:
+    plugin: copy
+    files:
+      file1: file
+  part2:
+    plugin: copy
+    files:
+      file2: file
+""")
+        open('icon.png', 'w').close()
+        with open('file1', 'w') as f:
+            f.write('1')
+        with open('file2', 'w') as f:
+            f.write('2')
+        lifecycle.execute('stage', part_names=['part1'])
+        # Like a part staged by an older snapcraft.
+        os.remove(os.path.join('parts', 'part1', 'staged-files'))
+
+        with self.assertRaises(EnvironmentError) as raised:
+            lifecycle.execute('stage', part_names=['part2'])
+
+        self.assertIn('have the following file paths in common which have '
+                      'different contents:\nfile', str(raised.exception))
+
+    def test_staged_parts_are_not_loaded_for_other_parts(self):
+        self.make_snapcraft_yaml("""name: staged
+version: 0
+vendor: To Be Removed <vendor@example.com>
+summary: test stage
+description: parts in stage are not loaded to check for collisions
+icon: icon.png
+
+parts:
+  part1:
+    plugin: nil
+  part2:
+    plugin: nil
+  part3:
+    plugin: nil
+  part4:
+    plugin: nil
+""")
+        open('icon.png', 'w').close()
+        lifecycle.execute('stage', part_names=['part1', 'part2', 'part4'])
+
+        with mock.patch('snapcraft.pluginhandler.load_plugin',
+                        wraps=pluginhandler.load_plugin) as mock_load_plugin:
+            lifecycle.execute('build', part_names=['part1'])
+            lifecycle.execute('stage', part_names=['part3'])
+
+        self.assertEqual(
+            ['part1', 'part3'],
+            [c[0][0] for c in mock_load_plugin.call_args_list])
+        self.assertEqual('stage', pluginhandler.get_last_step('part3'))
+
+    def test_only_the_parts_asked_for_are_loaded(self):
+        self.make_snapcraft_yaml("""name: after
+version: 0
+vendor: To Be Removed <vendor@example.com>
+summary: test stage
+description: parts that are not asked for are not loaded
+icon: icon.png
+
+parts:
+  part1:
+    plugin: nil
+  part2:
+    plugin: nil
+    after:
+      - part1
+  part3:
+    plugin: does-not-exist
+""")
+        open('icon.png', 'w').close()
+
+        lifecycle.execute('pull', part_names=['part1', 'part2'])
+
+        self.assertEqual('pull', pluginhandler.get_last_step('part2'))
+        self.assertIsNone(pluginhandler.get_last_step('part3'))
+
+    def test_prerequisites_visited_once(self):
+        fake_logger = fixtures.FakeLogger(level=logging.INFO)
+        self.useFixture(fake_logger)
+
+        self.make_snapcraft_yaml("""name: after
+version: 0
+vendor: To Be Removed <vendor@example.com>
+summary: test stage
+description: if the build is succesful the state file will be updated
+icon: icon.png
+
+parts:
+  part1:
+    plugin: nil
+  part2:
+    plugin: nil
+    after:
+      - part1
+  part3:
+    plugin: nil
+    after:
+      - part1
+      - part2
+""")
+        open('icon.png', 'w').close()
+
+        executor = lifecycle._Executor(snapcraft.yaml.load_config())
+        executor.run('build')
+
+        self.assertEqual(
+            'Pulling part1 \n'
+            '\'part2\' has prerequisites that need to be staged: part1\n'
+            'Building part1 \n'
+            'Staging part1 \n'
+            'Pulling part2 \n'
+            '\'part3\' has prerequisites that need to be staged: part2\n'
+            'Building part2 \n'
+            'Staging part2 \n'
+            'Pulling part3 \n'
+            'Building part3 \n',
+            fake_logger.output)
+        # Staging prerequisites on demand for each step of each part would
+        # have visited 42 part steps instead of 8.
+        self.assertEqual(34, executor.avoided_visits)
+
+
+class PlanTestCase(tests.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.make_snapcraft_yaml("""name: after
+version: 0
+vendor: To Be Removed <vendor@example.com>
+summary: test stage
+description: if the build is succesful the state file will be updated
+icon: icon.png
+
+parts:
+  part1:
+    plugin: nil
+  part2:
+    plugin: nil
+    after:
+      - part1
+  part3:
+    plugin: nil
+""")
+        open('icon.png', 'w').close()
+        self.useFixture(fixtures.FakeLogger(level=logging.INFO))
+
+    def set_durations(self, part_name, durations):
+        with open(os.path.join('parts', part_name, 'durations'), 'w') as f:
+            f.write(''.join('{}: {}\n'.format(step, durations[step])
+                            for step in durations))
+
+    @mock.patch('sys.stdout', new_callable=io.StringIO)
+    def test_plan_without_history(self, mock_stdout):
+        lifecycle.show_plan('pull')
+
+        self.assertEqual(
+            "Plan for 'pull':\n"
+            '  part3  pull   dirty                no estimate\n'
+            '  part1  pull   dirty                no estimate\n'
+            '  part1  build  dirty                no estimate\n'
+            '  part1  stage  dirty                no estimate\n'
+            '  part2  pull   dirty                no estimate\n'
+            'Estimated time: 0.0s\n'
+            'Critical path: part1 pull -> part1 build -> part1 stage -> '
+            'part2 pull\n',
+            mock_stdout.getvalue())
+        self.assertFalse(os.path.exists('parts'))
+
+    @mock.patch('sys.stdout', new_callable=io.StringIO)
+    def test_plan_with_changes(self, mock_stdout):
+        lifecycle.execute('build')
+        self.set_durations('part1', {'pull': 1, 'build': 30, 'stage': 1})
+        self.set_durations('part2', {'pull': 2, 'build': 50})
+        self.set_durations('part3', {'pull': 70, 'build': 20})
+
+        # Editing the stage keyword of part1 changes its stage fingerprint.
+        with open('snapcraft.yaml') as f:
+            content = f.read()
+        with open('snapcraft.yaml', 'w') as f:
+            f.write(content.replace(
+                '  part1:\n    plugin: nil\n',
+                '  part1:\n    plugin: nil\n    stage: [\'-lib\']\n'))
+
+        lifecycle.show_plan('build', jobs=2)
+
+        self.assertEqual(
+            "Plan for 'build':\n"
+            '  part3  pull   up to date\n'
+            '  part3  build  up to date\n'
+            '  part1  pull   up to date\n'
+            '  part1  build  up to date\n'
+            '  part1  stage  fingerprint changed                       1.0s\n'
+            '  part2  pull   up to date\n'
+            "  part2  build  may run if part1's staged output changes  "
+            '50.0s\n'
+            'Estimated time: 1.0s, without the steps that may run\n'
+            'Critical path: part1 pull -> part1 build -> part1 stage -> '
+            'part2 pull\n',
+            mock_stdout.getvalue())
+
+    def test_restaged_prerequisite_does_not_pull_again(self):
+        lifecycle.execute('build')
+
+        with open('snapcraft.yaml') as f:
+            content = f.read()
+        with open('snapcraft.yaml', 'w') as f:
+            f.write(content.replace(
+                '  part1:\n    plugin: nil\n',
+                '  part1:\n    plugin: nil\n    stage: [\'-lib\']\n'))
+
+        actions = lifecycle._Executor(snapcraft.yaml.load_config()).explain(
+            'build')
+
+        self.assertEqual(
+            [('part1', 'stage', 'fingerprint changed', []),
+             ('part2', 'build', "may run if part1's staged output changes",
+              ['part1'])],
+            [(a['part'], a['step'], a['reason'], a['conditions'])
+             for a in actions if a['reason']])
+
+    def test_steps_that_may_run_follow_prerequisites(self):
+        self.make_snapcraft_yaml("""name: after
+version: 0
+vendor: To Be Removed <vendor@example.com>
+summary: test stage
+description: if the build is succesful the state file will be updated
+icon: icon.png
+
+parts:
+  part1:
+    plugin: nil
+  part2:
+    plugin: nil
+    after:
+      - part1
+  part3:
+    plugin: nil
+    after:
+      - part2
+""")
+        open('icon.png', 'w').close()
+        lifecycle.execute('stage')
+        with open('snapcraft.yaml') as f:
+            content = f.read()
+        with open('snapcraft.yaml', 'w') as f:
+            f.write(content.replace(
+                '  part1:\n    plugin: nil\n',
+                '  part1:\n    plugin: nil\n    stage: [\'-lib\']\n'))
+
+        actions = lifecycle._Executor(snapcraft.yaml.load_config()).explain(
+            'stage')
+
+        self.assertEqual(
+            [('part1', 'stage', []),
+             ('part2', 'build', ['part1']),
+             ('part2', 'stage', ['part1']),
+             ('part3', 'build', ['part1', 'part2']),
+             ('part3', 'stage', ['part1', 'part2'])],
+            [(a['part'], a['step'], a['conditions'])
+             for a in actions if a['reason']])
+
+
+class WatchTestCase(tests.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.make_snapcraft_yaml("""name: watch
+version: 0
+vendor: To Be Removed <vendor@example.com>
+summary: test watch
+description: parts with local sources are watched
+icon: icon.png
+
+parts:
+  part1:
+    plugin: make
+    source: src1
+  part2:
+    plugin: make
+    source: src2
+    after:
+      - part1
+  part3:
+    plugin: nil
+""")
+        open('icon.png', 'w').close()
+        os.mkdir('src1')
+        os.mkdir('src2')
+        self.fake_logger = fixtures.FakeLogger(level=logging.INFO)
+        self.useFixture(self.fake_logger)
+
+        patcher = mock.patch('snapcraft.lifecycle.execute')
+        self.mock_execute = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        patcher = mock.patch('snapcraft.watcher.Watcher.wait')
+        self.mock_wait = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_watch_executes_again_on_changes(self):
+        self.mock_wait.side_effect = [
+            {os.path.abspath(os.path.join('src2', 'file'))},
+            KeyboardInterrupt(),
+        ]
+
+        lifecycle.watch('build', jobs=2)
+
+        self.assertEqual(
+            [mock.call('build', None, 2)] * 2,
+            self.mock_execute.call_args_list)
+        self.assertIn(
+            'Watching the sources of part1, part2 for changes\n'
+            'The sources of part2 changed\n',
+            self.fake_logger.output)
+
+    def test_watch_continues_after_failures(self):
+        self.mock_execute.side_effect = [None, RuntimeError('failed'), None]
+        self.mock_wait.side_effect = [
+            {os.path.abspath('src1')},
+            {os.path.abspath('src1')},
+            KeyboardInterrupt(),
+        ]
+
+        lifecycle.watch('stage', ['part1'])
+
+        self.assertEqual(3, self.mock_execute.call_count)
+        self.assertIn('Watching the sources of part1 for changes\n'
+                      'The sources of part1 changed\n'
+                      'failed\n', self.fake_logger.output)
+
+    def test_watch_without_local_sources(self):
+        lifecycle.watch('build', ['part3'])
+
+        self.mock_execute.assert_called_once_with('build', ['part3'], 1)
+        self.assertFalse(self.mock_wait.called)
+        self.assertEqual('There are no local sources to watch\n',
+                         self.fake_logger.output)
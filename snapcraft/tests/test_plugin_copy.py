@@ -31,6 +31,19 @@ class TestCopyPlugin(TestCase):
         self.dst_prefix = 'parts/copy/install/'
         os.makedirs(self.dst_prefix)
 
+    def test_local_inputs(self):
+        self.mock_options.files = {
+            'src': 'dst',
+            'dir/*.txt': 'txt/',
+        }
+        os.makedirs('dir')
+        for name in ('a.txt', 'b.txt', 'c.png'):
+            open(os.path.join('dir', name), 'w').close()
+        c = CopyPlugin('copy', self.mock_options)
+
+        self.assertEqual(
+            ['dir/a.txt', 'dir/b.txt', 'src'], sorted(c.local_inputs()))
+
     def test_copy_plugin_any_missing_src_raises_exception(self):
         # ensure that a bad file causes a warning and fails the build even
         # if there is a good file last
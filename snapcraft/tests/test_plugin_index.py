@@ -0,0 +1,94 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright (C) 2015 Canonical Ltd
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import ast
+import os
+import shutil
+import sys
+from unittest import mock
+
+import fixtures
+
+from snapcraft import (
+    plugin_index,
+    tests,
+)
+
+
+class PluginIndexTestCase(tests.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        shutil.copytree(plugin_index.get_plugindir(), 'plugins')
+        self.useFixture(fixtures.MonkeyPatch(
+            'snapcraft.plugin_index.get_plugindir',
+            lambda: os.path.abspath('plugins')))
+        self.useFixture(fixtures.MonkeyPatch(
+            'snapcraft.plugin_index._loaded', None))
+
+    def test_names(self):
+        names = plugin_index.names()
+
+        self.assertIn('nil', names)
+        self.assertIn('tar-content', names)
+        self.assertNotIn('__init__', names)
+        self.assertEqual(sorted(names), names)
+
+    def test_get(self):
+        plugin = plugin_index.get('tar-content')
+
+        self.assertEqual('tar-content', plugin.name)
+        self.assertEqual('snapcraft.plugins.tar_content', plugin.module)
+        self.assertEqual(plugin, plugin_index.get('tar_content'))
+        self.assertIsNone(plugin_index.get('does-not-exist'))
+
+    def test_get_does_not_import_plugins(self):
+        sys.modules.pop('snapcraft.plugins.nil', None)
+
+        plugin = plugin_index.get('nil')
+
+        self.assertNotIn('snapcraft.plugins.nil', sys.modules)
+        import snapcraft.plugins.nil
+        self.assertEqual(snapcraft.plugins.nil.__doc__, plugin.doc)
+
+    def test_index_is_read_once(self):
+        with mock.patch('snapcraft.plugin_index.identity',
+                        wraps=plugin_index.identity) as mock_identity:
+            plugin_index.get('nil')
+            plugin_index.get('copy')
+
+        self.assertEqual(1, mock_identity.call_count)
+
+    def test_index_is_read_from_the_disk_cache(self):
+        expected = plugin_index.get('nil')
+        plugin_index._loaded = None
+
+        with mock.patch('ast.parse') as mock_parse:
+            self.assertEqual(expected, plugin_index.get('nil'))
+
+        self.assertFalse(mock_parse.called)
+
+    def test_index_follows_the_plugin_files(self):
+        plugin_index.names()
+        with open(os.path.join('plugins', 'new_plugin.py'), 'w') as f:
+            f.write('"""The new plugin."""\n')
+        plugin_index._loaded = None
+
+        with mock.patch('ast.parse', wraps=ast.parse) as mock_parse:
+            plugin = plugin_index.get('new-plugin')
+
+        self.assertEqual('The new plugin.', plugin.doc)
+        self.assertTrue(mock_parse.called)
@@ -16,6 +16,7 @@
 
 import logging
 import os
+import sys
 import tempfile
 from unittest.mock import (
     Mock,
@@ -181,6 +182,22 @@ class PluginTestCase(tests.TestCase):
 
                 self.assertEqual(expected, result)
 
+    def test_migrate_files_replaces_stale_files(self):
+        os.makedirs('install')
+        os.makedirs('stage')
+        with open(os.path.join('install', 'a'), 'w') as f:
+            f.write('old')
+        pluginhandler._migrate_files({'a'}, set(), 'install', 'stage')
+
+        # Rebuilding creates a new file instead of modifying the linked one.
+        os.remove(os.path.join('install', 'a'))
+        with open(os.path.join('install', 'a'), 'w') as f:
+            f.write('new')
+        pluginhandler._migrate_files({'a'}, set(), 'install', 'stage')
+
+        with open(os.path.join('stage', 'a')) as f:
+            self.assertEqual('new', f.read())
+
     @patch('snapcraft.pluginhandler._load_local')
     @patch('snapcraft.pluginhandler._get_plugin')
     def test_schema_not_found(self, plugin_mock, local_load_mock):
@@ -203,9 +220,48 @@ class PluginTestCase(tests.TestCase):
         mock_plugin.schema.return_value = {}
         plugin_mock.return_value = mock_plugin
         local_load_mock.side_effect = ImportError()
-        pluginhandler.PluginHandler('mock', 'mock-part', {})
-        import_mock.assert_called_with('snapcraft.plugins.mock')
-        local_load_mock.assert_called_with('x-mock')
+        pluginhandler.PluginHandler('tar-content', 'mock-part', {})
+        import_mock.assert_called_with('snapcraft.plugins.tar_content')
+        local_load_mock.assert_called_with('x-tar-content')
+
+    def test_local_plugins(self):
+        os.makedirs(os.path.join('parts', 'plugins'))
+        with open(os.path.join('parts', 'plugins', 'x_local.py'), 'w') as f:
+            f.write('import snapcraft\n'
+                    'class LocalPlugin(snapcraft.BasePlugin):\n'
+                    '    pass\n')
+        path = list(sys.path)
+
+        part = pluginhandler.load_plugin(
+            'local-part', 'x_local', {'source': '.'})
+
+        self.assertEqual('LocalPlugin', type(part.code).__name__)
+        self.assertEqual(path, sys.path)
+
+    def test_no_local_plugins_are_imported_without_plugin_files(self):
+        with patch('importlib.import_module') as import_mock:
+            with self.assertRaises(ImportError):
+                pluginhandler._load_local('x-nil')
+
+        self.assertFalse(import_mock.called)
+
+    def test_plugin_schema_is_compiled_once(self):
+        self.useFixture(fixtures.MonkeyPatch(
+            'snapcraft.pluginhandler._plugin_schemas', {}))
+        with patch('snapcraft.plugins.nil.NilPlugin.schema',
+                   return_value={'properties': {}}) as mock_schema:
+            pluginhandler.load_plugin('part1', 'nil')
+            pluginhandler.load_plugin('part2', 'nil')
+
+        self.assertEqual(1, mock_schema.call_count)
+
+    def test_options_do_not_share_defaults(self):
+        part1 = pluginhandler.load_plugin('part1', 'nil')
+        part2 = pluginhandler.load_plugin('part2', 'nil')
+
+        part1.code.options.stage_packages.append('foo')
+
+        self.assertEqual([], part2.code.options.stage_packages)
 
     def test_filesets_includes_without_relative_paths(self):
         with self.assertRaises(pluginhandler.PluginError) as raised:
@@ -334,3 +390,193 @@ class CollisionTestCase(tests.TestCase):
             raised.exception.__str__(),
             "Parts 'part2' and 'part3' have the following file paths in "
             "common which have different contents:\n1\na/2")
+
+
+class StateTestCase(tests.TestCase):
+
+    def load_part(self, properties=None):
+        return self.load_part_with_plugin('nil', properties)
+
+    def load_part_with_plugin(self, plugin_name, properties=None):
+        part = pluginhandler.load_plugin(
+            'test_part', plugin_name, properties)
+        part.makedirs()
+        return part
+
+    def run_steps(self, part):
+        for step in common.COMMAND_ORDER:
+            part.mark_done(step)
+
+    def test_steps_already_run_are_not_dirty(self):
+        part = self.load_part()
+        self.run_steps(part)
+
+        for step in common.COMMAND_ORDER:
+            self.assertFalse(part.is_dirty(step),
+                             '{!r} was expected to be clean'.format(step))
+
+    def test_state_without_fingerprints_is_trusted(self):
+        part = self.load_part()
+        with open(part.statefile, 'w') as f:
+            f.write('strip')
+
+        for step in common.COMMAND_ORDER:
+            self.assertFalse(part.is_dirty(step),
+                             '{!r} was expected to be clean'.format(step))
+
+    def test_changed_properties_make_all_steps_dirty(self):
+        self.run_steps(self.load_part())
+
+        part = self.load_part({'build-packages': ['gcc']})
+
+        for step in common.COMMAND_ORDER:
+            self.assertTrue(part.is_dirty(step),
+                            '{!r} was expected to be dirty'.format(step))
+
+    def test_changed_stage_property_only_affects_later_steps(self):
+        self.run_steps(self.load_part({'stage': ['*']}))
+
+        part = self.load_part({'stage': ['-lib']})
+
+        self.assertFalse(part.is_dirty('pull'))
+        self.assertFalse(part.is_dirty('build'))
+        self.assertTrue(part.is_dirty('stage'))
+        self.assertTrue(part.is_dirty('strip'))
+
+    def test_changed_source_makes_build_dirty(self):
+        part = self.load_part()
+        self.run_steps(part)
+
+        with open(os.path.join(part.code.sourcedir, 'file'), 'w') as f:
+            f.write('new content')
+        part = self.load_part()
+
+        self.assertFalse(part.is_dirty('pull'))
+        self.assertTrue(part.is_dirty('build'))
+
+    def test_generated_dirs_in_source_are_ignored(self):
+        part = self.load_part()
+        self.run_steps(part)
+
+        os.makedirs(os.path.join(part.code.sourcedir, 'parts'))
+        part = self.load_part()
+
+        self.assertFalse(part.is_dirty('build'))
+
+    def test_project_files_in_local_source_are_ignored(self):
+        part = self.load_part()
+        # Like pulling a part with source: .
+        os.rmdir(part.code.sourcedir)
+        os.symlink(os.getcwd(), part.code.sourcedir)
+        self.run_steps(part)
+
+        for name in ('exp_1_amd64.snap', 'snapcraft.yaml'):
+            with open(name, 'w') as f:
+                f.write('new content')
+        part = self.load_part()
+
+        self.assertFalse(part.is_dirty('build'))
+
+    def test_changed_local_input_makes_build_dirty(self):
+        with open('file', 'w') as f:
+            f.write('content')
+        part = self.load_part_with_plugin('copy', {'files': {'file': 'dst'}})
+        self.run_steps(part)
+
+        with open('file', 'w') as f:
+            f.write('new content')
+        part = self.load_part_with_plugin('copy', {'files': {'file': 'dst'}})
+
+        self.assertFalse(part.is_dirty('pull'))
+        self.assertTrue(part.is_dirty('build'))
+
+    def stage_prerequisite(self, content):
+        part = self.load_part()
+        with open(os.path.join(part.installdir, 'lib'), 'w') as f:
+            f.write(content)
+        part.stage(force=True)
+        return part
+
+    def load_dependent_part(self, prerequisite):
+        part = pluginhandler.load_plugin('test_part2', 'nil')
+        part.makedirs()
+        part.deps.append(prerequisite)
+        return part
+
+    def test_restaged_prerequisite_makes_build_dirty(self):
+        part2 = self.load_dependent_part(self.stage_prerequisite('1'))
+        self.run_steps(part2)
+
+        self.stage_prerequisite('2')
+
+        self.assertFalse(part2.is_dirty('pull'))
+        self.assertTrue(part2.is_dirty('build'))
+
+    def test_identically_restaged_prerequisite_keeps_build_clean(self):
+        part2 = self.load_dependent_part(self.stage_prerequisite('1'))
+        self.run_steps(part2)
+
+        # Rebuilding the prerequisite creates new files with the same content.
+        os.remove(os.path.join('parts', 'test_part', 'install', 'lib'))
+        self.stage_prerequisite('1')
+
+        self.assertFalse(part2.is_dirty('build'))
+
+    def test_restaged_indirect_prerequisite_makes_build_dirty(self):
+        part2 = self.load_dependent_part(self.stage_prerequisite('1'))
+        part2.stage(force=True)
+        part3 = pluginhandler.load_plugin('test_part3', 'nil')
+        part3.makedirs()
+        part3.deps.append(part2)
+        self.run_steps(part3)
+
+        # What test_part2 staged stays the same.
+        self.stage_prerequisite('2')
+
+        self.assertFalse(part3.is_dirty('pull'))
+        self.assertTrue(part3.is_dirty('build'))
+
+
+class BuildCacheTestCase(tests.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.useFixture(fixtures.EnvironmentVariable(
+            'SNAPCRAFT_BUILD_CACHE', os.path.join(self.path, 'cache')))
+
+    def test_build_restored_from_cache(self):
+        fake_logger = fixtures.FakeLogger(level=logging.INFO)
+        self.useFixture(fake_logger)
+
+        part = pluginhandler.load_plugin('test_part', 'nil')
+        part.makedirs()
+        open(os.path.join(part.installdir, 'built'), 'w').close()
+        part.build()
+        part.clean()
+
+        part = pluginhandler.load_plugin('test_part', 'nil')
+        part.code.build = Mock()
+        part.build()
+
+        self.assertFalse(part.code.build.called)
+        self.assertTrue(
+            os.path.exists(os.path.join(part.installdir, 'built')))
+        self.assertEqual(
+            'Building test_part \n'
+            'Cleaning up for part "test_part"\n'
+            'Restoring test_part  (from the build cache)\n',
+            fake_logger.output)
+        self.assertFalse(part.is_dirty('build'))
+
+    def test_cache_key_is_the_same_in_another_project_directory(self):
+        keys = []
+        for projectdir in ('project1', 'project2'):
+            os.makedirs(projectdir)
+            os.chdir(projectdir)
+            part = pluginhandler.load_plugin('test_part', 'nil')
+            part.makedirs()
+            part.code.env = lambda root: ['PATH={}/bin:$PATH'.format(root)]
+            keys.append(part.cache_key())
+            os.chdir(self.path)
+
+        self.assertEqual(keys[0], keys[1])
@@ -0,0 +1,111 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright (C) 2015 Canonical Ltd
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+from unittest import mock
+
+import jsonschema
+import yaml
+
+from snapcraft import (
+    common,
+    schema,
+    tests,
+)
+
+
+_SCHEMA = """\
+$schema: http://json-schema.org/draft-04/schema#
+type: object
+properties:
+  name:
+    type: string
+  parts:
+    type: object
+    patternProperties:
+      ^[a-z]+$:
+        type: object
+        properties:
+          plugin:
+            type: string
+          after:
+            type: array
+"""
+
+
+class SchemaTestCase(tests.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        os.mkdir('schema')
+        with open(os.path.join('schema', 'snapcraft.yaml'), 'w') as f:
+            f.write(_SCHEMA)
+        os.utime(os.path.join('schema', 'snapcraft.yaml'), (1000, 1000))
+        common.set_schemadir('schema')
+        patcher = mock.patch.object(schema, '_loaded', {})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_load_parses_once(self):
+        with mock.patch('yaml.load', wraps=yaml.load) as mock_load:
+            self.assertEqual('object', schema.load()['type'])
+            self.assertIs(schema.load(), schema.load())
+
+        self.assertEqual(1, mock_load.call_count)
+
+    def test_load_from_the_disk_cache(self):
+        expected = schema.load()
+        schema._loaded.clear()
+
+        with mock.patch('yaml.load') as mock_load:
+            self.assertEqual(expected, schema.load())
+
+        self.assertFalse(mock_load.called)
+
+    def test_load_again_when_the_schema_changes(self):
+        schema.load()
+        schema._loaded.clear()
+        with open(os.path.join('schema', 'snapcraft.yaml'), 'a') as f:
+            f.write('required: [name]\n')
+
+        self.assertEqual(['name'], schema.load()['required'])
+
+    def test_load_missing_schema(self):
+        common.set_schemadir('missing')
+
+        with self.assertRaises(FileNotFoundError):
+            schema.load()
+
+    def test_part_properties(self):
+        self.assertEqual({'properties': {
+            'plugin': {'type': 'string'},
+            'after': {'type': 'array'},
+        }}, schema.part_properties())
+        self.assertIs(schema.part_properties(), schema.part_properties())
+
+    def test_validate(self):
+        validator = schema.get_validator()
+        self.assertIs(validator, schema.get_validator())
+
+        schema.validate(validator, {'name': 'test', 'parts': {}})
+        with self.assertRaises(jsonschema.ValidationError) as raised:
+            schema.validate(validator, {'name': 1})
+
+        self.assertEqual("1 is not of type 'string'", raised.exception.message)
+
+    def test_make_validator_checks_the_schema(self):
+        with self.assertRaises(jsonschema.SchemaError):
+            schema.make_validator({'type': 1})
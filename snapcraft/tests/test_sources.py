@@ -311,6 +311,27 @@ class TestLocal(SourceTestCase):
             '/home/ubuntu/sources/snap/source', 'source_file')
 
 
+class TestIsLocal(tests.TestCase):
+
+    def test_is_local(self):
+        os.mkdir('src')
+        scenarios = [
+            ({'source': 'src'}, True),
+            ({'source': 'src', 'source_type': 'git'}, False),
+            ({'source': 'lp:project'}, False),
+            ({'source': 'https://project.tar.gz'}, False),
+            ({'source': 'https://project'}, False),
+            ({}, False),
+        ]
+
+        for properties, expected in scenarios:
+            with self.subTest(key=properties):
+                options = unittest.mock.Mock(spec=list(properties))
+                for key, value in properties.items():
+                    setattr(options, key, value)
+                self.assertEqual(expected, snapcraft.sources.is_local(options))
+
+
 class TestUri(tests.TestCase):
 
     def test_get_tar_source_from_uri(self):
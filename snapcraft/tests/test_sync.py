@@ -0,0 +1,146 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright (C) 2015 Canonical Ltd
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+
+from snapcraft import (
+    sync,
+    tests,
+)
+
+
+def _write(path, content):
+    with open(path, 'w') as f:
+        f.write(content)
+
+
+def _read(path):
+    with open(path) as f:
+        return f.read()
+
+
+class SyncTreeTestCase(tests.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        os.makedirs(os.path.join('src', 'dir'))
+        _write(os.path.join('src', 'main.c'), 'main')
+        _write(os.path.join('src', 'dir', 'lib.c'), 'lib')
+        os.symlink('main.c', os.path.join('src', 'link'))
+        os.utime(os.path.join('src', 'main.c'), (1000, 1000))
+
+    def sync(self, **kwargs):
+        sync.sync_tree('src', 'build', 'manifest', **kwargs)
+
+    def test_first_sync_copies_everything(self):
+        os.makedirs('build')
+        _write(os.path.join('build', 'stale'), 'stale')
+
+        self.sync()
+
+        self.assertEqual('main', _read(os.path.join('build', 'main.c')))
+        self.assertEqual(
+            'lib', _read(os.path.join('build', 'dir', 'lib.c')))
+        self.assertEqual('main.c', os.readlink(os.path.join('build', 'link')))
+        self.assertEqual(
+            1000, os.stat(os.path.join('build', 'main.c')).st_mtime)
+        self.assertFalse(os.path.exists(os.path.join('build', 'stale')))
+
+    def test_sync_keeps_build_products(self):
+        self.sync()
+        _write(os.path.join('build', 'main.o'), 'object')
+
+        self.sync()
+
+        self.assertEqual('object', _read(os.path.join('build', 'main.o')))
+
+    def test_sync_copies_changed_files_only(self):
+        self.sync()
+        os.utime(os.path.join('build', 'dir', 'lib.c'), (2000, 2000))
+        _write(os.path.join('src', 'main.c'), 'changed')
+        os.utime(os.path.join('src', 'main.c'), (3000, 3000))
+
+        self.sync()
+
+        self.assertEqual('changed', _read(os.path.join('build', 'main.c')))
+        self.assertEqual(
+            3000, os.stat(os.path.join('build', 'main.c')).st_mtime)
+        # Left alone, it did not change in the sources.
+        self.assertEqual(
+            2000, os.stat(os.path.join('build', 'dir', 'lib.c')).st_mtime)
+
+    def test_sync_older_version_looks_newer(self):
+        self.sync()
+        _write(os.path.join('src', 'main.c'), 'older')
+        os.utime(os.path.join('src', 'main.c'), (500, 500))
+
+        self.sync()
+
+        self.assertEqual('older', _read(os.path.join('build', 'main.c')))
+        self.assertGreater(
+            os.stat(os.path.join('build', 'main.c')).st_mtime, 1000)
+
+    def test_sync_removes_deleted_sources(self):
+        self.sync()
+        _write(os.path.join('build', 'dir', 'lib.o'), 'object')
+        os.remove(os.path.join('src', 'main.c'))
+        os.remove(os.path.join('src', 'dir', 'lib.c'))
+        os.rmdir(os.path.join('src', 'dir'))
+
+        self.sync()
+
+        self.assertFalse(os.path.exists(os.path.join('build', 'main.c')))
+        self.assertFalse(os.path.exists(os.path.join('build', 'dir')))
+        self.assertTrue(os.path.islink(os.path.join('build', 'link')))
+
+    def test_sync_replaces_files_with_directories(self):
+        self.sync()
+        os.remove(os.path.join('src', 'main.c'))
+        os.mkdir(os.path.join('src', 'main.c'))
+        _write(os.path.join('src', 'main.c', 'file'), 'file')
+
+        self.sync()
+
+        self.assertEqual(
+            'file', _read(os.path.join('build', 'main.c', 'file')))
+
+    def test_sync_restores_sources_removed_by_the_build(self):
+        self.sync()
+        os.remove(os.path.join('build', 'main.c'))
+
+        self.sync()
+
+        self.assertEqual('main', _read(os.path.join('build', 'main.c')))
+
+    def test_sync_ignores_names_at_the_top(self):
+        os.mkdir(os.path.join('src', 'parts'))
+        os.mkdir(os.path.join('src', 'dir', 'parts'))
+
+        self.sync(ignore=['parts'])
+
+        self.assertFalse(os.path.exists(os.path.join('build', 'parts')))
+        self.assertTrue(
+            os.path.isdir(os.path.join('build', 'dir', 'parts')))
+
+    def test_sync_into_another_destination_starts_over(self):
+        self.sync()
+        os.mkdir('other')
+        _write(os.path.join('other', 'stale'), 'stale')
+
+        sync.sync_tree('src', 'other', 'manifest')
+
+        self.assertFalse(os.path.exists(os.path.join('other', 'stale')))
+        self.assertEqual('main', _read(os.path.join('other', 'main.c')))
@@ -0,0 +1,74 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright (C) 2015 Canonical Ltd
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import os
+
+from snapcraft import (
+    common,
+    tests,
+    trace,
+)
+
+
+class TraceTestCase(tests.TestCase):
+
+    def load_events(self):
+        with open('trace.json') as f:
+            return json.load(f)['traceEvents']
+
+    def test_span_without_recording(self):
+        with trace.span('name', 'test'):
+            self.assertFalse(trace.is_recording())
+
+        self.assertFalse(os.path.exists('trace.json'))
+
+    def test_record_without_path(self):
+        with trace.record(None):
+            self.assertFalse(trace.is_recording())
+
+    def test_record_spans(self):
+        with trace.record('trace.json'):
+            with trace.span('outer', 'test', key='value'):
+                with trace.span('inner', 'test'):
+                    pass
+
+        self.assertFalse(trace.is_recording())
+        inner, outer = self.load_events()
+        self.assertEqual('inner', inner['name'])
+        self.assertEqual('outer', outer['name'])
+        self.assertEqual({'key': 'value'}, outer['args'])
+        self.assertEqual('X', outer['ph'])
+        self.assertLessEqual(outer['ts'], inner['ts'])
+        self.assertGreaterEqual(
+            outer['ts'] + outer['dur'], inner['ts'] + inner['dur'])
+
+    def test_record_written_on_error(self):
+        with self.assertRaises(RuntimeError):
+            with trace.record('trace.json'):
+                with trace.span('failed', 'test'):
+                    raise RuntimeError()
+
+        self.assertEqual(['failed'], [e['name'] for e in self.load_events()])
+
+    def test_run_is_recorded(self):
+        with trace.record('trace.json'):
+            common.run(['/bin/true'])
+            common.run_output(['/bin/echo', 'hello'])
+
+        events = self.load_events()
+        self.assertEqual(['true', 'echo'], [e['name'] for e in events])
+        self.assertEqual(['/bin/echo', 'hello'], events[1]['args']['cmd'])
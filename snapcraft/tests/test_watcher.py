@@ -0,0 +1,59 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright (C) 2015 Canonical Ltd
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+
+from snapcraft import (
+    tests,
+    watcher,
+)
+
+
+class WatcherTestCase(tests.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        os.makedirs(os.path.join('src', 'dir'))
+        os.mkdir(os.path.join('src', 'parts'))
+        self.src = os.path.abspath('src')
+        self.watcher = watcher.Watcher()
+        self.addCleanup(self.watcher.close)
+        self.watcher.add_tree('src')
+
+    def test_wait_timeout(self):
+        self.assertEqual(set(), self.watcher.wait(timeout=0))
+
+    def test_wait_for_changes(self):
+        with open(os.path.join('src', 'dir', 'file'), 'w') as f:
+            f.write('content')
+
+        self.assertEqual({os.path.join(self.src, 'dir', 'file')},
+                         self.watcher.wait(timeout=1, settle=0.1))
+
+    def test_new_directories_are_watched(self):
+        os.mkdir(os.path.join('src', 'new'))
+        self.watcher.wait(timeout=1, settle=0.1)
+
+        open(os.path.join('src', 'new', 'file'), 'w').close()
+
+        self.assertEqual({os.path.join(self.src, 'new', 'file')},
+                         self.watcher.wait(timeout=1, settle=0.1))
+
+    def test_snapcraft_directories_are_not_watched(self):
+        open(os.path.join('src', 'parts', 'file'), 'w').close()
+        os.mkdir(os.path.join('src', 'stage'))
+
+        self.assertEqual(set(), self.watcher.wait(timeout=0.2))
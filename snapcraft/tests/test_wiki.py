@@ -14,11 +14,20 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import logging
+import os
+import time
 import unittest.mock
 
+import fixtures
+import requests
+
 import snapcraft.wiki
 
-from snapcraft.tests import TestCase
+from snapcraft.tests import (
+    TestCase,
+    fixture_setup,
+)
 
 
 class TestYaml(TestCase):
@@ -28,6 +37,9 @@ class TestYaml(TestCase):
 
         class Content:
 
+            status_code = 200
+            headers = {}
+
             @property
             def text(self):
                 return '''{{{part-in-wiki:
@@ -45,7 +57,7 @@ class TestYaml(TestCase):
     def tearDown(self):
         self.mock_requests.assert_called_once_with(
             'https://wiki.ubuntu.com/Snappy/Parts',
-            params={'action': 'raw'})
+            params={'action': 'raw'}, headers={}, timeout=10)
 
     def test_get_part(self):
         self.assertEqual(self.w.get_part('part-in-wiki'), {
@@ -69,8 +81,165 @@ class TestYaml(TestCase):
 
         self.assertEqual(properties, expected_properties)
 
+    def test_get_part_returns_a_copy(self):
+        self.w.get_part('part-in-wiki')['plugin'] = 'make'
+
+        self.assertEqual('go', self.w.get_part('part-in-wiki')['plugin'])
+
+    def test_compose_part_does_not_share_values_with_the_wiki(self):
+        self.w.get_part('part-in-wiki')
+        self.w.wiki_parts['part-in-wiki']['stage-packages'] = ['curl']
+
+        properties = self.w.compose('part-in-wiki', {})
+        properties['stage-packages'].append('make')
+
+        self.assertEqual(
+            ['curl'], self.w.get_part('part-in-wiki')['stage-packages'])
+
+    def test_get_part_drops_type_for_plugin(self):
+        self.w.get_part('part-in-wiki')
+        self.w.wiki_parts['part-in-wiki']['type'] = 'go'
+        self.w.wiki_parts['typed-part'] = {'type': 'go'}
+
+        self.assertNotIn('type', self.w.get_part('part-in-wiki'))
+        self.assertEqual({'type': 'go'}, self.w.get_part('typed-part'))
+
     def test_compose_part_for_part_not_in_wiki_raises_exception(self):
         with self.assertRaises(KeyError) as raised:
             self.w.compose('part-not-in-wiki',
                            {'source': '.', 'another': 'different'})
         self.assertEqual(raised.exception.args, ('part-not-in-wiki',))
+
+
+class WikiCacheTestCase(TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.wiki = fixture_setup.FakePartsWiki(
+            '{{{part-in-wiki:\n  plugin: go\n}}}')
+        self.useFixture(self.wiki)
+
+    def get_part(self):
+        return snapcraft.wiki.Wiki().get_part('part-in-wiki')
+
+    def later(self):
+        return unittest.mock.patch(
+            'time.time', return_value=time.time() + 2 * 60 * 60)
+
+    def test_wiki_is_downloaded_once(self):
+        self.assertEqual({'plugin': 'go'}, self.get_part())
+        self.assertEqual({'plugin': 'go'}, self.get_part())
+
+        self.assertEqual(1, len(self.wiki.requests))
+
+    def test_cached_wiki_is_not_parsed_again(self):
+        self.get_part()
+
+        with unittest.mock.patch('yaml.load') as mock_load:
+            self.assertEqual({'plugin': 'go'}, self.get_part())
+
+        self.assertFalse(mock_load.called)
+
+    def test_wiki_is_checked_for_changes_when_old(self):
+        self.get_part()
+
+        with self.later():
+            self.assertEqual({'plugin': 'go'}, self.get_part())
+        self.assertEqual(2, len(self.wiki.requests))
+        self.assertIn('If-None-Match', self.wiki.requests[1])
+
+        # Not changing refreshes the cached copy.
+        with self.later():
+            self.get_part()
+        self.assertEqual(2, len(self.wiki.requests))
+
+    def test_changed_wiki_is_downloaded_again(self):
+        self.get_part()
+        self.wiki.content = '{{{part-in-wiki:\n  plugin: make\n}}}'
+
+        with self.later():
+            self.assertEqual({'plugin': 'make'}, self.get_part())
+
+    def test_max_age(self):
+        self.useFixture(fixtures.EnvironmentVariable(
+            'SNAPCRAFT_WIKI_MAX_AGE', '0'))
+
+        self.get_part()
+        self.get_part()
+
+        self.assertEqual(2, len(self.wiki.requests))
+
+    def test_offline_uses_cached_wiki(self):
+        self.get_part()
+        self.useFixture(fixtures.EnvironmentVariable('SNAPCRAFT_OFFLINE', '1'))
+        self.wiki.content = '{{{part-in-wiki:\n  plugin: make\n}}}'
+
+        with self.later():
+            self.assertEqual({'plugin': 'go'}, self.get_part())
+
+        self.assertEqual(1, len(self.wiki.requests))
+
+    def test_offline_without_cached_wiki(self):
+        self.useFixture(fixtures.EnvironmentVariable('SNAPCRAFT_OFFLINE', '1'))
+
+        with self.assertRaises(EnvironmentError) as raised:
+            self.get_part()
+
+        self.assertEqual(
+            'the parts wiki is needed but has not been cached yet, it '
+            'cannot be used offline', str(raised.exception))
+        self.assertEqual([], self.wiki.requests)
+
+    def test_cached_wiki_is_used_when_the_wiki_fails(self):
+        fake_logger = fixtures.FakeLogger(level=logging.WARNING)
+        self.useFixture(fake_logger)
+        self.get_part()
+        self.wiki.status = 500
+
+        with self.later():
+            self.assertEqual({'plugin': 'go'}, self.get_part())
+
+        self.assertEqual(
+            'Using the cached parts wiki, checking it for changes returned '
+            '500\n', fake_logger.output)
+
+    def test_cached_wiki_is_used_when_the_wiki_cannot_be_reached(self):
+        fake_logger = fixtures.FakeLogger(level=logging.WARNING)
+        self.useFixture(fake_logger)
+        self.get_part()
+
+        unreachable = requests.exceptions.ConnectionError('unreachable')
+        with self.later(), unittest.mock.patch(
+                'requests.get', side_effect=unreachable):
+            self.assertEqual({'plugin': 'go'}, self.get_part())
+
+        self.assertEqual(
+            'Using the cached parts wiki, it could not be checked for '
+            'changes: unreachable\n', fake_logger.output)
+
+    def test_cached_wiki_is_used_when_the_wiki_times_out(self):
+        fake_logger = fixtures.FakeLogger(level=logging.WARNING)
+        self.useFixture(fake_logger)
+        self.get_part()
+
+        timeout = requests.exceptions.ReadTimeout('timed out')
+        with self.later(), unittest.mock.patch(
+                'requests.get', side_effect=timeout) as mock_get:
+            self.assertEqual({'plugin': 'go'}, self.get_part())
+
+        self.assertEqual(10, mock_get.call_args[1]['timeout'])
+        self.assertEqual(
+            'Using the cached parts wiki, it could not be checked for '
+            'changes: timed out\n', fake_logger.output)
+
+    def test_wiki_failing_without_cached_wiki(self):
+        self.wiki.status = 404
+
+        with self.assertRaises(EnvironmentError) as raised:
+            self.get_part()
+
+        self.assertEqual(
+            'unexpected http status code when downloading the parts wiki: '
+            '404', str(raised.exception))
+        self.assertFalse(os.path.exists(
+            os.path.join(self.path, '.cache', 'snapcraft', 'wiki.pickle')))
@@ -17,10 +17,12 @@
 import logging
 import os
 import tempfile
+import time
 import unittest
 import unittest.mock
 
 import fixtures
+import yaml
 
 import snapcraft.yaml
 from snapcraft import (
@@ -160,6 +162,63 @@ parts:
         mock_load.assert_has_calls([call1, call2])
         self.assertTrue(mock_get_part.called)
 
+    @unittest.mock.patch('snapcraft.wiki.Wiki._fetch')
+    def test_config_with_wiki_parts_after_wiki_parts(self, mock_fetch):
+        self.make_snapcraft_yaml("""name: test
+version: "1"
+summary: test
+description: test
+icon: my-icon.png
+
+parts:
+  part1:
+    after: [wiki1]
+    plugin: nil
+  part2:
+    after: [wiki2, wiki1]
+    plugin: nil
+""")
+        wiki_parts = {
+            'wiki1': {'plugin': 'nil', 'after': ['wiki3']},
+            'wiki2': {'plugin': 'nil', 'after': ['wiki3']},
+            'wiki3': {'plugin': 'nil', 'stage-packages': ['curl']},
+        }
+        self.useFixture(fixtures.MonkeyPatch(
+            'snapcraft.wiki.Wiki.wiki_parts', wiki_parts))
+
+        config = snapcraft.yaml.Config()
+
+        self.assertEqual(['part1', 'part2', 'wiki1', 'wiki2', 'wiki3'],
+                         config.part_names)
+        self.assertEqual({'wiki3'}, config.part_prereqs('wiki1'))
+        self.assertEqual({'wiki1', 'wiki2'}, config.part_dependents('wiki3'))
+        self.assertEqual('wiki3', config.all_parts[0].name)
+        self.assertEqual(['curl'], config.get_part(
+            'wiki3').code.options.stage_packages)
+        # The wiki is left as it was.
+        self.assertEqual({'plugin': 'nil', 'after': ['wiki3']},
+                         wiki_parts['wiki1'])
+
+    @unittest.mock.patch('snapcraft.wiki.Wiki.get_part')
+    def test_config_with_wiki_part_without_plugin(self, mock_get_part):
+        self.make_snapcraft_yaml("""name: test
+version: "1"
+summary: test
+description: test
+icon: my-icon.png
+
+parts:
+  part1:
+    after: [wiki1]
+    plugin: nil
+""")
+        mock_get_part.return_value = {'source': '.'}
+
+        with self.assertRaises(snapcraft.yaml.PluginNotDefinedError) as raised:
+            snapcraft.yaml.Config()
+
+        self.assertEqual('wiki1', raised.exception.part)
+
     def test_config_raises_on_missing_snapcraft_yaml(self):
         fake_logger = fixtures.FakeLogger(level=logging.ERROR)
         self.useFixture(fake_logger)
@@ -196,7 +255,115 @@ parts:
 
         self.assertEqual(
             raised.exception.message,
-            'circular dependency chain found in parts definition')
+            'circular dependency chain found in parts definition: '
+            'p1 -> p2 -> p1')
+
+    def test_config_names_the_cycle(self):
+        self.make_snapcraft_yaml("""name: test
+version: "1"
+summary: test
+description: test
+icon: my-icon.png
+
+parts:
+  top:
+    plugin: nil
+    after: [p1]
+  base:
+    plugin: nil
+  p1:
+    plugin: nil
+    after: [base, p2]
+  p2:
+    plugin: nil
+    after: [p3]
+  p3:
+    plugin: nil
+    after: [p1]
+""")
+        with self.assertRaises(snapcraft.yaml.SnapcraftLogicError) as raised:
+            snapcraft.yaml.Config()
+
+        self.assertEqual(
+            raised.exception.message,
+            'circular dependency chain found in parts definition: '
+            'p1 -> p2 -> p3 -> p1')
+
+    def test_config_sorts_parts_after_their_dependencies(self):
+        self.make_snapcraft_yaml("""name: test
+version: "1"
+summary: test
+description: test
+icon: my-icon.png
+
+parts:
+  app:
+    plugin: nil
+    after: [lib2, lib1]
+  lib1:
+    plugin: nil
+    after: [base]
+  tool:
+    plugin: nil
+  lib2:
+    plugin: nil
+    after: [base]
+  base:
+    plugin: nil
+""")
+        config = snapcraft.yaml.Config()
+
+        self.assertEqual(['base', 'lib2', 'tool', 'lib1', 'app'],
+                         [p.name for p in config.all_parts])
+        self.assertEqual({'lib1', 'lib2'}, config.part_dependents('base'))
+        self.assertEqual(set(), config.part_dependents('app'))
+        self.assertEqual('lib1', config.get_part('lib1').name)
+        self.assertEqual(None, config.get_part('missing'))
+
+    @unittest.mock.patch('snapcraft.pluginhandler.load_plugin',
+                         wraps=snapcraft.pluginhandler.load_plugin)
+    def test_config_for_some_parts_loads_what_they_are_after(
+            self, mock_load_plugin):
+        self.make_snapcraft_yaml("""name: test
+version: "1"
+summary: test
+description: test
+icon: my-icon.png
+
+parts:
+  app:
+    plugin: nil
+    after: [lib2, lib1]
+  lib1:
+    plugin: nil
+    after: [base]
+  tool:
+    plugin: nil
+  lib2:
+    plugin: nil
+    after: [base]
+  base:
+    plugin: nil
+""")
+        config = snapcraft.yaml.Config(['lib1', 'missing'])
+
+        self.assertEqual(['base', 'lib1'], [p.name for p in config.all_parts])
+        self.assertEqual(['app', 'lib1', 'tool', 'lib2', 'base'],
+                         config.part_names)
+        self.assertEqual(None, config.get_part('app'))
+        self.assertEqual(2, mock_load_plugin.call_count)
+        self.assertEqual({'lib1', 'lib2'}, config.part_dependents('base'))
+        self.assertEqual({'app'}, config.part_dependents('lib2'))
+
+        config.load_parts(['app'])
+
+        self.assertEqual(['base', 'lib2', 'lib1', 'app'],
+                         [p.name for p in config.all_parts])
+        self.assertEqual({'lib1', 'lib2'}, config.part_dependents('base'))
+        self.assertEqual(
+            ['base', 'base', 'lib2', 'lib1'],
+            [d.name for p in config.all_parts for d in p.deps])
+        self.assertEqual(4, mock_load_plugin.call_count)
 
     @unittest.mock.patch('snapcraft.yaml.Config.load_plugin')
     def test_invalid_yaml_missing_name(self, mock_loadPlugin):
@@ -345,6 +512,159 @@ parts:
             'stage': ['/usr/lib/wget.so', '/usr/bin/wget', '/usr/lib/wget.a'],
         })
 
+    @unittest.mock.patch('snapcraft.common.get_arch_triplet',
+                         return_value='x86_64-linux-gnu')
+    def test_build_env_for_part_with_shared_prerequisites(self, mock_arch):
+        self.make_snapcraft_yaml("""name: test
+version: "1"
+summary: test
+description: test
+icon: my-icon.png
+
+parts:
+  base:
+    plugin: nil
+  left:
+    plugin: nil
+    after: [base]
+  right:
+    plugin: nil
+    after: [base]
+  top:
+    plugin: nil
+    after: [left, right]
+""")
+        config = snapcraft.yaml.Config()
+        top = [p for p in config.all_parts if p.name == 'top'][0]
+
+        env = config.build_env_for_part(top)
+
+        stagedir = os.path.join(os.getcwd(), 'stage')
+        installdir = os.path.join(os.getcwd(), 'parts', 'top', 'install')
+        self.assertIn(
+            'PATH="{0}/bin:{0}/usr/bin:{1}/bin:{1}/usr/bin:$PATH"'.format(
+                installdir, stagedir),
+            env)
+        # Every variable is assigned once.
+        self.assertEqual(8, len(env))
+        self.assertIs(
+            config._staged_env_for_part(top.deps[0].deps[0]),
+            config._staged_env_for_part(top.deps[1].deps[0]))
+
+    @unittest.mock.patch('snapcraft.common.get_arch_triplet',
+                         return_value='x86_64-linux-gnu')
+    def test_build_env_for_part_with_ccache(self, mock_arch):
+        self.useFixture(fixtures.EnvironmentVariable(
+            'SNAPCRAFT_CCACHE', 'ccache'))
+        self.make_snapcraft_yaml("""name: test
+version: "1"
+summary: test
+description: test
+icon: my-icon.png
+build-packages: [make]
+
+parts:
+  part1:
+    plugin: nil
+""")
+        config = snapcraft.yaml.Config()
+
+        env = config.build_env_for_part(config.all_parts[0])
+
+        installdir = os.path.join(os.getcwd(), 'parts', 'part1', 'install')
+        self.assertIn(
+            'PATH="/usr/lib/ccache:{0}/bin:{0}/usr/bin:$PATH"'.format(
+                installdir),
+            env)
+        self.assertIn('CCACHE_DIR="{}"'.format(
+            os.path.join(os.getcwd(), 'ccache')), env)
+        self.assertEqual(['make', 'ccache'], config.build_tools)
+        self.assertEqual(['make'], config.data['build-packages'])
+
+
+class ProjectCacheTestCase(tests.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        dirs.setup_dirs()
+        self.make_snapcraft_yaml("""name: test
+version: "1"
+summary: test
+description: test
+icon: my-icon.png
+
+parts:
+  part1:
+    plugin: nil
+    after: [wikipart]
+""")
+        open('my-icon.png', 'w').close()
+
+        patcher = unittest.mock.patch('snapcraft.wiki.Wiki.get_part')
+        self.mock_get_part = patcher.start()
+        self.mock_get_part.side_effect = lambda name: {'plugin': 'nil'}
+        self.addCleanup(patcher.stop)
+
+    def load(self):
+        config = snapcraft.yaml.Config()
+        self.assertEqual(['part1', 'wikipart'], config.part_names)
+        self.assertEqual({'wikipart'}, config.part_prereqs('part1'))
+        return config
+
+    def test_cached_project_is_not_loaded_again(self):
+        self.load()
+
+        with unittest.mock.patch(
+                'snapcraft.yaml._snapcraft_yaml_load') as mock_load:
+            config = self.load()
+
+        self.assertFalse(mock_load.called)
+        self.assertEqual(1, self.mock_get_part.call_count)
+        self.assertEqual('test', config.data['name'])
+
+    def test_changed_project_is_loaded_again(self):
+        self.load()
+        with open('snapcraft.yaml', 'a') as f:
+            f.write('  part2:\n    plugin: nil\n')
+
+        config = snapcraft.yaml.Config()
+
+        self.assertEqual(['part1', 'part2', 'wikipart'], config.part_names)
+
+    def test_project_is_validated_again_for_missing_files(self):
+        self.load()
+        os.remove('my-icon.png')
+
+        with self.assertRaises(snapcraft.yaml.SnapcraftSchemaError):
+            snapcraft.yaml.Config()
+
+    def test_wiki_parts_expire(self):
+        self.load()
+
+        with unittest.mock.patch('time.time',
+                                 return_value=time.time() + 2 * 60 * 60):
+            self.load()
+
+        self.assertEqual(2, self.mock_get_part.call_count)
+
+    def test_yaml_errors_are_explained_by_the_python_loader(self):
+        with open('snapcraft.yaml', 'w') as f:
+            f.write('name: test\n\tversion: 1\n')
+
+        class Loader(yaml.Loader):
+            def get_single_data(self):
+                raise yaml.scanner.ScannerError(problem='unexplained')
+
+        with unittest.mock.patch('snapcraft.yaml._Loader', Loader):
+            with self.assertRaises(
+                    snapcraft.yaml.SnapcraftSchemaError) as raised:
+                snapcraft.yaml.Config()
+
+        self.assertEqual(
+            raised.exception.message,
+            'found character \'\\t\' that cannot start any token '
+            'on line 1 of snapcraft.yaml')
+
 
 class TestValidation(tests.TestCase):
 
@@ -510,18 +830,12 @@ class TestValidation(tests.TestCase):
                          msg=self.data)
 
     def test_schema_file_not_found(self):
-        mock_the_open = unittest.mock.mock_open()
-        mock_the_open.side_effect = FileNotFoundError()
+        snapcraft.common.set_schemadir(os.path.join(self.path, 'missing'))
 
-        with unittest.mock.patch('snapcraft.yaml.open', mock_the_open,
-                                 create=True):
-            with self.assertRaises(
-                    snapcraft.yaml.SnapcraftSchemaError) as raised:
-                snapcraft.yaml._validate_snapcraft_yaml(self.data)
+        with self.assertRaises(
+                snapcraft.yaml.SnapcraftSchemaError) as raised:
+            snapcraft.yaml._validate_snapcraft_yaml(self.data)
 
-        expected_path = os.path.join(snapcraft.common.get_schemadir(),
-                                     'snapcraft.yaml')
-        mock_the_open.assert_called_once_with(expected_path)
         expected_message = ('snapcraft validation file is missing from '
                             'installation path')
         self.assertEqual(raised.exception.message, expected_message)
@@ -0,0 +1,86 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright (C) 2015 Canonical Ltd
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""A timeline of what snapcraft spends its time on.
+
+While recording, spans such as lifecycle steps, subprocesses or apt
+downloads are collected and written out in the Chrome trace event format,
+which can be loaded in chrome://tracing or any compatible viewer.
+"""
+
+import contextlib
+import json
+import os
+import threading
+import time
+
+
+_lock = threading.Lock()
+_events = None
+
+
+def is_recording():
+    return _events is not None
+
+
+@contextlib.contextmanager
+def record(path):
+    """Record every span within this context and write them to path.
+
+    Nothing is recorded if path is None. The trace is written even if the
+    context exits with an exception, so failed builds can be looked at too.
+    """
+    global _events
+    if not path:
+        yield
+        return
+
+    _events = []
+    try:
+        yield
+    finally:
+        with _lock:
+            events = _events
+            _events = None
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events,
+                       'displayTimeUnit': 'ms'}, f, indent=1)
+
+
+@contextlib.contextmanager
+def span(name, category, **args):
+    """Record the time spent within this context as an event."""
+    if not is_recording():
+        yield
+        return
+
+    started = time.time()
+    try:
+        yield
+    finally:
+        event = {
+            'name': name,
+            'cat': category,
+            'ph': 'X',
+            'ts': int(started * 1000000),
+            'dur': int((time.time() - started) * 1000000),
+            'pid': os.getpid(),
+            'tid': threading.get_ident(),
+            'args': args,
+        }
+        with _lock:
+            if _events is not None:
+                _events.append(event)
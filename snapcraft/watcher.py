@@ -0,0 +1,155 @@
+# -*- Mode:Python; indent-tabs-mode:nil; tab-width:4 -*-
+#
+# Copyright (C) 2015 Canonical Ltd
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 3 as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Wait for changes in directory trees using inotify."""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+
+from snapcraft import common
+
+
+_IN_MODIFY = 0x00000002
+_IN_ATTRIB = 0x00000004
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ISDIR = 0x40000000
+_IN_CLOEXEC = 0o2000000
+
+_WATCH_MASK = (_IN_MODIFY | _IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVED_FROM |
+               _IN_MOVED_TO | _IN_CREATE | _IN_DELETE | _IN_DELETE_SELF)
+
+_EVENT = struct.Struct('iIII')
+
+_libc = None
+
+
+def _get_libc():
+    global _libc
+    if _libc is None:
+        _libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+    return _libc
+
+
+class Watcher:
+    """Collect the paths that change under a set of directory trees.
+
+    Generated snapcraft directories at the top of each tree are not
+    watched, so building a part with its source in the project directory
+    does not trigger a change.
+    """
+
+    def __init__(self):
+        self._fd = _get_libc().inotify_init1(_IN_CLOEXEC)
+        if self._fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        self._roots = set()
+        self._watches = {}
+
+    def close(self):
+        os.close(self._fd)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def add_tree(self, directory):
+        directory = os.path.abspath(directory)
+        self._roots.add(directory)
+        self._add_tree(directory)
+
+    def _add_tree(self, directory):
+        for root, dirs, files in os.walk(directory):
+            if root in self._roots:
+                dirs[:] = [d for d in dirs if d not in common.SNAPCRAFT_FILES]
+            self._add_watch(root)
+
+    def _add_watch(self, directory):
+        wd = _get_libc().inotify_add_watch(
+            self._fd, os.fsencode(directory), _WATCH_MASK)
+        if wd < 0:
+            # The directory might be gone already, there is nothing left to
+            # watch in it.
+            return
+        self._watches[wd] = directory
+
+    def wait(self, timeout=None, settle=0.2):
+        """Return the set of paths that changed.
+
+        Changes usually come in bursts, e.g. when an editor saves a file or
+        a checkout is updated. Once something changes, events are gathered
+        until none arrive for settle seconds.
+
+        :param timeout: seconds to wait for the first change, forever if
+                        None. An empty set is returned on timeout.
+        """
+        changed = set()
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            if changed:
+                wait_for = settle
+            elif deadline is None:
+                wait_for = None
+            else:
+                wait_for = max(0, deadline - time.time())
+            ready, _, _ = select.select([self._fd], [], [], wait_for)
+            if not ready:
+                return changed
+            changed |= self._read_events()
+
+    def _read_events(self):
+        changed = set()
+        data = os.read(self._fd, 64 * 1024)
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+
+            if mask & _IN_Q_OVERFLOW:
+                # Events were lost, assume everything changed.
+                changed |= self._roots
+                continue
+            if mask & _IN_IGNORED:
+                self._watches.pop(wd, None)
+                continue
+
+            directory = self._watches.get(wd)
+            if directory is None:
+                continue
+            if (directory in self._roots and
+                    os.fsdecode(name) in common.SNAPCRAFT_FILES):
+                continue
+            path = os.path.join(directory, os.fsdecode(name))
+            changed.add(path)
+            if mask & _IN_ISDIR and mask & (_IN_CREATE | _IN_MOVED_TO):
+                self._add_tree(path)
+
+        return changed
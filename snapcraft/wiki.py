@@ -14,41 +14,76 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+"""The parts wiki, where parts can be found by name.
+
+The wiki is cached, already parsed, in the snapcraft cache directory. The
+cached copy is used without asking the wiki for changes for
+SNAPCRAFT_WIKI_MAX_AGE seconds, an hour by default. After that the wiki is
+only downloaded again if it changed. When SNAPCRAFT_OFFLINE is set, or the
+wiki cannot be reached or does not answer in time, the cached copy is used
+however old it is.
+"""
+
+import contextlib
+import copy
 import logging
-import requests
+import os
+import pickle
+import tempfile
+import time
+
 import yaml
 
+from snapcraft import common
+
 PARTS_URI = 'https://wiki.ubuntu.com/Snappy/Parts'
 PARTS_URI_PARAMS = {'action': 'raw'}
 
 _WIKI_OPEN = '{{{'
 _WIKI_CLOSE = '}}}'
 
+# Bumped whenever what is cached for the wiki changes.
+_CACHE_FORMAT = 1
+_DEFAULT_MAX_AGE = 60 * 60
+# Seconds to wait for the wiki to connect and, then, between reads.
+_TIMEOUT = 10
+
+logger = logging.getLogger(__name__)
 logging.getLogger("urllib3").setLevel(logging.CRITICAL)
 
 
+def get_max_age():
+    """Return for how many seconds the cached wiki is used as is."""
+    return int(os.environ.get('SNAPCRAFT_WIKI_MAX_AGE', _DEFAULT_MAX_AGE))
+
+
+def is_offline():
+    """Return whether the wiki must only be read from the cache."""
+    return os.environ.get('SNAPCRAFT_OFFLINE', '0') != '0'
+
+
 class Wiki:
     wiki_parts = None
 
     def _fetch(self):
         if self.wiki_parts is None:
-            raw_content = requests.get(PARTS_URI, params=PARTS_URI_PARAMS)
-            content = raw_content.text.strip()
-
-            if content.startswith(_WIKI_OPEN):
-                content = content[len(_WIKI_OPEN):].strip()
-            if content.endswith(_WIKI_CLOSE):
-                content = content[:-len(_WIKI_CLOSE)]
-
-            self.wiki_parts = yaml.load(content)
+            self.wiki_parts = _load_parts()
 
     def get_part(self, name):
+        """Return the properties of the part name in the wiki or None.
+
+        The properties are a copy, changing them does not change the wiki.
+        """
         self._fetch()
 
         if name in self.wiki_parts:
-            if 'plugin' and 'type' in self.wiki_parts[name]:
-                del self.wiki_parts[name]['type']
-            return self.wiki_parts[name]
+            return self._copy_part(name)
+
+    def _copy_part(self, name):
+        properties = copy.deepcopy(self.wiki_parts[name])
+        if 'plugin' in properties:
+            properties.pop('type', None)
+        return properties
 
     def compose(self, name, properties):
         """Return properties composed with the ones from part name in the wiki.
@@ -63,9 +98,99 @@ class Wiki:
         """
         self._fetch()
 
-        wiki_properties = self.wiki_parts[name]
+        wiki_properties = self._copy_part(name)
         for key in wiki_properties:
             properties[key] = properties.get(key, wiki_properties[key])
         properties['plugin'] = wiki_properties.get('plugin', None)
 
         return properties
+
+
+def _load_parts():
+    cache_file = os.path.join(common.get_cachedir(), 'wiki.pickle')
+    cached = _load_cached(cache_file)
+    if cached and (is_offline() or
+                   time.time() - cached['time'] < get_max_age()):
+        return cached['parts']
+    if is_offline():
+        raise EnvironmentError(
+            'the parts wiki is needed but has not been cached yet, it '
+            'cannot be used offline')
+
+    import requests
+
+    headers = {}
+    if cached and cached['etag']:
+        headers['If-None-Match'] = cached['etag']
+    if cached and cached['last_modified']:
+        headers['If-Modified-Since'] = cached['last_modified']
+    try:
+        response = requests.get(
+            PARTS_URI, params=PARTS_URI_PARAMS, headers=headers,
+            timeout=_TIMEOUT)
+    except requests.exceptions.RequestException as e:
+        if not cached:
+            raise
+        logger.warning('Using the cached parts wiki, it could not be '
+                       'checked for changes: {}'.format(e))
+        return cached['parts']
+
+    if response.status_code == 304 and cached:
+        cached['time'] = time.time()
+    elif response.status_code == 200:
+        cached = {
+            'format': _CACHE_FORMAT,
+            'uri': PARTS_URI,
+            'time': time.time(),
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'parts': _parse(response.text),
+        }
+    elif cached:
+        logger.warning('Using the cached parts wiki, checking it for changes '
+                       'returned {}'.format(response.status_code))
+        return cached['parts']
+    else:
+        raise EnvironmentError(
+            'unexpected http status code when downloading the parts wiki: '
+            '{}'.format(response.status_code))
+
+    _save_cached(cache_file, cached)
+    return cached['parts']
+
+
+def _parse(text):
+    content = text.strip()
+    if content.startswith(_WIKI_OPEN):
+        content = content[len(_WIKI_OPEN):].strip()
+    if content.endswith(_WIKI_CLOSE):
+        content = content[:-len(_WIKI_CLOSE)]
+
+    return yaml.load(content)
+
+
+def _load_cached(cache_file):
+    try:
+        with open(cache_file, 'rb') as f:
+            cached = pickle.load(f)
+    except (OSError, EOFError, ValueError, pickle.UnpicklingError):
+        return None
+
+    if (cached.get('format') != _CACHE_FORMAT or
+            cached.get('uri') != PARTS_URI):
+        return None
+    return cached
+
+
+def _save_cached(cache_file, cached):
+    # Failing to save only means downloading the wiki again next time.
+    with contextlib.suppress(OSError, pickle.PicklingError):
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(cache_file))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(cached, f, pickle.HIGHEST_PROTOCOL)
+            os.rename(tmp, cache_file)
+        finally:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(tmp)
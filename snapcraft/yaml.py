@@ -16,30 +16,50 @@
 
 import codecs
 import contextlib
+import hashlib
+import heapq
+import json
 import logging
 import os
 import os.path
+import pickle
 import sys
+import tempfile
+import time
 
 import jsonschema
 import yaml
 
 from snapcraft import (
+    ccache,
     common,
+    environment,
     pluginhandler,
+    schema,
     wiki,
 )
 
 
 logger = logging.getLogger(__name__)
 
+# libyaml parses many times faster than the pure Python loader.
+_Loader = getattr(yaml, 'CLoader', yaml.Loader)
+# Bumped whenever what is cached for a project changes.
+_PROJECT_CACHE_FORMAT = 2
+
 
 @jsonschema.FormatChecker.cls_checks('file-path')
 @jsonschema.FormatChecker.cls_checks('icon-path')
 def _validate_file_exists(instance):
+    _checked_files.append(instance)
     return os.path.exists(instance)
 
 
+# The files validating snapcraft.yaml looked for, a cached validation only
+# holds for as long as they exist.
+_checked_files = []
+
+
 class SnapcraftYamlFileError(Exception):
 
     @property
@@ -81,108 +101,141 @@ class PluginNotDefinedError(Exception):
 
 
 class Config:
+    """The project in snapcraft.yaml and the plugins for its parts.
+
+    If part_names is given, only the plugins for those parts and the parts
+    they are after, however indirectly, are loaded. The other parts can be
+    loaded later with load_parts. part_names always names every part.
+    """
 
     @property
     def part_names(self):
         return self._part_names
 
-    def __init__(self):
+    def __init__(self, part_names=None):
         self.build_tools = []
         self.all_parts = []
         self._part_names = []
         self.after_requests = {}
+        self._staged_envs = {}
+        self._parts = {}
+        self._dependents = {}
+        # The plugin and properties of the parts not loaded yet.
+        self._deferred = {}
 
-        self.data = _snapcraft_yaml_load()
-        _validate_snapcraft_yaml(self.data)
+        self._wiki = wiki.Wiki()
+        self.data, parts = _load_project(self._wiki)
 
         self.build_tools = self.data.get('build-packages', [])
+        if ccache.get_cachedir():
+            self.build_tools = self.build_tools + ['ccache']
 
-        self._wiki = wiki.Wiki()
-
-        for part_name in self.data.get('parts', []):
+        for part_name, plugin_name, properties, after in parts:
             self._part_names.append(part_name)
-            properties = self.data['parts'][part_name] or {}
-
-            plugin_name = properties.pop('plugin', None)
-            if not plugin_name:
-                logger.info(
-                    'Searching the wiki to compose part "{}"'.format(
-                        part_name))
-                with contextlib.suppress(KeyError):
-                    properties = self._wiki.compose(part_name, properties)
-                    plugin_name = properties.pop('plugin', None)
-
-            if not plugin_name:
-                raise PluginNotDefinedError(part_name)
-
-            if 'after' in properties:
-                self.after_requests[part_name] = properties.pop('after')
-
-            properties['stage'] = _expand_filesets_for('stage', properties)
-            properties['snap'] = _expand_filesets_for('snap', properties)
+            if after is not None:
+                self.after_requests[part_name] = after
+                # Parts that are not loaded are dependents all the same.
+                for dep in after:
+                    self._dependents.setdefault(dep, []).append(part_name)
+            self._deferred[part_name] = (plugin_name, properties)
 
-            if 'filesets' in properties:
-                del properties['filesets']
-
-            self.load_plugin(part_name, plugin_name, properties)
-
-        self._compute_part_dependencies()
-        self.all_parts = self._sort_parts()
+        self.load_parts(part_names or self._part_names)
 
         if 'architectures' not in self.data:
             self.data['architectures'] = [common.get_arch(), ]
 
-    def _compute_part_dependencies(self):
-        '''Gather the lists of dependencies and adds to all_parts.'''
+    def load_parts(self, part_names):
+        """Load the parts named and the parts they are after, if needed.
+
+        Names that are not those of a part are left for validate_parts.
+        """
+        names = set()
+        pending = [n for n in part_names if n in self._deferred]
+        while pending:
+            part_name = pending.pop()
+            if part_name in names or part_name in self._parts:
+                continue
+            names.add(part_name)
+            pending.extend(self.after_requests.get(part_name, []))
+        if not names:
+            return
+
+        # Plugins are loaded in the order the parts are defined.
+        loaded = []
+        for part_name in self._part_names:
+            if part_name in names and part_name in self._deferred:
+                plugin_name, properties = self._deferred.pop(part_name)
+                loaded.append(
+                    self.load_plugin(part_name, plugin_name, properties))
+
+        self._compute_part_dependencies(loaded)
+        position = {name: i for i, name in enumerate(self._part_names)}
+        self.all_parts.sort(key=lambda part: position.get(part.name, 0))
+        self.all_parts = self._sort_parts()
 
-        for part in self.all_parts:
+    def _compute_part_dependencies(self, parts):
+        '''Gather the lists of dependencies of parts.'''
+
+        for part in parts:
             dep_names = self.after_requests.get(part.name, [])
             for dep in dep_names:
-                found = False
-                for i in range(len(self.all_parts)):
-                    if dep == self.all_parts[i].name:
-                        part.deps.append(self.all_parts[i])
-                        found = True
-                        break
-                if not found:
-                    wiki_part = self._wiki.get_part(dep)
-                    found = True if wiki_part else False
-                    if found:
-                        plugin_name = wiki_part.pop('plugin')
-                        part.deps.append(self.load_plugin(
-                            dep, plugin_name, wiki_part))
-                        self._part_names.append(dep)
-                if not found:
+                dep_part = self._parts.get(dep)
+                if not dep_part:
                     raise SnapcraftLogicError(
                         'part name missing {}'.format(dep))
+                part.deps.append(dep_part)
 
     def _sort_parts(self):
-        '''Performs an inneficient but easy to follow sorting of parts.'''
-        sorted_parts = []
-
-        while self.all_parts:
-            top_part = None
-            for part in self.all_parts:
-                mentioned = False
-                for other in self.all_parts:
-                    if part in other.deps:
-                        mentioned = True
-                        break
-                if not mentioned:
-                    top_part = part
-                    break
-            if not top_part:
-                raise SnapcraftLogicError(
-                    'circular dependency chain found in parts definition')
-            sorted_parts = [top_part] + sorted_parts
-            self.all_parts.remove(top_part)
+        '''Sort the parts so that every part comes after its dependencies.
+
+        Parts are taken from the end: of the parts no other remaining part
+        depends on, the one defined first goes last. Independent parts keep
+        the order they were defined in.
+        '''
+        index = {part: i for i, part in enumerate(self.all_parts)}
+        dependents = {part: [] for part in self.all_parts}
+        for part in self.all_parts:
+            for dep in part.deps:
+                if dep in dependents:
+                    dependents[dep].append(part)
 
+        pending = {part: len(dependents[part]) for part in self.all_parts}
+        ready = [index[part] for part in self.all_parts if not pending[part]]
+        heapq.heapify(ready)
+        sorted_parts = []
+        while ready:
+            part = self.all_parts[heapq.heappop(ready)]
+            sorted_parts.append(part)
+            for dep in part.deps:
+                if dep in pending:
+                    pending[dep] -= 1
+                    if not pending[dep]:
+                        heapq.heappush(ready, index[dep])
+
+        if len(sorted_parts) < len(self.all_parts):
+            remaining = [p for p in self.all_parts if pending[p]]
+            raise SnapcraftLogicError(
+                'circular dependency chain found in parts definition: '
+                '{}'.format(' -> '.join(_find_cycle(remaining, dependents))))
+
+        sorted_parts.reverse()
         return sorted_parts
 
+    def get_part(self, part_name):
+        """Returns the part named part_name or None."""
+        return self._parts.get(part_name)
+
     def part_prereqs(self, part_name):
         """Returns a set with all of part_names' prerequisites."""
         return set(self.after_requests.get(part_name, []))
 
+    def part_dependents(self, part_name):
+        """Returns a set with the parts that have part_name in after.
+
+        Parts that are not loaded are included.
+        """
+        return set(self._dependents.get(part_name, []))
+
     def validate_parts(self, part_names):
         for part_name in part_names:
             if part_name not in self._part_names:
@@ -196,6 +249,7 @@ class Config:
 
         self.build_tools += part.code.build_packages
         self.all_parts.append(part)
+        self._parts[part_name] = part
         return part
 
     def runtime_env(self, root):
@@ -248,60 +302,85 @@ class Config:
             '$PKG_CONFIG_PATH'
         ]).format(root, common.get_arch_triplet()))
         env.append('PERL5LIB={0}/usr/share/perl5/'.format(root))
+        env.extend(ccache.env())
         return env
 
     def build_env_for_part(self, part, root_part=True):
         """Return a build env of all the part's dependencies."""
 
-        env = []
-        stagedir = common.get_stagedir()
+        env = environment.Environment()
         for dep_part in part.deps:
-            env += dep_part.env(stagedir)
-            env += self.build_env_for_part(dep_part, root_part=False)
+            env.extend(self._staged_env_for_part(dep_part))
 
         if root_part:
-            env += part.env(part.installdir)
-            env += self.runtime_env(part.installdir)
-            env += self.build_env(part.installdir)
+            env.extend(part.env(part.installdir))
+            env.extend(self.runtime_env(part.installdir))
+            env.extend(self.build_env(part.installdir))
         else:
-            env += part.env(stagedir)
-            env += self.runtime_env(stagedir)
-            env += self.build_env(stagedir)
-
-        return env
+            stagedir = common.get_stagedir()
+            env.extend(part.env(stagedir))
+            env.extend(self.runtime_env(stagedir))
+            env.extend(self.build_env(stagedir))
+
+        return list(env)
+
+    def _staged_env_for_part(self, part):
+        # Parts are staged before the parts after them run and are not
+        # staged again in the same run, so what they put in the build env
+        # of others does not change.
+        if part.name not in self._staged_envs:
+            stagedir = common.get_stagedir()
+            env = environment.Environment(part.env(stagedir))
+            env.extend(self.build_env_for_part(part, root_part=False))
+            self._staged_envs[part.name] = list(env)
+        return self._staged_envs[part.name]
 
     def stage_env(self):
         root = common.get_stagedir()
-        env = []
+        env = environment.Environment()
 
-        env += self.runtime_env(root)
-        env += self.build_env(root)
+        env.extend(self.runtime_env(root))
+        env.extend(self.build_env(root))
         for part in self.all_parts:
-            env += part.env(root)
+            env.extend(part.env(root))
 
-        return env
+        return list(env)
 
     def snap_env(self):
         root = common.get_snapdir()
-        env = []
+        env = environment.Environment()
 
-        env += self.runtime_env(root)
+        env.extend(self.runtime_env(root))
         for part in self.all_parts:
-            env += part.env(root)
+            env.extend(part.env(root))
 
-        return env
+        return list(env)
 
 
-def _validate_snapcraft_yaml(snapcraft_yaml):
-    schema_file = os.path.abspath(os.path.join(common.get_schemadir(),
-                                               'snapcraft.yaml'))
+def _find_cycle(parts, dependents):
+    """Return the names along a cycle of parts, each one after the next.
+
+    Every part in parts must have a dependent within parts.
+    """
+    remaining = set(parts)
+    path = []
+    seen = {}
+    part = parts[0]
+    while part not in seen:
+        seen[part] = len(path)
+        path.append(part)
+        part = next(p for p in dependents[part] if p in remaining)
 
+    cycle = path[seen[part]:] + [part]
+    return [p.name for p in reversed(cycle)]
+
+
+def _validate_snapcraft_yaml(snapcraft_yaml):
+    """Validate snapcraft_yaml, return the files the schema looked for."""
+    del _checked_files[:]
     try:
-        with open(schema_file) as fp:
-            schema = yaml.load(fp)
-            format_check = jsonschema.FormatChecker()
-            jsonschema.validate(snapcraft_yaml, schema,
-                                format_checker=format_check)
+        schema.validate(schema.get_validator(), snapcraft_yaml)
+        return list(_checked_files)
     except FileNotFoundError:
         raise SnapcraftSchemaError(
             'snapcraft validation file is missing from installation path')
@@ -323,13 +402,157 @@ def _snapcraft_yaml_load(yaml_file='snapcraft.yaml'):
 
     try:
         with open(yaml_file, encoding=encoding) as fp:
-            return yaml.load(fp)
+            return _yaml_load(fp)
     except yaml.scanner.ScannerError as e:
         raise SnapcraftSchemaError(
             '{} on line {} of {}'.format(
                 e.problem, e.problem_mark.line, yaml_file))
 
 
+def _yaml_load(fp):
+    try:
+        return yaml.load(fp, Loader=_Loader)
+    except yaml.YAMLError:
+        if _Loader is yaml.Loader:
+            raise
+
+    # The pure Python loader explains errors better.
+    fp.seek(0)
+    return yaml.load(fp, Loader=yaml.Loader)
+
+
+def _load_project(project_wiki, yaml_file='snapcraft.yaml'):
+    """Return the validated contents of yaml_file and its composed parts.
+
+    Both are cached for as long as yaml_file and the schema do not change
+    and the files the schema looked for are still there. Parts composed
+    with the wiki are only cached for as long as the wiki is, see
+    wiki.get_max_age.
+    """
+    try:
+        with open(yaml_file, 'rb') as fp:
+            content = fp.read()
+        key = hashlib.sha256(json.dumps([
+            _PROJECT_CACHE_FORMAT,
+            hashlib.sha256(content).hexdigest(),
+            schema.identity(),
+        ]).encode()).hexdigest()
+    except FileNotFoundError:
+        # Loading reports which one is missing.
+        key = None
+
+    cache_file = os.path.join(
+        common.get_cachedir(), 'projects', '{}.pickle'.format(
+            hashlib.sha256(os.path.abspath(yaml_file).encode()).hexdigest()))
+    cached = _load_cached_project(cache_file, key)
+    if cached:
+        return cached['data'], cached['parts']
+
+    data = _snapcraft_yaml_load(yaml_file)
+    checked_files = _validate_snapcraft_yaml(data)
+    parts, used_wiki = _compose_parts(data, project_wiki)
+    if key:
+        _save_cached_project(cache_file, {
+            'key': key,
+            'checked_files': checked_files,
+            'wiki_time': time.time() if used_wiki else None,
+            'data': data,
+            'parts': parts,
+        })
+
+    return data, parts
+
+
+def _load_cached_project(cache_file, key):
+    if not key:
+        return None
+    try:
+        with open(cache_file, 'rb') as f:
+            cached = pickle.load(f)
+    except (OSError, EOFError, ValueError, pickle.UnpicklingError):
+        return None
+
+    if cached.get('key') != key:
+        return None
+    if not all(os.path.exists(f) for f in cached['checked_files']):
+        return None
+    wiki_time = cached['wiki_time']
+    if (wiki_time is not None and
+            time.time() - wiki_time > wiki.get_max_age()):
+        return None
+    return cached
+
+
+def _save_cached_project(cache_file, cached):
+    # Failing to save only means loading the project again next time.
+    with contextlib.suppress(OSError, pickle.PicklingError):
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(cache_file))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(cached, f, pickle.HIGHEST_PROTOCOL)
+            os.rename(tmp, cache_file)
+        finally:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(tmp)
+
+
+def _compose_parts(data, project_wiki):
+    """Return the parts of data and whether the wiki was needed for them.
+
+    Each part is described by its name, plugin, properties and the parts
+    it is after, None if it does not say. Parts named in after that data
+    does not define are taken from the wiki and come last, along with the
+    wiki parts they are after in turn.
+    """
+    parts = []
+    used_wiki = False
+    for part_name in data.get('parts', []):
+        properties = data['parts'][part_name] or {}
+
+        plugin_name = properties.pop('plugin', None)
+        if not plugin_name:
+            logger.info(
+                'Searching the wiki to compose part "{}"'.format(part_name))
+            used_wiki = True
+            with contextlib.suppress(KeyError):
+                properties = project_wiki.compose(part_name, properties)
+                plugin_name = properties.pop('plugin', None)
+
+        if not plugin_name:
+            raise PluginNotDefinedError(part_name)
+
+        after = properties.pop('after', None)
+
+        properties['stage'] = _expand_filesets_for('stage', properties)
+        properties['snap'] = _expand_filesets_for('snap', properties)
+
+        if 'filesets' in properties:
+            del properties['filesets']
+
+        parts.append((part_name, plugin_name, properties, after))
+
+    # The parts taken from the wiki are added to the list being walked, so
+    # the parts they are after are taken from the wiki too.
+    names = {part[0] for part in parts}
+    for part in parts:
+        for dep in part[3] or []:
+            if dep in names:
+                continue
+            used_wiki = True
+            wiki_part = project_wiki.get_part(dep)
+            if not wiki_part:
+                raise SnapcraftLogicError('part name missing {}'.format(dep))
+            plugin_name = wiki_part.pop('plugin', None)
+            if not plugin_name:
+                raise PluginNotDefinedError(dep)
+            after = wiki_part.pop('after', None)
+            parts.append((dep, plugin_name, wiki_part, after))
+            names.add(dep)
+
+    return parts, used_wiki
+
+
 def _expand_filesets_for(stage, properties):
     filesets = properties.get('filesets', {})
     fileset_for_stage = properties.get(stage, {})
@@ -349,9 +572,9 @@ def _expand_filesets_for(stage, properties):
     return new_stage_set
 
 
-def load_config():
+def load_config(part_names=None):
     try:
-        return Config()
+        return Config(part_names)
     except SnapcraftYamlFileError as e:
         logger.error(
             'Could not find {}.  Are you sure you are in the right '